@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Нагружает запущенный сервер одновременными запросами к страницам todo.
+
+Сервер и скрипт должны использовать одну базу: скрипт выбирает из нее
+исполнителей и владельцев цепочек и создает им сессии, поэтому пароли
+не нужны. Базу удобно заполнить командой generate_fixtures.
+
+Запросы выполняются в нескольких процессах. Каждый процесс выбирает
+страницу по весам из --mix и случайного пользователя, который может ее
+просматривать. В конце выводятся пропускная способность и 50, 95 и 99
+процентили времени ответа по каждой странице.
+
+    django-admin.py runserver --settings=mysite.settings
+    python benchmarks/load.py --settings=mysite.settings --processes=8
+
+Адреса страниц строятся reverse() по ROOT_URLCONF из настроек.
+"""
+import json
+import os
+import random
+import sys
+import time
+import urllib2
+from multiprocessing import Pool
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Вес страницы в смеси запросов.
+DEFAULT_MIX = 'actual_tasks=6,task_detail=3,actual_chains=1'
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(value):
+    """Разбирает веса страниц вида actual_tasks=6,actual_chains=1."""
+    mix = []
+    for item in value.split(','):
+        name, weight = item.split('=')
+        if name not in ('actual_tasks', 'task_detail', 'actual_chains'):
+            raise ValueError('Unknown page: {0}'.format(name))
+        mix.append((name, int(weight)))
+    return mix
+
+
+def make_sessions(users_count, tasks_per_worker):
+    """Создает сессии исполнителей и владельцев цепочек.
+
+    Возвращает словарь со списками (ключ сессии, адреса страниц) для
+    каждой страницы и ключи всех созданных сессий.
+    """
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY
+    from django.core.urlresolvers import reverse
+    from django.utils.importlib import import_module
+
+    from todo.models import Chain, Task
+
+    engine = import_module(settings.SESSION_ENGINE)
+    backend = settings.AUTHENTICATION_BACKENDS[0]
+
+    def login(user_id):
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user_id
+        session[BACKEND_SESSION_KEY] = backend
+        session.save()
+        return session.session_key
+
+    worker_ids = list(Task.objects.filter(archive=False)
+                      .values_list('worker', flat=True)
+                      .distinct()[:users_count])
+    owner_ids = list(Chain.objects.filter(archive=False)
+                     .values_list('owner', flat=True)
+                     .distinct()[:users_count])
+    if not worker_ids or not owner_ids:
+        raise ValueError('The database has no actual tasks or chains.')
+
+    pages = {'actual_tasks': [], 'task_detail': [], 'actual_chains': []}
+    session_keys = []
+    for worker_id in worker_ids:
+        session_key = login(worker_id)
+        session_keys.append(session_key)
+        pages['actual_tasks'].append(
+            (session_key, [reverse('todo_actual_tasks')]))
+        task_ids = list(Task.objects.by_worker(worker_id).actual()
+                        .values_list('pk', flat=True)[:tasks_per_worker])
+        pages['task_detail'].append((session_key, [
+            reverse('todo_task_detail', args=[task_id])
+            for task_id in task_ids
+        ]))
+    for owner_id in owner_ids:
+        session_key = login(owner_id)
+        session_keys.append(session_key)
+        pages['actual_chains'].append(
+            (session_key, [reverse('todo_actual_chains')]))
+    return pages, session_keys
+
+
+def delete_sessions(session_keys):
+    """Удаляет сессии, созданные make_sessions()."""
+    from django.conf import settings
+    from django.utils.importlib import import_module
+
+    engine = import_module(settings.SESSION_ENGINE)
+    for session_key in session_keys:
+        engine.SessionStore().delete(session_key)
+
+
+def run_client(args):
+    """Выполняет запросы одного процесса до истечения времени.
+
+    Возвращает список (страница, время ответа в секундах, успешен ли
+    ответ).
+    """
+    (base_url, cookie_name, pages, mix, duration, timeout, seed) = args
+    rnd = random.Random(seed)
+    names = []
+    for name, weight in mix:
+        names.extend([name] * weight)
+    # Перенаправление на страницу входа считается ошибкой.
+    opener = urllib2.build_opener(_NoRedirectHandler)
+    results = []
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        name = rnd.choice(names)
+        session_key, urls = rnd.choice(pages[name])
+        if not urls:
+            continue
+        request = urllib2.Request(base_url + rnd.choice(urls))
+        request.add_header('Cookie', '{0}={1}'.format(cookie_name,
+                                                      session_key))
+        started = time.time()
+        try:
+            response = opener.open(request, timeout=timeout)
+            response.read()
+            ok = response.getcode() == 200
+        except (urllib2.URLError, IOError):
+            ok = False
+        results.append((name, time.time() - started, ok))
+    return results
+
+
+class _NoRedirectHandler(urllib2.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(values, percent):
+    """Возвращает процентиль отсортированных значений."""
+    if not values:
+        return None
+    index = max(int(round(percent / 100.0 * len(values))) - 1, 0)
+    return values[index]
+
+
+def summarize(results, elapsed):
+    """Возвращает показатели по каждой странице и по всем запросам."""
+    by_name = {'total': []}
+    errors = {'total': 0}
+    for name, latency, ok in results:
+        for key in (name, 'total'):
+            by_name.setdefault(key, [])
+            errors.setdefault(key, 0)
+            if ok:
+                by_name[key].append(latency * 1000)
+            else:
+                errors[key] += 1
+    summary = {}
+    for name, latencies in by_name.items():
+        latencies.sort()
+        summary[name] = {
+            'requests': len(latencies) + errors[name],
+            'errors': errors[name],
+            'throughput': round(len(latencies) / elapsed, 2),
+        }
+        for percent in PERCENTILES:
+            value = percentile(latencies, percent)
+            summary[name]['p{0}_ms'.format(percent)] = (
+                None if value is None else round(value, 2))
+    return summary
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--settings', default=None,
+                      help='Settings module of the server under test.')
+    parser.add_option('--url', default='http://127.0.0.1:8000',
+                      help='Base URL of the server.')
+    parser.add_option('--processes', type='int', default=8,
+                      help='Number of concurrent client processes.')
+    parser.add_option('--users', type='int', default=100,
+                      help='Number of workers and of managers to log in.')
+    parser.add_option('--tasks-per-worker', type='int', default=10,
+                      help='Number of task pages to visit per worker.')
+    parser.add_option('--mix', default=DEFAULT_MIX,
+                      help='Page weights, default: ' + DEFAULT_MIX + '.')
+    parser.add_option('--duration', type='float', default=30,
+                      help='Seconds to run.')
+    parser.add_option('--timeout', type='float', default=30,
+                      help='Request timeout in seconds.')
+    parser.add_option('--seed', type='int', default=0,
+                      help='Random seed.')
+    parser.add_option('--output', default=None,
+                      help='File to write JSON results to.')
+    options, args = parser.parse_args()
+    if options.settings:
+        os.environ['DJANGO_SETTINGS_MODULE'] = options.settings
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+
+    from django.conf import settings
+
+    mix = parse_mix(options.mix)
+    pages, session_keys = make_sessions(options.users,
+                                        options.tasks_per_worker)
+    base_url = options.url.rstrip('/')
+    clients = [(base_url, settings.SESSION_COOKIE_NAME, pages, mix,
+                options.duration, options.timeout, options.seed + num)
+               for num in range(options.processes)]
+    pool = Pool(options.processes)
+    try:
+        started = time.time()
+        results = []
+        for client_results in pool.map(run_client, clients):
+            results.extend(client_results)
+        elapsed = time.time() - started
+    finally:
+        pool.close()
+        delete_sessions(session_keys)
+
+    summary = summarize(results, elapsed)
+    sys.stdout.write('{0} processes, {1:.1f}s\n'.format(options.processes,
+                                                        elapsed))
+    for name in sorted(summary):
+        row = summary[name]
+        sys.stdout.write(
+            '{name}: {requests} requests, {errors} errors, '
+            '{throughput} req/s, p50 {p50_ms} ms, p95 {p95_ms} ms, '
+            'p99 {p99_ms} ms\n'.format(name=name, **row))
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump({'processes': options.processes, 'elapsed': elapsed,
+                       'pages': summary}, output, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Проверяет, что горячие выборки используют индексы.
+
+Создает тестовую базу, заполняет ее синтетическими цепочками и задачами
+и выводит план и время выполнения каждой выборки. Завершается с ошибкой,
+если какая-то выборка читает таблицу целиком или сортирует результат
+без индекса.
+
+    python benchmarks/query_plans.py --tasks=1000000
+"""
+import datetime
+import os
+import random
+import re
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from todo.models import Chain, Task
+from todo.pagination import PER_PAGE
+
+# Признаки выборки без индекса в планах разных СУБД.
+FULL_SCAN_PATTERNS = {
+    'sqlite': (r'^SCAN (TABLE )?todo_\w+$', r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': (r'Seq Scan on todo_', r'^\s*(->\s*)?Sort\b'),
+    'mysql': (r'\bALL\b', r'Using filesort'),
+}
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+TASKS_PER_CHAIN = 10
+CHAINS_PER_OWNER = 1000
+TASKS_PER_WORKER = 1000
+BATCH_SIZE = 10000
+
+
+def populate(tasks_count):
+    """Заполняет базу цепочками по TASKS_PER_CHAIN задач."""
+    rnd = random.Random(0)
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    chains_count = max(tasks_count // TASKS_PER_CHAIN, 1)
+    owners_count = max(chains_count // CHAINS_PER_OWNER, 1)
+    workers_count = max(tasks_count // TASKS_PER_WORKER, 1)
+    users_count = owners_count + workers_count
+    today = datetime.date.today()
+
+    cursor.executemany(
+        'INSERT INTO auth_user (username, first_name, last_name, email, '
+        'password, is_staff, is_active, is_superuser, last_login, '
+        'date_joined) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+        [('user{0}'.format(num), '', '', '', '!', True, True, False,
+          datetime.datetime.now(), datetime.datetime.now())
+         for num in range(users_count)]
+    )
+    cursor.execute('SELECT MIN(id) FROM auth_user')
+    first_user_id = cursor.fetchone()[0]
+    first_worker_id = first_user_id + owners_count
+
+    chain_sql = 'INSERT INTO {table} ({columns}) VALUES ({values})'.format(
+        table=qn(Chain._meta.db_table),
+        columns=', '.join(qn(column) for column in (
+            'name', 'start_date', 'priority', 'owner_id', 'archive',
+            'last_order')),
+        values=', '.join(['%s'] * 6),
+    )
+    task_sql = 'INSERT INTO {table} ({columns}) VALUES ({values})'.format(
+        table=qn(Task._meta.db_table),
+        columns=', '.join(qn(column) for column in (
+            'worker_id', 'task', 'deadline', 'finish_date', 'status',
+            'chain_id', 'order', 'archive', 'effective_status',
+            'effective_start_date')),
+        values=', '.join(['%s'] * 10),
+    )
+
+    chains = []
+    for num in range(chains_count):
+        start_date = today + datetime.timedelta(rnd.randint(-3650, 30))
+        chains.append(('Chain{0}'.format(num), start_date, 0,
+                       first_user_id + num % owners_count,
+                       start_date < today - datetime.timedelta(90),
+                       TASKS_PER_CHAIN))
+    for offset in range(0, chains_count, BATCH_SIZE):
+        cursor.executemany(chain_sql, chains[offset:offset + BATCH_SIZE])
+    cursor.execute('SELECT MIN(id) FROM {0}'.format(
+        qn(Chain._meta.db_table)))
+    first_chain_id = cursor.fetchone()[0]
+
+    tasks = []
+    for chain_num, chain in enumerate(chains):
+        deadline = chain[1]
+        for order in range(Task.FIRST_TASK,
+                           Task.FIRST_TASK + TASKS_PER_CHAIN):
+            deadline += datetime.timedelta(rnd.randint(1, 10))
+            if deadline < today:
+                status, finish_date = Task.DONE_STATUS, deadline
+                effective_status = Task.DONE_STATUS
+            else:
+                status, finish_date = Task.UNCERTAIN_STATUS, None
+                effective_status = Task.WAIT_STATUS
+            tasks.append((
+                first_worker_id + rnd.randrange(workers_count),
+                'Task', deadline, finish_date, status,
+                first_chain_id + chain_num, order, chain[4],
+                effective_status, None,
+            ))
+        if len(tasks) >= BATCH_SIZE:
+            cursor.executemany(task_sql, tasks)
+            tasks = []
+    if tasks:
+        cursor.executemany(task_sql, tasks)
+    transaction.commit_unless_managed()
+
+    if connection.vendor in ('sqlite', 'postgresql'):
+        cursor.execute('ANALYZE')
+    return first_user_id, first_worker_id, first_chain_id
+
+
+def hot_queries(owner_id, worker_id, chain_id):
+    """Возвращает выборки, выполняемые при каждом просмотре страниц."""
+    return (
+        ('_prev_task()',
+         Task.objects.filter(chain=chain_id, order__lt=TASKS_PER_CHAIN)
+         .order_by('-order')[:1]),
+        ('Chain.last_task()',
+         Task.objects.filter(chain=chain_id).order_by('-deadline',
+                                                      '-order')[:1]),
+        ('TaskQuerySet.by_worker().actual()',
+         Task.objects.by_worker(worker_id).actual()),
+        ('TaskQuerySet.by_worker().actual().with_timeline()',
+         Task.objects.by_worker(worker_id).actual().with_timeline()),
+        ('TaskQuerySet.by_worker().by_status()',
+         Task.objects.by_worker(worker_id).by_status(Task.WORK_STATUS)),
+        ('ChainQuerySet.by_owner().actual()',
+         Chain.objects.by_owner(owner_id).actual()),
+        ('TaskQuerySet.actual().overdue(done=False)',
+         Task.objects.actual().overdue(done=False)),
+        ('TaskQuerySet.actual().due_within()',
+         Task.objects.actual().due_within(3)),
+        ('TaskQuerySet.starting_within()',
+         Task.objects.starting_within(3)),
+        ('ChainQuerySet.due_within()',
+         Chain.objects.due_within(3)),
+        ('task_archive page',
+         keyset_page_queryset(Task.objects.by_worker(worker_id).archived(),
+                              'deadline')),
+        ('chain_archive page',
+         keyset_page_queryset(Chain.objects.by_owner(owner_id).archived(),
+                              'start_date')),
+    )
+
+
+def keyset_page_queryset(queryset, field_name):
+    """Возвращает выборку второй страницы архива."""
+    first_page = queryset.order_by('-' + field_name, '-pk')[:PER_PAGE]
+    last = list(first_page)[-1]
+    return (queryset.order_by('-' + field_name, '-pk')
+            .filter(Q(**{field_name + '__lte': getattr(last, field_name)}),
+                    Q(**{field_name + '__lt': getattr(last, field_name)}) |
+                    Q(pk__lt=last.pk))[:PER_PAGE + 1])
+
+
+def explain(queryset):
+    """Возвращает строки плана выполнения выборки."""
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    cursor = connection.cursor()
+    cursor.execute(EXPLAIN_PREFIX[connection.vendor] + sql, params)
+    plan = []
+    for row in cursor.fetchall():
+        if connection.vendor == 'sqlite':
+            # Последний столбец содержит описание шага плана.
+            plan.append(row[-1])
+        else:
+            plan.append(' '.join(unicode(value) for value in row))
+    return plan
+
+
+def timing(queryset, repeat=5):
+    """Возвращает лучшее время выполнения выборки в миллисекундах."""
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        list(queryset.all())
+        elapsed = (time.time() - started) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--tasks', type='int', default=1000000,
+                      help='Number of tasks to generate.')
+    options, args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.time()
+        owner_id, worker_id, chain_id = populate(options.tasks)
+        sys.stdout.write('Generated {0} tasks in {1:.1f}s ({2})\n\n'.format(
+            Task.objects.count(), time.time() - started, connection.vendor))
+
+        failed = []
+        patterns = FULL_SCAN_PATTERNS[connection.vendor]
+        for name, queryset in hot_queries(owner_id, worker_id, chain_id):
+            plan = explain(queryset)
+            sys.stdout.write('{0}: {1:.2f} ms\n'.format(name,
+                                                        timing(queryset)))
+            for line in plan:
+                sys.stdout.write('    {0}\n'.format(line))
+            for line in plan:
+                if any(re.search(pattern, line) for pattern in patterns):
+                    failed.append(name)
+                    break
+        if failed:
+            sys.stdout.write('\nNot using indexes: {0}\n'.format(
+                ', '.join(failed)))
+            sys.exit(1)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
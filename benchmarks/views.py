@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Измеряет количество запросов, время и память представлений и методов.
+
+Для каждого масштаба создает в тестовой базе цепочки одного владельца
+с задачами нескольких исполнителей, затем измеряет страницы actual_tasks,
+task_detail, actual_chains, dashboard и методы моделей. Кэш отображения
+цепочек очищается перед каждым замером.
+
+Результаты записываются в JSON. Если задан файл с базовыми результатами,
+скрипт завершается с ошибкой, когда количество запросов больше базового
+или время и память превышают базовые с учетом допуска.
+
+    python benchmarks/views.py --output=results.json
+    python benchmarks/views.py --scales=10x1,1000x10 --update-baseline
+
+Память -- пиковый объем памяти процесса (ru_maxrss) после замера. Он не
+уменьшается между замерами, поэтому показывает рост, а не точный расход.
+"""
+import datetime
+import json
+import os
+import random
+import resource
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries
+from django.test.client import RequestFactory
+
+from todo import views
+from todo.models import Chain, StaffProfile, Task
+
+# Количество цепочек и задач в цепочке.
+SCALES = [(chains, tasks) for chains in (10, 100, 1000, 10000)
+          for tasks in (1, 10, 50)]
+WORKERS_COUNT = 10
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+
+def populate(chains_count, tasks_per_chain):
+    """Заполняет базу цепочками владельца и задачами исполнителей."""
+    rnd = random.Random(0)
+    today = datetime.date.today()
+    owner = User.objects.create(username='owner')
+    StaffProfile.objects.create(user=owner, post='Менеджер проектов')
+    workers = []
+    for num in range(WORKERS_COUNT):
+        worker = User.objects.create(username='worker{0}'.format(num),
+                                     first_name='Имя', last_name='Фамилия')
+        StaffProfile.objects.create(user=worker, post='Программист')
+        workers.append(worker)
+
+    for num in range(chains_count):
+        chain = Chain.objects.create(
+            name='Chain{0}'.format(num), owner=owner,
+            start_date=today + datetime.timedelta(rnd.randint(-60, 30))
+        )
+        tasks = []
+        deadline = chain.start_date
+        for order in range(tasks_per_chain):
+            deadline += datetime.timedelta(rnd.randint(1, 10))
+            if deadline < today:
+                status, finish_date = Task.DONE_STATUS, deadline
+            else:
+                status, finish_date = Task.UNCERTAIN_STATUS, None
+            tasks.append(Task(
+                worker=workers[(num + order) % WORKERS_COUNT],
+                task='Task', deadline=deadline, finish_date=finish_date,
+                status=status
+            ))
+        chain.add_tasks(tasks)
+    return owner, workers[0]
+
+
+def cases(owner, worker):
+    """Возвращает замеряемые представления и методы моделей."""
+    factory = RequestFactory()
+
+    def view(view_func, url, user, **kwargs):
+        def run():
+            request = factory.get(url)
+            request.user = user
+            return view_func(request, **kwargs).render().content
+        return run
+
+    task = Task.objects.by_worker(worker).order_by('-order')[0]
+    chain = task.chain
+
+    def chain_method(name):
+        return lambda: getattr(Chain.objects.get(pk=chain.pk), name)()
+
+    def task_method(name):
+        return lambda: getattr(Task.objects.get(pk=task.pk), name)()
+
+    return (
+        ('actual_tasks', view(views.actual_tasks,
+                              reverse('todo_actual_tasks'), worker)),
+        ('task_detail', view(views.task_detail,
+                             reverse('todo_task_detail', args=[task.pk]),
+                             worker, task_id=task.pk)),
+        ('actual_chains', view(views.actual_chains,
+                               reverse('todo_actual_chains'), owner)),
+        ('dashboard', view(views.dashboard, reverse('todo_dashboard'),
+                           owner)),
+        ('Chain.timeline()', chain_method('timeline')),
+        ('Chain.actual_status()', chain_method('actual_status')),
+        ('Chain.expended_days()', chain_method('expended_days')),
+        ('Task.actual_status()', task_method('actual_status')),
+        ('Task.expended_days()', task_method('expended_days')),
+    )
+
+
+def measure(func, repeat):
+    """Возвращает количество запросов, лучшее время и пиковую память."""
+    best = None
+    for _ in range(repeat):
+        cache.clear()
+        reset_queries()
+        started = time.time()
+        func()
+        elapsed = (time.time() - started) * 1000
+        queries = len(connection.queries)
+        if best is None or elapsed < best:
+            best = elapsed
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return queries, best, max_rss
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """Возвращает описания замеров, превысивших базовые результаты."""
+    baseline = dict(
+        ((result['name'], result['chains'], result['tasks_per_chain']),
+         result) for result in baseline['results']
+    )
+    failed = []
+    for result in results:
+        base = baseline.get((result['name'], result['chains'],
+                             result['tasks_per_chain']))
+        if base is None:
+            continue
+        checks = (
+            ('queries', result['queries'] > base['queries']),
+            ('time_ms', result['time_ms'] > base['time_ms'] * time_tolerance),
+            ('max_rss_kb',
+             result['max_rss_kb'] > base['max_rss_kb'] * memory_tolerance),
+        )
+        for key, exceeded in checks:
+            if exceeded:
+                failed.append('{name} {chains}x{tasks}: {key} {value} > '
+                              '{base}'.format(
+                                  name=result['name'],
+                                  chains=result['chains'],
+                                  tasks=result['tasks_per_chain'],
+                                  key=key, value=result[key],
+                                  base=base[key]))
+    return failed
+
+
+def parse_scales(value):
+    """Разбирает масштабы вида 10x1,100x10."""
+    scales = []
+    for scale in value.split(','):
+        chains, tasks = scale.split('x')
+        scales.append((int(chains), int(tasks)))
+    return scales
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--scales', default=None,
+                      help='Comma-separated CHAINSxTASKS, e.g. 10x1,100x10.')
+    parser.add_option('--max-tasks', type='int', default=50000,
+                      help='Skip scales with more tasks.')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='Number of runs of each case.')
+    parser.add_option('--output', default='benchmark_results.json',
+                      help='File to write results to.')
+    parser.add_option('--baseline', default=BASELINE,
+                      help='File with baseline results.')
+    parser.add_option('--update-baseline', action='store_true',
+                      default=False, help='Write results as baseline.')
+    parser.add_option('--time-tolerance', type='float', default=3.0,
+                      help='Allowed ratio of time to baseline time.')
+    parser.add_option('--memory-tolerance', type='float', default=1.5,
+                      help='Allowed ratio of memory to baseline memory.')
+    options, args = parser.parse_args()
+
+    if options.scales:
+        scales = parse_scales(options.scales)
+    else:
+        scales = SCALES
+    scales = [(chains, tasks) for chains, tasks in scales
+              if chains * tasks <= options.max_tasks]
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    connection.use_debug_cursor = True
+    results = []
+    try:
+        for chains_count, tasks_per_chain in scales:
+            call_command('flush', interactive=False, verbosity=0)
+            started = time.time()
+            owner, worker = populate(chains_count, tasks_per_chain)
+            sys.stdout.write('{0}x{1}: generated in {2:.1f}s\n'.format(
+                chains_count, tasks_per_chain, time.time() - started))
+            for name, func in cases(owner, worker):
+                queries, elapsed, max_rss = measure(func, options.repeat)
+                sys.stdout.write(
+                    '    {0}: {1} queries, {2:.2f} ms, {3} KB\n'.format(
+                        name, queries, elapsed, max_rss))
+                results.append({
+                    'name': name,
+                    'chains': chains_count,
+                    'tasks_per_chain': tasks_per_chain,
+                    'queries': queries,
+                    'time_ms': round(elapsed, 2),
+                    'max_rss_kb': max_rss,
+                })
+    finally:
+        connection.use_debug_cursor = None
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = {'vendor': connection.vendor, 'results': results}
+    with open(options.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+    if options.update_baseline:
+        with open(options.baseline, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+        return
+
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as baseline:
+            failed = compare(results, json.load(baseline),
+                             options.time_tolerance, options.memory_tolerance)
+        if failed:
+            sys.stdout.write('\nExceeded baseline:\n')
+            for line in failed:
+                sys.stdout.write('    {0}\n'.format(line))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ setup(
     author_email='marselester@ya.ru',
     packages=[
         'todo',
+        'todo.management',
+        'todo.management.commands',
         'todo.templatetags',
     ],
     include_package_data=True,
@@ -6,6 +6,12 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 INSTALLED_APPS = (
     'todo',
     'pytils',
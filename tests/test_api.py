@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django_webtest import WebTest
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import override_settings
+
+from todo import api
+from todo.models import Change, Chain, Task
+from . import factories
+
+
+class TasksApiTest(WebTest):
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_user_not_logined(self):
+        response = self.app.get(reverse('todo_api_tasks'))
+        self.assertEqual(response.status_int, 302)
+
+    def test_tasks(self):
+        response = self.app.get(reverse('todo_api_tasks'), user='kazimir')
+        self.assertEqual(response.content_type, 'application/json')
+        items = response.json['items']
+        tasks = Task.objects.filter(worker__username='kazimir').actual()
+        self.assertEqual([item['id'] for item in items],
+                         [task.pk for task in tasks.order_by('deadline',
+                                                             'pk')])
+        for item in items:
+            task = Task.objects.get(pk=item['id'])
+            self.assertEqual(item['deadline'], task.deadline.isoformat())
+            self.assertEqual(item['duration'], task.duration())
+            self.assertEqual(item['expended_days'], task.expended_days())
+            self.assertEqual(item['days_quantity_after_deadline'],
+                             task.days_quantity_after_deadline())
+            self.assertEqual(item['url'], task.get_absolute_url())
+        self.assertEqual(response.json['next'], None)
+
+    def test_fields(self):
+        response = self.app.get(reverse('todo_api_tasks'), user='kazimir',
+                                params={'fields': 'id,status'})
+        for item in response.json['items']:
+            self.assertEqual(sorted(item), ['id', 'status'])
+            self.assertTrue(item['status'] in ('wait', 'work', 'done',
+                                               'stop'))
+
+    def test_bad_request(self):
+        for params in ({'fields': 'id,password'}, {'limit': '0'},
+                       {'limit': '1000'}, {'after': 'invalid'}):
+            response = self.app.get(reverse('todo_api_tasks'),
+                                    user='kazimir', params=params,
+                                    status=400)
+            self.assertTrue(response.json['error'])
+
+    def test_archive_pages(self):
+        Task.objects.update(archive=True)
+        expected = list(Task.objects.filter(worker__username='kazimir')
+                        .order_by('-deadline', '-pk')
+                        .values_list('pk', flat=True))
+        self.assertTrue(len(expected) > 2)
+        params = {'limit': '2', 'fields': 'id'}
+        pks = []
+        while True:
+            response = self.app.get(reverse('todo_api_task_archive'),
+                                    user='kazimir', params=params)
+            pks.extend(item['id'] for item in response.json['items'])
+            if response.json['next'] is None:
+                break
+            params['after'] = response.json['next']
+        self.assertEqual(pks, expected)
+
+
+class ChainsApiTest(WebTest):
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+
+    def test_user_not_logined(self):
+        response = self.app.get(reverse('todo_api_chains'))
+        self.assertEqual(response.status_int, 302)
+
+    def test_chains(self):
+        response = self.app.get(reverse('todo_api_chains'), user='alexander')
+        items = response.json['items']
+        chains = Chain.objects.filter(owner__username='alexander').actual()
+        self.assertEqual(len(items), chains.count())
+        for item in items:
+            chain = Chain.objects.get(pk=item['id'])
+            self.assertEqual(item['status'], chain.actual_status())
+            self.assertEqual(item['expended_days'], chain.expended_days())
+            self.assertEqual([task['id'] for task in item['tasks']],
+                             [task.pk for task in chain.timeline()])
+        task = items[0]['tasks'][0]
+        self.assertEqual(sorted(task['worker']), ['name', 'post'])
+
+    @override_settings(DEBUG=True)
+    def test_without_tasks(self):
+        """Задачи цепочек не выбираются, если поле не запрошено."""
+        # Запросы к базе записываются заново для каждого запроса к API.
+        response = self.app.get(reverse('todo_api_chains'), user='alexander',
+                                params={'fields': 'id,name,status'})
+        self.assertTrue(response.json['items'])
+        queries = [query['sql'] for query in connection.queries]
+        self.assertTrue([sql for sql in queries if 'todo_chain' in sql])
+        # Вход пользователя выбирает цепочки его задач, но не сами задачи.
+        self.assertFalse([sql for sql in queries
+                          if '"todo_task"."deadline"' in sql])
+
+    def test_task_fields(self):
+        response = self.app.get(reverse('todo_api_chains'), user='alexander',
+                                params={'fields': 'tasks',
+                                        'task_fields': 'id,worker'})
+        for item in response.json['items']:
+            self.assertEqual(sorted(item), ['tasks'])
+            for task in item['tasks']:
+                self.assertEqual(sorted(task), ['id', 'worker'])
+
+    def test_archive(self):
+        Chain.objects.filter(name='Chain was completed in time').update(
+            archive=True
+        )
+        response = self.app.get(reverse('todo_api_chain_archive'),
+                                user='alexander', params={'fields': 'name'})
+        self.assertEqual(response.json['items'],
+                         [{'name': 'Chain was completed in time'}])
+
+
+class FakeClock(object):
+    """Время, которое идет только во время ожидания."""
+    def __init__(self, on_sleep=None):
+        self.now = 0
+        self.on_sleep = on_sleep
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+
+class ChangesApiTest(WebTest):
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        self.chain = Chain.objects.get(name='Chain works')
+        self.task = self.chain.task_set.get(order=1)
+
+    def get(self, username, **params):
+        return self.app.get(reverse('todo_api_changes'), user=username,
+                            params=params).json
+
+    def clock(self, on_sleep=None):
+        clock = FakeClock(on_sleep)
+        self.addCleanup(setattr, api, 'time', api.time)
+        api.time = clock
+        return clock
+
+    def finish_task(self):
+        self.task.status = Task.DONE_STATUS
+        self.task.finish_date = datetime.date.today()
+        self.task.save()
+
+    def test_user_not_logined(self):
+        response = self.app.get(reverse('todo_api_changes'))
+        self.assertEqual(response.status_int, 302)
+
+    def test_changes(self):
+        worker = self.task.worker.username
+        next_task = self.chain.task_set.get(order=2)
+        # Курсор у каждого пользователя свой.
+        cursors = dict((username, self.get(username)['next']) for username
+                       in (worker, next_task.worker.username, 'alexander'))
+        cursor = cursors[worker]
+        self.assertEqual(self.get(worker, after=cursor),
+                         {'items': [], 'next': cursor, 'more': False})
+        self.finish_task()
+        feed = self.get(worker, after=cursor)
+        self.assertEqual(feed['items'], [{'type': 'task', 'id': self.task.pk,
+                                          'status': 'done',
+                                          'deleted': False}])
+        self.assertTrue(feed['next'] > cursor)
+        self.assertEqual(self.get(worker, after=feed['next'])['items'], [])
+        # Следующая задача перешла в работу, цепочка изменилась.
+        username = next_task.worker.username
+        items = self.get(username, after=cursors[username])['items']
+        self.assertTrue({'type': 'task', 'id': next_task.pk,
+                         'status': 'work', 'deleted': False} in items)
+        items = self.get('alexander', after=cursors['alexander'])['items']
+        self.assertEqual([(item['type'], item['id']) for item in items],
+                         [('chain', self.chain.pk)])
+
+    def test_latest_change(self):
+        """Объект, изменившийся несколько раз, возвращается один раз."""
+        worker = self.task.worker.username
+        cursor = self.get(worker)['next']
+        self.task.save()
+        self.finish_task()
+        items = self.get(worker, after=cursor)['items']
+        self.assertEqual([item['status'] for item in items], ['done'])
+
+    def test_delete(self):
+        cursor = self.get('alexander')['next']
+        chain_id = self.chain.pk
+        self.chain.delete()
+        items = self.get('alexander', after=cursor)['items']
+        self.assertEqual(items, [{'type': 'chain', 'id': chain_id,
+                                  'status': None, 'deleted': True}])
+
+    def test_uncommitted_change(self):
+        """Курсор не переходит через запись, которая еще не видна."""
+        worker = self.task.worker
+        cursor = self.get(worker.username)['next']
+        last = Change.objects.latest('pk').pk
+        # Запись last + 1 вставлена транзакцией, которая еще
+        # не подтверждена.
+        Change.objects.create(pk=last + 2, user=worker,
+                              kind=Change.TASK_KIND, object_id=1,
+                              status='work')
+        feed = self.get(worker.username, after=cursor)
+        self.assertEqual([item['id'] for item in feed['items']], [1])
+        self.assertEqual(feed['next'], last)
+        Change.objects.create(pk=last + 1, user=worker,
+                              kind=Change.TASK_KIND, object_id=2,
+                              status='work')
+        feed = self.get(worker.username, after=feed['next'])
+        self.assertEqual([item['id'] for item in feed['items']], [2, 1])
+        self.assertEqual(feed['next'], last + 2)
+
+    def test_rolled_back_change(self):
+        """Старый пропуск считается отмененной транзакцией."""
+        worker = self.task.worker
+        cursor = self.get(worker.username)['next']
+        last = Change.objects.latest('pk').pk
+        created = datetime.datetime.now() - datetime.timedelta(
+            seconds=api.SETTLE_TIME + 1)
+        change = Change.objects.create(pk=last + 2, user=worker,
+                                       kind=Change.TASK_KIND, object_id=1,
+                                       status='work')
+        Change.objects.filter(pk=change.pk).update(created=created)
+        feed = self.get(worker.username, after=cursor)
+        self.assertEqual(feed['next'], last + 2)
+
+    def test_task_reassigned(self):
+        """Прежний исполнитель получает удаление задачи."""
+        worker = self.task.worker.username
+        cursor = self.get(worker)['next']
+        self.task.worker = User.objects.get(username='ada')
+        self.task.save()
+        items = self.get(worker, after=cursor)['items']
+        self.assertTrue({'type': 'task', 'id': self.task.pk,
+                         'status': None, 'deleted': True} in items)
+
+    def test_chain_owner_changed(self):
+        """Прежний владелец получает удаление цепочки."""
+        cursor = self.get('alexander')['next']
+        self.chain.owner = User.objects.get(username='ada')
+        self.chain.save()
+        items = self.get('alexander', after=cursor)['items']
+        self.assertEqual(items, [{'type': 'chain', 'id': self.chain.pk,
+                                  'status': None, 'deleted': True}])
+
+    def test_predecessor_deadline(self):
+        """Перенос дедлайна меняет дни, выделенные на следующую задачу."""
+        chain = Chain.objects.get(name='Chain was completed in time')
+        task = chain.task_set.get(order=1)
+        next_task = chain.task_set.get(order=2)
+        username = next_task.worker.username
+        cursor = self.get(username)['next']
+        task.deadline -= datetime.timedelta(days=1)
+        task.save()
+        items = self.get(username, after=cursor)['items']
+        self.assertTrue(next_task.pk in [item['id'] for item in items])
+
+    @override_settings(TODO_CHANGES_MAX_WAIT=30)
+    def test_long_polling(self):
+        """Ответ ждет изменения, проверяя только версию в кэше."""
+        worker = self.task.worker.username
+        cursor = self.get(worker)['next']
+        clock = self.clock(on_sleep=lambda: clock.now == 3 and
+                           self.finish_task())
+        feed = self.get(worker, after=cursor, wait=10)
+        self.assertEqual(clock.now, 3)
+        self.assertEqual([item['id'] for item in feed['items']],
+                         [self.task.pk])
+
+    @override_settings(DEBUG=True, TODO_CHANGES_MAX_WAIT=30)
+    def test_long_polling_timeout(self):
+        worker = self.task.worker.username
+        cursor = self.get(worker)['next']
+        clock = self.clock()
+        feed = self.get(worker, after=cursor, wait=5)
+        self.assertEqual(clock.now, 5)
+        self.assertEqual(feed['items'], [])
+        self.assertEqual(len([query for query in connection.queries
+                              if 'todo_change' in query['sql']]), 1)
+
+    def test_long_polling_disabled(self):
+        """Без настройки ответ не ждет изменений."""
+        worker = self.task.worker.username
+        cursor = self.get(worker)['next']
+        clock = self.clock()
+        feed = self.get(worker, after=cursor, wait=10)
+        self.assertEqual(clock.now, 0)
+        self.assertEqual(feed['items'], [])
+
+    @override_settings(TODO_CHANGES_MAX_WAIT=5)
+    def test_long_polling_limit(self):
+        """Ожидание ограничено настройкой."""
+        worker = self.task.worker.username
+        cursor = self.get(worker)['next']
+        clock = self.clock()
+        self.get(worker, after=cursor, wait=100)
+        self.assertEqual(clock.now, 5)
+
+    def test_bad_request(self):
+        for params in ({'after': '-1'}, {'wait': 'soon'}, {'limit': 'all'}):
+            response = self.app.get(reverse('todo_api_changes'),
+                                    user='alexander', params=params,
+                                    status=400)
+            self.assertTrue(response.json['error'])
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template import Context
+from django.template.loader import get_template
+from django.test import TestCase
+from django.utils import unittest
+
+from django.contrib.auth.models import update_last_login
+
+from todo.caching import (WORKER_LABEL_VERSION_KEY, WorkerLabel,
+                          archive_months, chain_version, user_version,
+                          worker_labels)
+from todo.models import Chain, Task
+from todo.presenters import chain_rows
+from todo.utils import LRUCache
+from . import factories
+
+
+class ChainFragmentCacheTest(TestCase):
+    """Тестирует кэширование отображения цепочки."""
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        self.template = get_template('todo/includes/chain.html')
+
+    def render(self, chain_id):
+        chains = chain_rows(Chain.objects.with_summary().filter(pk=chain_id))
+        return self.template.render(Context({'chain': chains[0]}))
+
+    def test_cached(self):
+        """Повторное отображение цепочки не делает запросов к задачам."""
+        chain = Chain.objects.get(name='Chain works')
+        html = self.render(chain.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render(chain.pk), html)
+
+    def test_task_save(self):
+        """Сохранение задачи меняет версию и отображение цепочки."""
+        chain = Chain.objects.get(name='Chain works')
+        version = chain_version(chain.pk)
+        html = self.render(chain.pk)
+        task = Task.objects.get(chain=chain, order=1)
+        task.status = Task.DONE_STATUS
+        task.finish_date = datetime.date.today()
+        task.save()
+        self.assertNotEqual(chain_version(chain.pk), version)
+        self.assertNotEqual(self.render(chain.pk), html)
+
+    def test_worker_save(self):
+        """Изменение имени исполнителя меняет отображение цепочки."""
+        chain = Chain.objects.get(name='Chain works')
+        self.render(chain.pk)
+        worker = Task.objects.get(chain=chain, order=1).worker
+        worker.first_name = u'Василий'
+        worker.save()
+        self.assertIn(u'Василий', self.render(chain.pk))
+
+
+class ArchiveMonthsTest(TestCase):
+    """Тестирует кэширование месяцев архива задач."""
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        Task.objects.update(archive=True)
+        self.worker = User.objects.get(username='kazimir')
+        self.tasks = Task.objects.by_worker(self.worker).archived()
+
+    def test_cached(self):
+        months = archive_months(self.worker.pk, self.tasks)
+        self.assertTrue(months)
+        with self.assertNumQueries(0):
+            self.assertEqual(archive_months(self.worker.pk, self.tasks),
+                             months)
+
+    def test_task_save(self):
+        """Сохранение задачи исполнителя обновляет месяцы."""
+        archive_months(self.worker.pk, self.tasks)
+        task = self.tasks[0]
+        task.deadline = datetime.date(2000, 1, 10)
+        task.save()
+        months = archive_months(self.worker.pk, self.tasks)
+        self.assertEqual(months[-1], datetime.datetime(2000, 1, 1))
+
+
+class WorkerLabelsTest(TestCase):
+    """Тестирует подписи исполнителей в памяти процесса."""
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        self.worker = User.objects.get(username='kazimir')
+
+    def test_label(self):
+        labels = worker_labels([self.worker.pk])
+        self.assertEqual(labels, {
+            self.worker.pk: WorkerLabel(u'Казимир Малевич', u'Дизайнер'),
+        })
+        with self.assertNumQueries(0):
+            worker_labels([self.worker.pk])
+
+    def test_user_save(self):
+        worker_labels([self.worker.pk])
+        self.worker.last_name = u'Северинович'
+        self.worker.save()
+        label = worker_labels([self.worker.pk])[self.worker.pk]
+        self.assertEqual(label.name, u'Казимир Северинович')
+
+    def test_profile_save(self):
+        worker_labels([self.worker.pk])
+        profile = self.worker.staff_profile
+        profile.post = u'Художник'
+        profile.save()
+        label = worker_labels([self.worker.pk])[self.worker.pk]
+        self.assertEqual(label.post, u'Художник')
+
+    def test_other_process(self):
+        """Новая версия подписи сбрасывает подпись в памяти процесса."""
+        worker_labels([self.worker.pk])
+        # Как будто сотрудника сохранил другой процесс.
+        User.objects.filter(pk=self.worker.pk).update(last_name=u'Малевич2')
+        key = WORKER_LABEL_VERSION_KEY.format(user_id=self.worker.pk)
+        cache.set(key, cache.get(key, 0) + 1)
+        label = worker_labels([self.worker.pk])[self.worker.pk]
+        self.assertEqual(label.name, u'Казимир Малевич2')
+
+    def test_login(self):
+        """Вход пользователя не сбрасывает подписи и версии."""
+        chain = Chain.objects.get(name='Chain works')
+        other = User.objects.get(username='andy')
+        worker_labels([self.worker.pk, other.pk])
+        version = chain_version(chain.pk)
+        owner_version = user_version(chain.owner_id)
+        # SELECT и UPDATE самого пользователя.
+        with self.assertNumQueries(2):
+            update_last_login(None, self.worker)
+        self.assertEqual(chain_version(chain.pk), version)
+        self.assertEqual(user_version(chain.owner_id), owner_version)
+        with self.assertNumQueries(0):
+            worker_labels([self.worker.pk, other.pk])
+
+    def test_other_worker_kept(self):
+        """Изменение подписи сотрудника не сбрасывает чужие подписи."""
+        other = User.objects.get(username='andy')
+        worker_labels([self.worker.pk, other.pk])
+        self.worker.first_name = u'Казимеж'
+        self.worker.save()
+        with self.assertNumQueries(1):
+            labels = worker_labels([self.worker.pk, other.pk])
+        self.assertEqual(labels[self.worker.pk].name, u'Казимеж Малевич')
+
+    def test_without_profile(self):
+        user = User.objects.create(username='noprofile', first_name='Иван')
+        self.assertEqual(worker_labels([user.pk])[user.pk].post, u'')
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_eviction(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.set('c', 3)
+        # Ключ b использовался раньше всех.
+        self.assertEqual(lru.get('b'), None)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(len(lru), 2)
+
+    def test_delete_and_clear(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('a', 2)
+        self.assertEqual(len(lru), 1)
+        lru.delete('a')
+        self.assertEqual(lru.get('a'), None)
+        lru.set('b', 1)
+        lru.clear()
+        self.assertEqual(len(lru), 0)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import unittest
+
+from todo import calendars, reports
+from todo.calendars import Calendar, WorkCalendar
+from todo.models import Chain, Task
+from . import factories
+
+TODAY = datetime.date.today()
+# Праздники рядом с сегодняшним днем, чтобы они попадали в сроки задач.
+WORK_CALENDAR = WorkCalendar(holidays=[
+    TODAY + datetime.timedelta(days=days) for days in (-6, -1, 0, 3, 8)
+])
+
+
+def brute_force_count(calendar, begin, end):
+    """Считает рабочие дни перебором дат."""
+    count = 0
+    day = begin
+    while day < end:
+        if (calendar.workdays[day.weekday()] and
+                day not in calendar.holidays):
+            count += 1
+        day += datetime.timedelta(days=1)
+    return count
+
+
+class WorkCalendarTest(unittest.TestCase):
+    def setUp(self):
+        self.dates = [TODAY + datetime.timedelta(days=days)
+                      for days in range(-20, 21)]
+
+    def test_count(self):
+        for begin in self.dates:
+            for end in self.dates:
+                expected = (brute_force_count(WORK_CALENDAR, begin, end)
+                            if begin <= end else
+                            -brute_force_count(WORK_CALENDAR, end, begin))
+                self.assertEqual(WORK_CALENDAR.count(begin, end), expected)
+
+    def test_shift(self):
+        for begin in self.dates:
+            for days in range(15):
+                end = WORK_CALENDAR.shift(begin, days)
+                self.assertEqual(WORK_CALENDAR.count(begin, end), days)
+                if end > begin:
+                    self.assertTrue(WORK_CALENDAR.count(
+                        begin, end - datetime.timedelta(days=1)) < days)
+
+    def test_weekmask(self):
+        calendar = WorkCalendar(weekmask='0000011')
+        monday = datetime.date(2013, 4, 1)
+        self.assertEqual(calendar.count(monday, monday +
+                                        datetime.timedelta(days=14)), 4)
+        self.assertRaises(ValueError, WorkCalendar, weekmask='11111')
+
+    def test_default_calendar(self):
+        self.assertEqual(calendars.get_calendar().count(
+            TODAY, TODAY + datetime.timedelta(days=10)), 10)
+
+    @override_settings(TODO_CALENDAR='tests.test_calendars.MISSING')
+    def test_missing_calendar(self):
+        self.assertRaises(ImproperlyConfigured, calendars.get_calendar)
+
+    @unittest.skipIf(calendars.numpy is None, 'NumPy is not installed.')
+    def test_count_array(self):
+        numpy = calendars.numpy
+        begins = numpy.array([begin for begin in self.dates
+                              for end in self.dates], dtype='datetime64[D]')
+        ends = numpy.array([end for begin in self.dates
+                            for end in self.dates], dtype='datetime64[D]')
+        expected = [WORK_CALENDAR.count(begin, end) for begin in self.dates
+                    for end in self.dates]
+        self.assertEqual(
+            list(WORK_CALENDAR.count_array(begins, ends)), expected)
+        expected = [Calendar().count(begin, end) for begin in self.dates
+                    for end in self.dates]
+        self.assertEqual(list(Calendar().count_array(begins, ends)),
+                         expected)
+
+
+@override_settings(TODO_CALENDAR='tests.test_calendars.WORK_CALENDAR')
+class WorkCalendarTimelineTest(TestCase):
+    """Показатели задач считаются в рабочих днях."""
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_task_methods(self):
+        for chain in Chain.objects.all():
+            begin = chain.start_date
+            for task in chain.task_set.order_by('order'):
+                self.assertEqual(task.duration(), brute_force_count(
+                    WORK_CALENDAR, begin, task.deadline))
+                begin = task.deadline
+
+    def test_chain_timeline(self):
+        """Показатели за один проход совпадают с методами задачи."""
+        for chain in Chain.objects.all():
+            for task in chain.timeline():
+                single_task = Task.objects.get(pk=task.pk)
+                self.assertEqual(task.duration(), single_task.duration())
+                self.assertEqual(task.days_to_start(),
+                                 single_task.days_to_start())
+                self.assertEqual(task.days_quantity_after_deadline(),
+                                 single_task.days_quantity_after_deadline())
+                self.assertEqual(task.expended_days(),
+                                 single_task.expended_days())
+
+    @unittest.skipIf(reports.numpy is None, 'NumPy is not installed.')
+    def test_reports(self):
+        columns = reports.load_tasks(Task.objects.all())
+        timelines = reports.task_timelines(columns)
+        tasks = Task.objects.order_by('chain', 'order')
+        for index, task in enumerate(tasks):
+            for name in ('duration', 'days_quantity_after_deadline',
+                         'expended_days'):
+                value = timelines[name][index]
+                value = None if reports.numpy.isnan(value) else int(value)
+                self.assertEqual(value, getattr(task, name)())
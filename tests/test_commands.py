@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from todo.caching import chain_version
+from todo.models import (Change, Chain, ChainSummary, Reminder,
+                         StaffProfile, Task)
+from . import factories
+
+
+class RefreshTaskStatusesTest(TestCase):
+    """Тестирует пересчет сохраненных статусов задач."""
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+
+    def test_chain_start_date_arrives(self):
+        """Первая задача переходит в WORK, когда наступает начало цепочки."""
+        chain = Chain.objects.get(name='Chain waits')
+        today = datetime.date.today()
+        # Цепочка начинается завтра. Как будто прошел один день.
+        Chain.objects.filter(pk=chain.pk).update(start_date=today)
+        Task.objects.filter(chain=chain, order=1).update(
+            effective_start_date=today
+        )
+        last_change = Change.objects.latest('pk').pk
+        version = chain_version(chain.pk)
+        call_command('refresh_task_statuses', verbosity=0)
+        # Отображение цепочки в кэше сбрасывается.
+        self.assertNotEqual(chain_version(chain.pk), version)
+        design = Task.objects.get(chain=chain, order=1)
+        self.assertEqual(design.effective_status, Task.WORK_STATUS)
+        layout = Task.objects.get(chain=chain, order=2)
+        self.assertEqual(layout.effective_status, Task.WAIT_STATUS)
+        # Переход задачи в работу записан в журнал изменений.
+        changes = Change.objects.filter(pk__gt=last_change)
+        self.assertTrue(changes.filter(
+            kind=Change.TASK_KIND, object_id=design.pk,
+            user=design.worker_id, status=Chain.WORK_STATUS
+        ).exists())
+        self.assertTrue(changes.filter(
+            kind=Change.CHAIN_KIND, object_id=chain.pk, user=chain.owner_id,
+            status=Chain.WORK_STATUS
+        ).exists())
+
+    def test_all(self):
+        """Пересчет всех задач заполняет сохраненные статусы."""
+        Task.objects.update(effective_status=Task.UNCERTAIN_STATUS,
+                            effective_start_date=None)
+        call_command('refresh_task_statuses', all=True, verbosity=0)
+        for task in Task.objects.all():
+            self.assertEqual(task.effective_status, task.actual_status())
+            self.assertEqual(task.effective_start_date, task.start_date())
+
+    def test_chain_summary_start_date_arrives(self):
+        """Статус цепочки в сводке меняется, когда наступает ее начало."""
+        chain = Chain.objects.get(name='Chain waits')
+        self.assertEqual(chain.summary.status, Chain.WAIT_STATUS)
+        Chain.objects.filter(pk=chain.pk).update(
+            start_date=datetime.date.today()
+        )
+        call_command('refresh_task_statuses', verbosity=0)
+        summary = ChainSummary.objects.get(chain=chain)
+        self.assertEqual(summary.status, Chain.WORK_STATUS)
+
+    def test_forecast_overrun(self):
+        """Прогноз незавершенной задачи сдвигается со сменой даты."""
+        today = datetime.date.today()
+        days = lambda count: today + datetime.timedelta(days=count)
+        chain = factories.ChainFactory(start_date=days(-10))
+        factories.TaskFactory(chain=chain, deadline=days(-5))
+        factories.TaskFactory(chain=chain, deadline=days(2))
+        # Как будто прогноз рассчитан вчера.
+        chain.task_set.filter(order=1).update(forecast_finish_date=days(-1))
+        chain.task_set.filter(order=2).update(forecast_start_date=days(0),
+                                              forecast_finish_date=days(6))
+        ChainSummary.objects.filter(chain=chain).update(
+            forecast_finish_date=days(6))
+        version = chain_version(chain.pk)
+        call_command('refresh_task_statuses', verbosity=0)
+        self.assertNotEqual(chain_version(chain.pk), version)
+        forecasts = chain.task_set.order_by('order').values_list(
+            'forecast_start_date', 'forecast_finish_date')
+        self.assertEqual(list(forecasts), [(days(-10), days(0)),
+                                           (days(1), days(7))])
+        summary = ChainSummary.objects.get(chain=chain)
+        self.assertEqual(summary.forecast_finish_date, days(7))
+
+    def test_forecast_overrun_after_gap(self):
+        """Прогноз считается от ближайшей предыдущей задачи."""
+        today = datetime.date.today()
+        days = lambda count: today + datetime.timedelta(days=count)
+        chain = factories.ChainFactory(start_date=days(-10))
+        factories.TaskFactory(chain=chain, deadline=days(-8),
+                              status=Task.DONE_STATUS, finish_date=days(-8))
+        factories.TaskFactory(chain=chain, deadline=days(-6)).delete()
+        task = factories.TaskFactory(chain=chain, deadline=days(-5))
+        # Как будто прогноз рассчитан вчера.
+        chain.task_set.filter(pk=task.pk).update(
+            forecast_finish_date=days(-1))
+        call_command('refresh_task_statuses', verbosity=0)
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.effective_start_date, days(-7))
+        self.assertEqual((task.forecast_start_date, task.forecast_finish_date),
+                         (days(-7), days(0)))
+
+
+class GenerateFixturesTest(TestCase):
+    """Тестирует заполнение базы синтетическими данными."""
+    def generate(self, **options):
+        call_command('generate_fixtures', users=10, chains=20,
+                     tasks_per_chain=5, batch_size=7, verbosity=0, **options)
+
+    def test_counts(self):
+        self.generate()
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(StaffProfile.objects.count(), 10)
+        self.assertEqual(Chain.objects.count(), 20)
+        self.assertEqual(ChainSummary.objects.count(), 20)
+        for chain in Chain.objects.all():
+            self.assertEqual(chain.last_order, chain.task_set.count())
+
+    def test_same_as_model_methods(self):
+        """Сохраненные статусы и сводки совпадают с рассчитанными."""
+        self.generate()
+        for task in Task.objects.all():
+            self.assertEqual(task.effective_status, task.actual_status())
+            self.assertEqual(task.effective_start_date, task.start_date())
+        fields = ('tasks_count', 'done_tasks_count', 'has_stopped_task',
+                  'last_task_done', 'deadline', 'finish_date', 'status')
+        for chain in Chain.objects.with_summary():
+            stored = chain.summary
+            calculated = chain.refresh_summary()
+            for field in fields:
+                self.assertEqual(getattr(stored, field),
+                                 getattr(calculated, field))
+
+    def test_seed(self):
+        """Одинаковое зерно дает одинаковые данные."""
+        self.generate(prefix='first')
+        self.generate(prefix='second')
+        first = Task.objects.filter(chain__owner__username__startswith='f')
+        second = Task.objects.filter(chain__owner__username__startswith='s')
+        fields = ('order', 'deadline', 'finish_date', 'status')
+        self.assertEqual(list(first.order_by('pk').values_list(*fields)),
+                         list(second.order_by('pk').values_list(*fields)))
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    """Считает открытые соединения и отправленные пачки писем."""
+    opened = 0
+    batches = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        CountingEmailBackend.batches += 1
+        return super(CountingEmailBackend, self).send_messages(messages)
+
+
+class SendTaskRemindersTest(TestCase):
+    """Тестирует отправку напоминаний о задачах."""
+    def setUp(self):
+        today = datetime.date.today()
+        self.days = lambda count: today + datetime.timedelta(days=count)
+        chain = factories.ChainFactory(start_date=self.days(-10))
+        factories.TaskFactory(chain=chain, deadline=self.days(-2),
+                              status=Task.DONE_STATUS,
+                              finish_date=self.days(-1))
+        # Вторая задача перешла в работу, до ее дедлайна остался день.
+        self.started = factories.TaskFactory(chain=chain,
+                                             deadline=self.days(2))
+        self.worker = self.started.worker
+        # Третья задача ждет второй.
+        factories.TaskFactory(chain=chain, deadline=self.days(5))
+        self.overdue = factories.TaskFactory(
+            worker=self.worker, deadline=self.days(-1),
+            chain=factories.ChainFactory(start_date=self.days(-5))
+        )
+
+    def test_grouped_by_worker(self):
+        call_command('send_task_reminders', verbosity=0)
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, [self.worker.email])
+        self.assertTrue(self.started.task in message.body)
+        self.assertTrue(self.overdue.task in message.body)
+        reminders = Reminder.objects.values_list('task', 'kind')
+        self.assertEqual(sorted(reminders), sorted([
+            (self.started.pk, Reminder.STARTED_KIND),
+            (self.started.pk, Reminder.DUE_KIND),
+            (self.overdue.pk, Reminder.OVERDUE_KIND),
+        ]))
+
+    def test_rerun(self):
+        """Повторный запуск не отправляет напоминания снова."""
+        call_command('send_task_reminders', verbosity=0)
+        call_command('send_task_reminders', verbosity=0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_deadline_moved(self):
+        """После переноса дедлайна напоминание отправляется снова."""
+        call_command('send_task_reminders', verbosity=0)
+        Task.objects.filter(pk=self.overdue.pk).update(deadline=self.days(0))
+        call_command('send_task_reminders', verbosity=0)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertTrue(self.overdue.task in mail.outbox[1].body)
+        self.assertFalse(self.started.task in mail.outbox[1].body)
+
+    def test_done_tasks(self):
+        Task.objects.update(status=Task.DONE_STATUS,
+                            finish_date=self.days(0))
+        call_command('send_task_reminders', verbosity=0)
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(
+        EMAIL_BACKEND='tests.test_commands.CountingEmailBackend')
+    def test_batches(self):
+        """Письма отправляются пачками через одно соединение."""
+        for days in range(4):
+            factories.TaskFactory(deadline=self.days(-days),
+                                  chain=self.overdue.chain)
+        CountingEmailBackend.opened = CountingEmailBackend.batches = 0
+        call_command('send_task_reminders', batch_size=2, verbosity=0)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(CountingEmailBackend.batches, 3)
+
+
+class PruneChangesTest(TestCase):
+    """Тестирует удаление старых записей журнала изменений."""
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_prune(self):
+        pks = list(Change.objects.order_by('pk').values_list('pk',
+                                                             flat=True))
+        self.assertTrue(len(pks) > 3)
+        old = datetime.datetime.now() - datetime.timedelta(days=31)
+        Change.objects.filter(pk__lte=pks[2]).update(created=old)
+        call_command('prune_changes', days=30, batch_size=2, verbosity=0)
+        self.assertEqual(
+            list(Change.objects.order_by('pk').values_list('pk', flat=True)),
+            pks[3:])
+
+    def test_nothing_to_prune(self):
+        count = Change.objects.count()
+        call_command('prune_changes', verbosity=0)
+        self.assertEqual(Change.objects.count(), count)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import datetime
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth.models import User
 
@@ -31,3 +32,228 @@ class ChainDoneLateTest(ChainTest):
 
 class ChainStopTest(ChainTest):
     """Тестирует случай, когда цепочка остановлена."""
+
+
+class TaskWithTimelineTest(TestCase):
+    """Тестирует выборку задач с данными для расчета показателей."""
+    def setUp(self):
+        factories.make_fixtures()
+        self.programmer = User.objects.get(username='ada')
+
+    def test_one_query(self):
+        """Показатели задач рассчитываются без дополнительных запросов."""
+        tasks = Task.objects.by_worker(self.programmer).actual()
+        with self.assertNumQueries(1):
+            for task in tasks.with_timeline():
+                task.actual_status()
+                task.be_in_time()
+                task.days_to_start()
+                task.remaining_days()
+                task.days_quantity_after_deadline()
+
+    def test_same_as_task_methods(self):
+        """Показатели совпадают с рассчитанными по предыдущей задаче."""
+        tasks = Task.objects.by_worker(self.programmer).actual()
+        for task in tasks.with_timeline():
+            single_task = Task.objects.get(pk=task.pk)
+            self.assertEqual(task.actual_status(),
+                             single_task.actual_status())
+            self.assertEqual(task.start_date(), single_task.start_date())
+            self.assertEqual(task.days_to_start(),
+                             single_task.days_to_start())
+            self.assertEqual(task.days_quantity_after_deadline(),
+                             single_task.days_quantity_after_deadline())
+            self.assertEqual(task.expended_days(),
+                             single_task.expended_days())
+
+
+class ChainWithTimelineTest(TestCase):
+    """Тестирует выборку цепочек вместе с задачами и исполнителями."""
+    def setUp(self):
+        factories.make_fixtures()
+        self.manager = User.objects.get(username='alexander')
+
+    def render_chains(self):
+        chains = Chain.objects.by_owner(self.manager).actual()
+        for chain in chains.with_timeline():
+            chain.actual_status()
+            chain.deadline()
+            chain.be_in_time()
+            for task in chain.timeline():
+                task.actual_status()
+                task.duration()
+                task.worker_label()
+
+    def test_bounded_queries(self):
+        """Цепочки, задачи и подписи исполнителей выбираются тремя запросами.
+        """
+        cache.clear()
+        with self.assertNumQueries(3):
+            self.render_chains()
+
+    def test_worker_labels_cached(self):
+        """Подписи исполнителей берутся из памяти процесса."""
+        self.render_chains()
+        with self.assertNumQueries(2):
+            self.render_chains()
+
+    def test_same_as_chain_methods(self):
+        """Показатели совпадают с рассчитанными без предзагрузки задач."""
+        chains = Chain.objects.by_owner(self.manager).actual()
+        for chain in chains.with_timeline():
+            single_chain = Chain.objects.get(pk=chain.pk)
+            self.assertEqual(chain.actual_status(),
+                             single_chain.actual_status())
+            self.assertEqual(chain.deadline(), single_chain.deadline())
+            self.assertEqual(chain.finish_date(), single_chain.finish_date())
+            self.assertEqual(chain.expended_days(),
+                             single_chain.expended_days())
+            self.assertEqual(
+                [task.pk for task in chain.timeline()],
+                [task.pk for task in single_chain.timeline()]
+            )
+
+
+class ChainSummaryTest(TestCase):
+    """Тестирует выборку цепочек по сводке."""
+    def setUp(self):
+        factories.make_fixtures()
+        self.manager = User.objects.get(username='alexander')
+
+    def test_same_as_chain_methods(self):
+        """Сводка совпадает с показателями, рассчитанными по задачам."""
+        chains = Chain.objects.by_owner(self.manager)
+        for chain in chains.with_summary():
+            single_chain = Chain.objects.get(pk=chain.pk)
+            self.assertEqual(chain.actual_status(),
+                             single_chain.actual_status())
+            self.assertEqual(chain.summary.status,
+                             single_chain.actual_status())
+            self.assertEqual(chain.deadline(), single_chain.deadline())
+            self.assertEqual(chain.finish_date(), single_chain.finish_date())
+            self.assertEqual(chain.summary.tasks_count,
+                             single_chain.task_set.count())
+
+    def test_one_query(self):
+        """Статус и дедлайн цепочек выбираются одним запросом."""
+        chains = Chain.objects.by_owner(self.manager).with_summary()
+        with self.assertNumQueries(1):
+            for chain in chains:
+                chain.actual_status()
+                chain.deadline()
+                chain.finish_date()
+
+    def test_by_status(self):
+        """Цепочки фильтруются по статусу в SQL."""
+        chains = Chain.objects.by_status(Chain.STOP_STATUS)
+        self.assertEqual([chain.name for chain in chains],
+                         ['Chain was stopped'])
+
+    def test_task_save(self):
+        """Сохранение задачи обновляет сводку по цепочке."""
+        chain = Chain.objects.get(name='Chain works')
+        for task in chain.task_set.all():
+            task.status = Task.DONE_STATUS
+            task.finish_date = datetime.date.today()
+            task.save()
+        summary = Chain.objects.with_summary().get(pk=chain.pk).summary
+        self.assertEqual(summary.status, Chain.DONE_STATUS)
+        self.assertEqual(summary.done_tasks_count, 4)
+        self.assertEqual(summary.finish_date, datetime.date.today())
+
+
+class DeadlineFiltersTest(TestCase):
+    """Тестирует выборку задач и цепочек по срокам в базе."""
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_task_annotations(self):
+        for task in Task.objects.with_deadline_days():
+            self.assertEqual(task.days_before_deadline,
+                             task.remaining_days())
+            self.assertEqual(task.days_after_deadline,
+                             task.days_quantity_after_deadline())
+
+    def test_chain_annotations(self):
+        for chain in Chain.objects.with_deadline_days():
+            self.assertEqual(chain.days_before_deadline,
+                             chain.remaining_days())
+            self.assertEqual(chain.days_after_deadline,
+                             chain.days_quantity_after_deadline())
+
+    def test_task_filters(self):
+        tasks = list(Task.objects.all())
+        self.assertEqual(
+            set(Task.objects.overdue()),
+            set(task for task in tasks if not task.be_in_time())
+        )
+        self.assertEqual(
+            set(Task.objects.overdue(done=False)),
+            set(task for task in tasks if not task.be_in_time()
+                and task.status != Task.DONE_STATUS)
+        )
+        for days in (0, 1, 3, 10):
+            self.assertEqual(
+                set(Task.objects.due_within(days)),
+                set(task for task in tasks
+                    if task.status != Task.DONE_STATUS
+                    and task.remaining_days() is not None
+                    and task.remaining_days() <= days)
+            )
+            self.assertEqual(
+                set(Task.objects.starting_within(days)),
+                set(task for task in tasks
+                    if task.days_to_start() is not None
+                    and task.days_to_start() <= days)
+            )
+
+    def test_chain_filters(self):
+        chains = list(Chain.objects.all())
+        self.assertEqual(
+            set(Chain.objects.overdue()),
+            set(chain for chain in chains if not chain.be_in_time())
+        )
+        for days in (0, 1, 3, 10):
+            self.assertEqual(
+                set(Chain.objects.due_within(days)),
+                set(chain for chain in chains
+                    if chain.actual_status() != Chain.DONE_STATUS
+                    and chain.remaining_days() is not None
+                    and chain.remaining_days() <= days)
+            )
+            self.assertEqual(
+                set(Chain.objects.starting_within(days)),
+                set(chain for chain in chains
+                    if chain.days_to_start() is not None
+                    and chain.days_to_start() <= days)
+            )
+
+
+class DashboardCountsTest(TestCase):
+    """Тестирует подсчет цепочек и задач с группировкой в базе."""
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_status_counts_by_owner(self):
+        expected = {}
+        for chain in Chain.objects.all():
+            owner_counts = expected.setdefault(chain.owner_id, {})
+            status = chain.actual_status()
+            owner_counts[status] = owner_counts.get(status, 0) + 1
+        with self.assertNumQueries(1):
+            counts = Chain.objects.actual().status_counts_by_owner()
+        self.assertEqual(counts, expected)
+
+    def test_open_counts_by_worker(self):
+        expected = {}
+        for task in Task.objects.all():
+            if task.actual_status() == Task.DONE_STATUS:
+                continue
+            worker_counts = expected.setdefault(task.worker_id,
+                                                {'open': 0, 'overdue': 0})
+            worker_counts['open'] += 1
+            if not task.be_in_time():
+                worker_counts['overdue'] += 1
+        with self.assertNumQueries(2):
+            counts = Task.objects.actual().open_counts_by_worker()
+        self.assertEqual(counts, expected)
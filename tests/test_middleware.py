@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from django_webtest import WebTest
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from todo import profiling
+from todo.models import Task
+from . import factories
+
+
+class ProfilingMiddlewareTest(WebTest):
+    def setUp(self):
+        factories.make_fixtures()
+
+    def _patch_settings(self):
+        super(ProfilingMiddlewareTest, self)._patch_settings()
+        settings.MIDDLEWARE_CLASSES.append(
+            'todo.middleware.ProfilingMiddleware'
+        )
+
+    def test_headers(self):
+        response = self.app.get(reverse('todo_actual_tasks'), user='kazimir')
+        self.assertTrue(int(response.headers['X-Todo-Queries']) > 0)
+        self.assertTrue(float(response.headers['X-Todo-DB-Time']) >= 0)
+        self.assertTrue(float(response.headers['X-Todo-Render-Time']) > 0)
+        assert ('presenters.task_rows;calls=' in
+                response.headers['X-Todo-Methods'])
+
+    def test_profile_stopped(self):
+        self.app.get(reverse('todo_actual_tasks'), user='kazimir')
+        self.assertEqual(profiling.current(), None)
+
+
+class ProfileTest(TestCase):
+    def setUp(self):
+        factories.make_fixtures()
+
+    def tearDown(self):
+        profiling.stop()
+
+    def test_sql_shape(self):
+        self.assertEqual(
+            profiling.sql_shape("SELECT * FROM t WHERE a = 1 AND b = 'x' "
+                                "AND c IN (1, 2, 3)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)'
+        )
+
+    def test_duplicates(self):
+        """Запросы предыдущей задачи группируются по форме."""
+        profile = profiling.Profile()
+        profile.queries = [
+            {'sql': 'SELECT * FROM todo_task WHERE order = 1', 'time': '0'},
+            {'sql': 'SELECT * FROM todo_task WHERE order = 2', 'time': '0'},
+            {'sql': 'SELECT * FROM todo_chain', 'time': '0'},
+        ]
+        self.assertEqual(profile.duplicates(), [
+            ('SELECT * FROM todo_task WHERE order = ?', 2),
+        ])
+
+    def test_methods(self):
+        """Вычисляемые методы записывают время в активный профиль."""
+        profile = profiling.start()
+        task = Task.objects.get(chain__name='Chain works', order=2)
+        task.actual_status()
+        task.actual_status()
+        self.assertEqual(profile.methods['Task.timeline'][1], 1)
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
 
-from django.test import TestCase
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth.models import User
 
-from todo.models import Chain, Task
+from todo.models import Chain, ChainSummary, Task
 from . import factories
 
 
@@ -394,3 +395,314 @@ class ChainActualStatusTest(TestCase):
         """Цепочка завершена."""
         chain = Chain.objects.get(name='Chain was completed in time')
         self.assertEqual(chain.actual_status(), Chain.DONE_STATUS)
+
+    def test_same_deadline(self):
+        """Из задач с одинаковым дедлайном последней считается задача
+        с наибольшим номером при любом способе выборки.
+        """
+        today = datetime.date.today()
+        chain = factories.ChainFactory(
+            start_date=today - datetime.timedelta(days=5))
+        deadline = today + datetime.timedelta(days=5)
+        factories.TaskFactory(chain=chain, deadline=deadline,
+                              status=Task.DONE_STATUS, finish_date=today)
+        factories.TaskFactory(chain=chain, deadline=deadline)
+        statuses = [
+            Chain.objects.get(pk=chain.pk).actual_status(),
+            Chain.objects.with_timeline().get(pk=chain.pk).actual_status(),
+            Chain.objects.with_summary().get(pk=chain.pk).actual_status(),
+        ]
+        self.assertEqual(statuses, [Chain.WORK_STATUS] * 3)
+
+
+class MemoizationTest(TestCase):
+    """Тестирует кэширование вычисляемых значений цепочки и задачи."""
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_chain_repeated_calls(self):
+        """Повторные обращения к показателям цепочки не делают запросов."""
+        chain = Chain.objects.get(name='Chain works')
+        chain.actual_status()
+        chain.deadline()
+        with self.assertNumQueries(0):
+            chain.actual_status()
+            chain.deadline()
+            chain.finish_date()
+            chain.remaining_days()
+            chain.days_quantity_after_deadline()
+
+    def test_task_repeated_calls(self):
+        """Повторные обращения к показателям задачи не делают запросов."""
+        chain = Chain.objects.get(name='Chain works')
+        task = Task.objects.get(chain=chain, order=2)
+        task.actual_status()
+        with self.assertNumQueries(0):
+            task.actual_status()
+            task.start_date()
+            task.days_to_start()
+            task.expended_days()
+
+    def test_task_save(self):
+        """Сохранение задачи сбрасывает кэш задачи и ее цепочки."""
+        chain = Chain.objects.get(name='Chain works')
+        task = chain.last_task()
+        self.assertEqual(chain.actual_status(), Chain.WORK_STATUS)
+        task.status = Task.DONE_STATUS
+        task.finish_date = datetime.date.today()
+        task.save()
+        self.assertEqual(task.actual_status(), Task.DONE_STATUS)
+        self.assertEqual(chain.actual_status(), Chain.DONE_STATUS)
+
+    def test_chain_save(self):
+        """Сохранение цепочки сбрасывает ее кэш."""
+        chain = Chain.objects.get(name='Chain works')
+        self.assertEqual(chain.actual_status(), Chain.WORK_STATUS)
+        chain.start_date = datetime.date.today() + datetime.timedelta(days=1)
+        chain.save()
+        self.assertEqual(chain.actual_status(), Chain.WAIT_STATUS)
+
+
+class TaskOrderTest(TestCase):
+    """Тестирует присвоение порядковых номеров задачам цепочки."""
+    def setUp(self):
+        today = datetime.date.today()
+        self.chain = factories.ChainFactory(start_date=today)
+        self.worker = factories.UserFactory()
+
+    def make_task(self, days):
+        return Task(worker=self.worker, task='Task',
+                    deadline=self.chain.start_date + datetime.timedelta(days))
+
+    def test_deadline_not_ordered(self):
+        """Номер не зависит от дедлайнов уже добавленных задач."""
+        first_task = self.make_task(5)
+        first_task.chain = self.chain
+        first_task.save()
+        second_task = self.make_task(3)
+        second_task.chain = self.chain
+        second_task.save()
+        self.assertEqual(first_task.order, 1)
+        self.assertEqual(second_task.order, 2)
+
+    def test_gap(self):
+        """Задача сохраняется после удаления задачи из середины цепочки.
+
+        Предыдущей считается ближайшая задача с меньшим номером.
+        """
+        tasks = []
+        for days in (1, 2, 3):
+            task = self.make_task(days)
+            task.chain = self.chain
+            task.save()
+            tasks.append(task)
+        tasks[1].delete()
+        last = Task.objects.get(pk=tasks[2].pk)
+        last.task = 'Changed'
+        last.save()
+        self.assertEqual(last.duration(), 2)
+        timeline = Chain.objects.get(pk=self.chain.pk).timeline()
+        self.assertEqual(timeline[1].start_date(), last.start_date())
+        self.assertEqual(timeline[1].duration(), last.duration())
+
+    def test_stale_counter(self):
+        """Счетчик перечитывается, если его изменил другой процесс."""
+        other_chain = Chain.objects.get(pk=self.chain.pk)
+        self.assertEqual(other_chain.reserve_orders(2), 1)
+        self.assertEqual(self.chain.reserve_orders(), 3)
+        self.assertEqual(self.chain.last_order, 3)
+
+    def test_add_tasks(self):
+        """Задачи добавляются в конец цепочки одним запросом INSERT."""
+        factories.TaskFactory(chain=self.chain,
+                              deadline=self.chain.start_date)
+        tasks = [self.make_task(days) for days in (1, 2, 3)]
+        # UPDATE и SELECT счетчика, SELECT предыдущей задачи, INSERT задач,
+        # SELECT ключей новых задач, SELECT задач и UPDATE сводки
+        # по цепочке, INSERT в журнал изменений.
+        with self.assertNumQueries(8):
+            self.chain.add_tasks(tasks)
+        self.assertTrue(all(task.pk for task in tasks))
+        orders = self.chain.task_set.order_by('order').values_list('order',
+                                                                   flat=True)
+        self.assertEqual(list(orders), [1, 2, 3, 4])
+
+    def test_save_queries(self):
+        """Сохранение задачи не выбирает исполнителей цепочки."""
+        for days in (1, 2):
+            task = self.make_task(days)
+            task.chain = self.chain
+            task.save()
+        task = Task.objects.get(pk=task.pk)
+        task.task = 'Changed'
+        # SELECT предыдущей задачи и цепочки, SELECT и UPDATE задачи,
+        # SELECT следующих задач, SELECT задач и UPDATE сводки по цепочке,
+        # INSERT в журнал изменений.
+        with self.assertNumQueries(8):
+            task.save()
+
+
+class TaskOrderTransactionTest(TransactionTestCase):
+    """Счетчик порядковых номеров не меняется, если задачи не сохранены.
+    """
+    def setUp(self):
+        self.chain = factories.ChainFactory(start_date=datetime.date.today())
+        factories.TaskFactory(chain=self.chain,
+                              deadline=self.chain.start_date)
+
+    def test_add_tasks_failed(self):
+        task = Task(worker=factories.UserFactory(), task=None,
+                    deadline=self.chain.start_date)
+        self.assertRaises(IntegrityError, self.chain.add_tasks, [task])
+        self.assertEqual(Chain.objects.get(pk=self.chain.pk).last_order, 1)
+        # Следующая задача получает номер после последней задачи.
+        task = factories.TaskFactory(chain=Chain.objects.get(pk=self.chain.pk),
+                                     deadline=self.chain.start_date)
+        self.assertEqual(task.order, 2)
+
+    def test_save_failed(self):
+        task = Task(chain=self.chain, worker=factories.UserFactory(),
+                    task=None, deadline=self.chain.start_date)
+        self.assertRaises(IntegrityError, task.save)
+        self.assertEqual(Chain.objects.get(pk=self.chain.pk).last_order, 1)
+
+    def test_outer_transaction(self):
+        """Сохранение задачи не подтверждает транзакцию вызывающего кода.
+        """
+        @transaction.commit_on_success
+        def rename_and_fail():
+            Chain.objects.filter(pk=self.chain.pk).update(name='Renamed')
+            factories.TaskFactory(chain=self.chain,
+                                  deadline=self.chain.start_date)
+            raise ValueError
+        self.assertRaises(ValueError, rename_and_fail)
+        chain = Chain.objects.get(pk=self.chain.pk)
+        self.assertNotEqual(chain.name, 'Renamed')
+        self.assertEqual(chain.last_order, 1)
+        self.assertEqual(chain.task_set.count(), 1)
+
+
+class EffectiveStatusTest(TestCase):
+    """Тестирует сохранение фактических статусов задач."""
+    def setUp(self):
+        factories.make_fixtures()
+        self.chain = Chain.objects.get(name='Chain works')
+
+    def test_stored_on_save(self):
+        """Сохраненные статусы совпадают с рассчитанными."""
+        for task in Task.objects.all():
+            self.assertEqual(task.effective_status, task.actual_status())
+            self.assertEqual(task.effective_start_date, task.start_date())
+
+    def test_done_propagates_forward(self):
+        """Завершение задачи переводит следующую задачу в статус WORK."""
+        design = Task.objects.get(chain=self.chain, order=1)
+        design.status = Task.DONE_STATUS
+        design.finish_date = datetime.date.today()
+        design.save()
+        layout = Task.objects.get(chain=self.chain, order=2)
+        self.assertEqual(layout.effective_status, Task.WORK_STATUS)
+        self.assertEqual(layout.effective_start_date,
+                         design.finish_date + datetime.timedelta(days=1))
+        statuses = Task.objects.filter(chain=self.chain).by_status(
+            Task.WORK_STATUS).values_list('order', flat=True)
+        self.assertEqual(list(statuses), [2])
+
+    def test_chain_start_date(self):
+        """Перенос даты начала цепочки меняет статус первой задачи."""
+        self.chain.start_date = (datetime.date.today()
+                                 + datetime.timedelta(days=3))
+        self.chain.save()
+        design = Task.objects.get(chain=self.chain, order=1)
+        self.assertEqual(design.effective_status, Task.WAIT_STATUS)
+        self.assertEqual(design.effective_start_date, self.chain.start_date)
+
+    def test_task_delete(self):
+        """Удаление задачи пересчитывает следующие задачи и сводку."""
+        design = Task.objects.get(chain=self.chain, order=1)
+        design.delete()
+        layout = Task.objects.get(chain=self.chain, order=2)
+        self.assertEqual(layout.effective_status, Task.WORK_STATUS)
+        self.assertEqual(layout.effective_start_date, self.chain.start_date)
+        last_task = self.chain.task_set.latest('deadline')
+        last_task.delete()
+        summary = ChainSummary.objects.get(chain=self.chain)
+        self.assertEqual(summary.tasks_count, 2)
+        self.assertEqual(summary.deadline,
+                         self.chain.task_set.latest('deadline').deadline)
+
+
+class ForecastTest(TestCase):
+    """Тестирует прогноз дат завершения задач и цепочек."""
+    def setUp(self):
+        factories.make_fixtures()
+        self.today = datetime.date.today()
+
+    def days(self, days):
+        return self.today + datetime.timedelta(days=days)
+
+    def forecasts(self, chain):
+        return list(chain.task_set.order_by('order').values_list(
+            'forecast_start_date', 'forecast_finish_date'))
+
+    def make_overrun_chain(self):
+        """Первая задача просрочена и еще в работе."""
+        chain = factories.ChainFactory(start_date=self.days(-10))
+        factories.TaskFactory(chain=chain, deadline=self.days(-5))
+        factories.TaskFactory(chain=chain, deadline=self.days(2))
+        return Chain.objects.with_summary().get(pk=chain.pk)
+
+    def test_on_schedule(self):
+        chain = Chain.objects.with_summary().get(name='Chain works')
+        self.assertEqual(self.forecasts(chain), [
+            (self.days(-2), self.days(0)),
+            (self.days(1), self.days(2)),
+            (self.days(3), self.days(6)),
+            (self.days(7), self.days(7)),
+        ])
+        self.assertEqual(chain.forecast_finish_date(), self.days(7))
+        self.assertEqual(chain.forecast_slip(), 0)
+
+    def test_overrun(self):
+        """Просроченная задача сдвигает прогноз следующих задач."""
+        chain = self.make_overrun_chain()
+        self.assertEqual(self.forecasts(chain), [
+            (self.days(-10), self.days(0)),
+            (self.days(1), self.days(7)),
+        ])
+        self.assertEqual(chain.forecast_slip(), 6)
+
+    def test_done_early(self):
+        """Задача, завершенная раньше срока, сдвигает прогноз назад."""
+        chain = Chain.objects.get(name='Chain works')
+        design = chain.task_set.get(order=1)
+        design.status = Task.DONE_STATUS
+        design.finish_date = self.days(-1)
+        design.save()
+        self.assertEqual(self.forecasts(chain), [
+            (self.days(-2), self.days(-1)),
+            (self.days(0), self.days(1)),
+            (self.days(2), self.days(5)),
+            (self.days(6), self.days(6)),
+        ])
+        chain = Chain.objects.with_summary().get(pk=chain.pk)
+        self.assertEqual(chain.forecast_slip(), -1)
+
+    def test_done_without_finish_date(self):
+        """Без даты завершения предыдущей задачи прогноз невозможен."""
+        chain = Chain.objects.get(name='Chain works')
+        design = chain.task_set.get(order=1)
+        design.status = Task.DONE_STATUS
+        design.save()
+        self.assertEqual(self.forecasts(chain)[1:], [(None, None)] * 3)
+        chain = Chain.objects.with_summary().get(pk=chain.pk)
+        self.assertEqual(chain.forecast_finish_date(), None)
+
+    def test_stopped(self):
+        """Прогноз остановленной цепочки невозможен."""
+        chain = Chain.objects.get(name='Chain works')
+        design = chain.task_set.get(order=1)
+        design.status = Task.STOP_STATUS
+        design.save()
+        self.assertEqual(self.forecasts(chain), [(None, None)] * 4)
+        self.assertEqual(chain.forecast_slip(), None)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from todo.models import Task
+from todo.pagination import format_cursor, keyset_page, parse_cursor
+from . import factories
+
+
+class KeysetPageTest(TestCase):
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_pages(self):
+        """Страницы по курсору совпадают с выборкой по смещению."""
+        tasks = list(Task.objects.order_by('-deadline', '-pk'))
+        cursor = None
+        pages = []
+        while True:
+            page = keyset_page(Task.objects.all(), 'deadline', cursor,
+                               per_page=3)
+            pages.extend(page.object_list)
+            if page.next_cursor is None:
+                break
+            cursor = parse_cursor(page.next_cursor)
+        self.assertEqual(pages, tasks)
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            keyset_page(Task.objects.all(), 'deadline', per_page=3)
+
+    def test_parse_cursor(self):
+        task = Task.objects.all()[0]
+        cursor = format_cursor(task.deadline, task.pk)
+        self.assertEqual(parse_cursor(cursor), (task.deadline, task.pk))
+        self.assertEqual(parse_cursor('2013-13-01.1'), None)
+        self.assertEqual(parse_cursor('2013-01-01.'), None)
+        self.assertEqual(parse_cursor('invalid'), None)
+
+    def test_ascending(self):
+        tasks = list(Task.objects.order_by('deadline', 'pk'))
+        first = keyset_page(Task.objects.all(), 'deadline', per_page=3,
+                            descending=False)
+        second = keyset_page(Task.objects.all(), 'deadline',
+                             parse_cursor(first.next_cursor), per_page=3,
+                             descending=False)
+        self.assertEqual(first.object_list + second.object_list, tasks[:6])
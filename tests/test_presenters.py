@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from todo.models import Chain, Task
+from todo.presenters import BAR_DAY_WIDTH, chain_rows, task_rows
+from . import factories
+
+
+class TaskRowsTest(TestCase):
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            rows = task_rows(Task.objects.all())
+        self.assertEqual(len(rows), Task.objects.count())
+
+    def test_same_as_task_methods(self):
+        rows = task_rows(Task.objects.order_by('pk'))
+        for row, task in zip(rows, Task.objects.order_by('pk')):
+            self.assertEqual(row.pk, task.pk)
+            self.assertEqual(row.actual_status, task.actual_status())
+            self.assertEqual(row.days_to_start, task.days_to_start())
+            self.assertEqual(row.remaining_days, task.remaining_days())
+            self.assertEqual(row.days_quantity_after_deadline,
+                             task.days_quantity_after_deadline())
+            self.assertEqual(row.be_in_time(), task.be_in_time())
+            self.assertEqual(row.get_absolute_url(), task.get_absolute_url())
+
+    def test_middle_task_deleted(self):
+        """Предыдущей считается ближайшая задача с меньшим номером."""
+        chain = Chain.objects.get(name='Chain works')
+        chain.task_set.get(order=2).delete()
+        task = chain.task_set.get(order=3)
+        row = task_rows(Task.objects.filter(pk=task.pk))[0]
+        timeline = chain.timeline()
+        self.assertEqual([other.order for other in timeline[:2]], [1, 3])
+        self.assertEqual(row.actual_status, timeline[1].actual_status())
+        self.assertEqual(row.days_to_start, timeline[1].days_to_start())
+        self.assertEqual(row.duration, timeline[1].duration())
+        annotated = Task.objects.with_timeline().get(pk=task.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(annotated.duration(), row.duration)
+
+
+class ChainRowsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        self.chains = Chain.objects.by_owner(
+            User.objects.get(username='alexander')).actual().with_summary()
+
+    def test_lazy_timeline(self):
+        """Задачи всех цепочек выбираются одним запросом при обращении."""
+        with self.assertNumQueries(1):
+            rows = chain_rows(self.chains)
+        # Задачи и подписи исполнителей.
+        with self.assertNumQueries(2):
+            for row in rows:
+                for task in row.timeline():
+                    task.worker_label
+
+    def test_same_as_chain_methods(self):
+        for row in chain_rows(self.chains):
+            chain = Chain.objects.get(pk=row.pk)
+            self.assertEqual(row.actual_status, chain.actual_status())
+            self.assertEqual(row.days_to_start, chain.days_to_start())
+            self.assertEqual(row.remaining_days, chain.remaining_days())
+            self.assertEqual(row.expended_days, chain.expended_days())
+            self.assertEqual(row.deadline, chain.deadline())
+            self.assertEqual(row.forecast_slip, chain.forecast_slip())
+            tasks = chain.timeline()
+            self.assertEqual([task.pk for task in row.timeline()],
+                             [task.pk for task in tasks])
+            for task_row, task in zip(row.timeline(), tasks):
+                self.assertEqual(task_row.actual_status,
+                                 task.actual_status())
+                self.assertEqual(task_row.expended_days, task.expended_days())
+                self.assertEqual(task_row.bar_width,
+                                 task.duration() * BAR_DAY_WIDTH)
+                self.assertEqual(task_row.worker_label, task.worker_label())
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.utils import unittest
+
+from todo import reports
+from todo.models import Task
+from . import factories
+
+
+@unittest.skipIf(reports.numpy is None, 'NumPy is not installed.')
+class ReportsTest(TestCase):
+    def setUp(self):
+        factories.make_fixtures()
+        self.columns = reports.load_tasks(Task.objects.all())
+        self.timelines = reports.task_timelines(self.columns)
+
+    def value(self, name, index):
+        """Возвращает показатель задачи, NaN и NaT -- как None."""
+        value = self.timelines[name][index]
+        if name == 'start_date':
+            return value.item()
+        if name != 'status' and reports.numpy.isnan(value):
+            return None
+        return int(value)
+
+    def test_same_as_task_methods(self):
+        tasks = Task.objects.order_by('chain', 'order')
+        for index, task in enumerate(tasks):
+            self.assertEqual(self.value('status', index),
+                             task.actual_status())
+            self.assertEqual(self.value('start_date', index),
+                             task.start_date())
+            self.assertEqual(self.value('duration', index), task.duration())
+            self.assertEqual(
+                self.value('days_quantity_after_deadline', index),
+                task.days_quantity_after_deadline()
+            )
+            self.assertEqual(self.value('expended_days', index),
+                             task.expended_days())
+
+    def test_on_time_report(self):
+        report = reports.on_time_report(self.columns, self.timelines)
+        for worker_id, row in report.items():
+            tasks = list(Task.objects.filter(worker=worker_id))
+            self.assertEqual(row['tasks'], len(tasks))
+            on_time = [task for task in tasks if task.be_in_time()]
+            self.assertAlmostEqual(row['on_time_rate'],
+                                   float(len(on_time)) / len(tasks))
+
+    def test_deleted_task(self):
+        """Предыдущей считается ближайшая задача с меньшим номером."""
+        Task.objects.get(chain__name='Chain works', order=2).delete()
+        Task.objects.get(chain__name='Chain waits', order=1).delete()
+        self.columns = reports.load_tasks(Task.objects.all())
+        self.timelines = reports.task_timelines(self.columns)
+        self.test_same_as_task_methods()
+
+    def test_percentiles(self):
+        """Процентили совпадают с numpy.percentile()."""
+        numpy = reports.numpy
+        report = reports.on_time_report(self.columns, self.timelines)
+        durations = self.timelines['duration']
+        for worker_id, row in report.items():
+            values = durations[self.columns['worker'] == worker_id]
+            for percent in reports.PERCENTILES:
+                self.assertAlmostEqual(
+                    row['duration']['p{0}'.format(percent)],
+                    numpy.percentile(values, percent)
+                )
+            self.assertAlmostEqual(row['duration']['mean'], values.mean())
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from todo.models import Chain, Task
+from . import factories
+
+
+class ChainTimelineTest(TestCase):
+    """Тестирует расчет показателей задач за один проход по цепочке."""
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_one_query(self):
+        """Показатели всех задач цепочки рассчитываются одним запросом."""
+        chain = Chain.objects.get(name='Chain works')
+        with self.assertNumQueries(1):
+            tasks = chain.timeline()
+            for task in tasks:
+                task.actual_status()
+                task.start_date()
+                task.duration()
+                task.days_quantity_after_deadline()
+                task.expended_days()
+        self.assertEqual([task.order for task in tasks], [1, 2, 3, 4])
+
+    def test_same_as_task_methods(self):
+        """Показатели совпадают с рассчитанными по предыдущей задаче."""
+        for chain in Chain.objects.all():
+            for task in chain.timeline():
+                single_task = Task.objects.get(pk=task.pk)
+                self.assertEqual(task.actual_status(),
+                                 single_task.actual_status())
+                self.assertEqual(task.start_date(), single_task.start_date())
+                self.assertEqual(task.duration(), single_task.duration())
+                self.assertEqual(task.days_to_start(),
+                                 single_task.days_to_start())
+                self.assertEqual(task.days_quantity_after_deadline(),
+                                 single_task.days_quantity_after_deadline())
+                self.assertEqual(task.expended_days(),
+                                 single_task.expended_days())
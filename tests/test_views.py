@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import datetime
+
 from django_webtest import WebTest
 
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
+from todo.models import Chain, Task
 from . import factories
 
 
@@ -18,9 +23,23 @@ class ActualTasksTest(WebTest):
         response = self.app.get(reverse('todo_actual_tasks'), user='kazimir')
         assert 'Казимир Малевич' in response
 
+    def test_first_task_deleted(self):
+        """Задача, перед которой удалена задача, считается первой."""
+        chain = Chain.objects.get(name='Chain works')
+        chain.task_set.get(order=1).delete()
+        task = chain.task_set.get(order=2)
+        response = self.app.get(reverse('todo_actual_tasks'),
+                                user=task.worker.username)
+        assert task.task in response
+        response = self.app.get(reverse('todo_api_tasks'),
+                                user=task.worker.username)
+        self.assertTrue(task.pk in [item['id']
+                                    for item in response.json['items']])
+
 
 class ActualChainsTest(WebTest):
     def setUp(self):
+        cache.clear()
         factories.make_fixtures()
 
     def test_user_not_logined(self):
@@ -31,3 +50,130 @@ class ActualChainsTest(WebTest):
         response = self.app.get(reverse('todo_actual_chains'),
                                 user='alexander')
         assert 'Александр Македонский' in response
+
+
+class TaskArchiveTest(WebTest):
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        Task.objects.filter(chain__name='Chain was completed in time').update(
+            archive=True
+        )
+
+    def test_user_not_logined(self):
+        response = self.app.get(reverse('todo_task_archive'))
+        self.assertEqual(response.status_int, 302)
+
+    def test_designer_logined(self):
+        task = Task.objects.get(chain__name='Chain was completed in time',
+                                order=1)
+        response = self.app.get(reverse('todo_task_archive'), user='kazimir')
+        assert task.task in response
+
+    def test_month(self):
+        task = Task.objects.get(chain__name='Chain was completed in time',
+                                order=1)
+        other_task = Task.objects.filter(worker=task.worker_id).exclude(
+            pk=task.pk)[0]
+        Task.objects.filter(pk=other_task.pk).update(
+            archive=True,
+            deadline=task.deadline - datetime.timedelta(days=31)
+        )
+        response = self.app.get(reverse('todo_task_archive'), user='kazimir',
+                                params={'month': task.deadline.strftime(
+                                    '%Y-%m')})
+        assert task.task in response
+        assert other_task.task not in response
+        response = self.app.get(reverse('todo_task_archive'), user='kazimir')
+        assert other_task.task in response
+
+
+class ChainArchiveTest(WebTest):
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        Chain.objects.filter(name='Chain was completed in time').update(
+            archive=True
+        )
+
+    def test_user_not_logined(self):
+        response = self.app.get(reverse('todo_chain_archive'))
+        self.assertEqual(response.status_int, 302)
+
+    def test_manager_logined(self):
+        response = self.app.get(reverse('todo_chain_archive'),
+                                user='alexander')
+        assert 'Chain was completed in time' in response
+        assert 'Chain works' not in response
+
+
+class DashboardTest(WebTest):
+    def setUp(self):
+        factories.make_fixtures()
+
+    def test_user_not_logined(self):
+        response = self.app.get(reverse('todo_dashboard'))
+        self.assertEqual(response.status_int, 302)
+
+    def test_manager_logined(self):
+        response = self.app.get(reverse('todo_dashboard'), user='alexander')
+        assert 'Александр Македонский' in response
+        assert 'Казимир Малевич' in response
+
+
+class ConditionalGetTest(WebTest):
+    """Тестирует условные GET-запросы к спискам задач и цепочек."""
+    def setUp(self):
+        cache.clear()
+        factories.make_fixtures()
+        self.chain = Chain.objects.get(name='Chain works')
+
+    def get(self, url_name, username, response=None):
+        headers = {}
+        if response is not None:
+            headers['If-None-Match'] = response.headers['ETag']
+        return self.app.get(reverse(url_name), user=username,
+                            headers=headers,
+                            status=200 if response is None else '*')
+
+    def test_not_modified(self):
+        for url_name, username in (('todo_actual_tasks', 'kazimir'),
+                                   ('todo_actual_chains', 'alexander')):
+            response = self.get(url_name, username)
+            self.assertTrue(response.headers['Last-Modified'])
+            self.assertEqual(self.get(url_name, username, response).status_int,
+                             304)
+
+    def test_task_save(self):
+        """Изменение задачи меняет списки владельца цепочки и исполнителей
+        задач, показатели которых изменились.
+        """
+        tasks = self.get('todo_actual_tasks', 'andy')
+        chains = self.get('todo_actual_chains', 'alexander')
+        other_tasks = self.get('todo_actual_tasks', 'ada')
+        # Задача Казимира предшествует задаче Энди.
+        design = self.chain.task_set.get(order=1)
+        design.status = Task.DONE_STATUS
+        design.finish_date = datetime.date.today()
+        design.save()
+        self.assertEqual(
+            self.get('todo_actual_tasks', 'andy', tasks).status_int, 200)
+        self.assertEqual(
+            self.get('todo_actual_chains', 'alexander', chains).status_int,
+            200)
+        # Ада работает над третьей задачей той же цепочки, ее показатели
+        # не изменились.
+        self.assertEqual(
+            self.get('todo_actual_tasks', 'ada', other_tasks).status_int,
+            304)
+
+    def test_task_reassigned(self):
+        """Задача, переданная другому исполнителю, меняет список прежнего.
+        """
+        design = self.chain.task_set.get(order=1)
+        old_worker = design.worker.username
+        tasks = self.get('todo_actual_tasks', old_worker)
+        design.worker = User.objects.get(username='andy')
+        design.save()
+        self.assertEqual(
+            self.get('todo_actual_tasks', old_worker, tasks).status_int, 200)
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""JSON API для списков задач и цепочек.
+
+Элементы строятся из объектов представления (``todo.presenters``) и
+сериализуются по одному, поэтому ответ не собирается в памяти целиком.
+Списки выводятся постранично по курсору: ответ содержит элементы
+в ``items`` и курсор следующей страницы в ``next``. Параметр ``fields``
+ограничивает поля элементов, ``task_fields`` -- поля задач цепочки.
+Лента изменений (``changes``) позволяет не запрашивать списки заново.
+
+Длинный опрос ленты изменений включается настройкой
+TODO_CHANGES_MAX_WAIT -- наибольшим временем ожидания в секундах.
+Ожидающий ответ занимает процесс или поток сервера на все время
+ожидания, поэтому без асинхронных обработчиков (gevent, eventlet) число
+одновременно ожидающих клиентов не должно превышать число обработчиков.
+По умолчанию длинный опрос выключен: ответ возвращается сразу, как при
+обычном опросе.
+"""
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils import timezone
+
+from todo.caching import user_version
+from todo.models import TASK_STATUS_NAMES, Change, Chain, Task
+from todo.pagination import PER_PAGE, format_cursor, keyset_filter, \
+    parse_cursor
+from todo.presenters import iter_chain_rows, iter_task_rows
+from todo.views import user_condition
+
+MAX_LIMIT = 500
+# Интервал проверки изменений при длинном опросе, с.
+POLL_INTERVAL = 1
+# Время, за которое подтверждается транзакция, записавшая изменения, с.
+SETTLE_TIME = 5
+# Наибольшее количество недавних записей, проверяемых на пропуски.
+MAX_RECENT = 1000
+CONTENT_TYPE = 'application/json; charset=utf-8'
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _worker(row):
+    label = row.worker_label
+    return {'name': label.name, 'post': label.post}
+
+
+TASK_FIELDS = {
+    'id': lambda row: row.pk,
+    'task': lambda row: row.task,
+    'status': lambda row: TASK_STATUS_NAMES[row.actual_status],
+    'deadline': lambda row: _date(row.deadline),
+    'finish_date': lambda row: _date(row.finish_date),
+    'start_date': lambda row: _date(row.start_date),
+    'days_to_start': lambda row: row.days_to_start,
+    'remaining_days': lambda row: row.remaining_days,
+    'days_quantity_after_deadline': (
+        lambda row: row.days_quantity_after_deadline),
+    'expended_days': lambda row: row.expended_days,
+    'duration': lambda row: row.duration,
+    'url': lambda row: row.get_absolute_url(),
+}
+
+CHAIN_TASK_FIELDS = dict(TASK_FIELDS, worker=_worker)
+
+CHAIN_FIELDS = {
+    'id': lambda row: row.pk,
+    'name': lambda row: row.name,
+    'status': lambda row: row.actual_status,
+    'start_date': lambda row: _date(row.start_date),
+    'days_to_start': lambda row: row.days_to_start,
+    'remaining_days': lambda row: row.remaining_days,
+    'days_quantity_after_deadline': (
+        lambda row: row.days_quantity_after_deadline),
+    'expended_days': lambda row: row.expended_days,
+    'deadline': lambda row: _date(row.deadline),
+    'finish_date': lambda row: _date(row.finish_date),
+    'forecast_finish_date': lambda row: _date(row.forecast_finish_date),
+    'forecast_slip': lambda row: row.forecast_slip,
+    # Задачи цепочек выбираются, только если поле запрошено.
+    'tasks': None,
+}
+
+
+class BadRequest(Exception):
+    """Некорректные параметры запроса."""
+
+
+@login_required
+@user_condition
+def tasks(request):
+    """Возвращает актуальные задачи исполнителя по возрастанию дедлайна."""
+    queryset = Task.objects.by_worker(request.user).actual()
+    return _task_list(request, queryset, descending=False)
+
+
+@login_required
+def task_archive(request):
+    """Возвращает архив задач исполнителя по убыванию дедлайна."""
+    queryset = Task.objects.by_worker(request.user).archived()
+    return _task_list(request, queryset, descending=True)
+
+
+@login_required
+@user_condition
+def chains(request):
+    """Возвращает актуальные цепочки владельца по возрастанию даты
+    начала.
+    """
+    queryset = Chain.objects.by_owner(request.user).actual()
+    return _chain_list(request, queryset, descending=False)
+
+
+@login_required
+def chain_archive(request):
+    """Возвращает архив цепочек владельца по убыванию даты начала."""
+    queryset = Chain.objects.by_owner(request.user).archived()
+    return _chain_list(request, queryset, descending=True)
+
+
+@login_required
+def changes(request):
+    """Возвращает изменения задач и цепочек пользователя после курсора.
+
+    Курсор -- номер последней полученной записи журнала изменений.
+    Без курсора возвращается только текущий курсор, поэтому клиент
+    запрашивает его до загрузки списков. Каждый объект возвращается один
+    раз с последним статусом.
+
+    Номер записи присваивается при вставке, а видна она становится после
+    подтверждения транзакции, поэтому запись с меньшим номером может
+    появиться позже. Курсор не переходит через такие записи (см.
+    ``_watermark()``): изменения после них возвращаются повторно, пока
+    пропуск не заполнится или не пройдет SETTLE_TIME.
+
+    Параметр ``wait`` включает длинный опрос: если изменений нет, ответ
+    ждет их до ``wait`` секунд, но не дольше TODO_CHANGES_MAX_WAIT. Пока
+    ждет, проверяется только версия списков пользователя в кэше, журнал
+    перечитывается, когда она изменится.
+    """
+    user_id = request.user.pk
+    max_wait = getattr(settings, 'TODO_CHANGES_MAX_WAIT', 0)
+    try:
+        after = _int_param(request, 'after', None, None)
+        # Без длинного опроса ответ возвращается сразу, как при обычном
+        # опросе.
+        wait = min(_int_param(request, 'wait', 0, None), max_wait)
+        limit = _int_param(request, 'limit', MAX_LIMIT, MAX_LIMIT)
+    except BadRequest as e:
+        return _bad_request(e)
+    if after is None:
+        last = list(Change.objects.filter(user=user_id).order_by('-pk')
+                    .values_list('pk', flat=True)[:1])
+        return _json_response({
+            'items': [],
+            'next': min(last[0], _watermark()) if last else 0,
+            'more': False,
+        })
+    deadline = time.time() + wait
+    version = user_version(user_id)
+    rows = _changes(user_id, after, limit)
+    while not rows and time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        new_version = user_version(user_id)
+        if new_version != version:
+            version = new_version
+            rows = _changes(user_id, after, limit)
+    # Из нескольких изменений объекта остается последнее.
+    latest = {}
+    for pk, kind, object_id, status in rows:
+        latest[kind, object_id] = (pk, status)
+    items = [
+        {'type': kind, 'id': object_id, 'status': status,
+         'deleted': status is None}
+        for (kind, object_id), (pk, status) in sorted(
+            latest.items(), key=lambda item: item[1][0])
+    ]
+    next_cursor = after
+    if rows:
+        next_cursor = max(after, min(rows[-1][0], _watermark()))
+    return _json_response({'items': items, 'next': next_cursor,
+                           'more': len(rows) == limit})
+
+
+def _changes(user_id, after, limit):
+    return list(Change.objects.filter(user=user_id, pk__gt=after)
+                .order_by('pk')
+                .values_list('pk', 'kind', 'object_id', 'status')[:limit])
+
+
+def _watermark():
+    """Возвращает номер записи журнала, перед которым нет
+    неподтвержденных записей.
+
+    Записи старше SETTLE_TIME считаются подтвержденными, а пропуски перед
+    ними -- отмененными транзакциями. После последней такой записи номер
+    продвигается по недавним записям, пока в номерах нет пропусков.
+    """
+    settled = timezone.now() - datetime.timedelta(seconds=SETTLE_TIME)
+    last = list(Change.objects.filter(created__lte=settled).order_by('-pk')
+                .values_list('pk', flat=True)[:1])
+    watermark = last[0] if last else 0
+    recent = (Change.objects.filter(pk__gt=watermark).order_by('pk')
+              .values_list('pk', flat=True)[:MAX_RECENT])
+    for pk in recent:
+        if pk != watermark + 1:
+            break
+        watermark = pk
+    return watermark
+
+
+def _task_list(request, queryset, descending):
+    try:
+        cursor, limit = _page_params(request)
+        fields = _fields(request, 'fields', TASK_FIELDS)
+    except BadRequest as e:
+        return _bad_request(e)
+    queryset = keyset_filter(queryset, 'deadline', cursor, descending)
+    rows = iter_task_rows(queryset, limit=limit + 1)
+    serialize = lambda row: dict((name, getter(row))
+                                 for name, getter in fields)
+    return _list_response(rows, serialize, 'deadline', limit)
+
+
+def _chain_list(request, queryset, descending):
+    try:
+        cursor, limit = _page_params(request)
+        fields = _fields(request, 'fields', CHAIN_FIELDS)
+        task_fields = _fields(request, 'task_fields', CHAIN_TASK_FIELDS)
+    except BadRequest as e:
+        return _bad_request(e)
+    queryset = keyset_filter(queryset.with_summary(), 'start_date', cursor,
+                             descending)
+    rows = iter_chain_rows(queryset[:limit + 1].iterator())
+
+    def serialize(row):
+        item = {}
+        for name, getter in fields:
+            if getter is None:
+                item[name] = [
+                    dict((task_name, task_getter(task))
+                         for task_name, task_getter in task_fields)
+                    for task in row.timeline()
+                ]
+            else:
+                item[name] = getter(row)
+        return item
+    return _list_response(rows, serialize, 'start_date', limit)
+
+
+def _list_response(rows, serialize, field_name, limit):
+    """Возвращает ответ, сериализующий элементы по мере выборки.
+
+    Выбирается на один элемент больше страницы, чтобы определить,
+    есть ли следующая страница.
+    """
+    def content():
+        yield '{"items": ['
+        next_cursor = None
+        last = None
+        for index, row in enumerate(rows):
+            if index == limit:
+                next_cursor = format_cursor(getattr(last, field_name),
+                                            last.pk)
+                break
+            if index:
+                yield ', '
+            yield json.dumps(serialize(row))
+            last = row
+        yield '], "next": {0}}}'.format(json.dumps(next_cursor))
+    return HttpResponse(content(), content_type=CONTENT_TYPE)
+
+
+def _page_params(request):
+    """Разбирает курсор и размер страницы из параметров запроса."""
+    cursor = request.GET.get('after')
+    if cursor is not None:
+        cursor = parse_cursor(cursor)
+        if cursor is None:
+            raise BadRequest('Invalid cursor.')
+    limit = _int_param(request, 'limit', PER_PAGE, MAX_LIMIT)
+    if not limit:
+        raise BadRequest('Limit must be from 1 to {0}.'.format(MAX_LIMIT))
+    return cursor, limit
+
+
+def _int_param(request, param, default, maximum):
+    """Разбирает неотрицательное целое из параметра запроса."""
+    value = request.GET.get(param)
+    if value is None:
+        return default
+    if not value.isdigit():
+        raise BadRequest('{0} must be a non-negative integer.'.format(param))
+    value = int(value)
+    if maximum is not None and value > maximum:
+        raise BadRequest('{0} must not exceed {1}.'.format(param, maximum))
+    return value
+
+
+def _fields(request, param, available):
+    """Возвращает пары (имя поля, функция значения) выбранных полей.
+
+    Если параметр не передан, выбираются все поля.
+    """
+    value = request.GET.get(param)
+    if value is None:
+        names = sorted(available)
+    else:
+        names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest(u'Unknown fields: {0}.'.format(', '.join(unknown)))
+    return [(name, available[name]) for name in names]
+
+
+def _json_response(data):
+    return HttpResponse(json.dumps(data), content_type=CONTENT_TYPE)
+
+
+def _bad_request(error):
+    return HttpResponseBadRequest(json.dumps({'error': unicode(error)}),
+                                  content_type=CONTENT_TYPE)
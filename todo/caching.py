@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Версии кэша отображения цепочек.
+
+Фрагмент includes/chain.html кэшируется по ключу из версии цепочки
+и текущей даты. Версия хранится в кэше и увеличивается при сохранении
+цепочки, ее задач и исполнителей, поэтому устаревшие фрагменты не удаляются,
+а перестают запрашиваться.
+
+Время последнего изменения задач и цепочек пользователя хранится в кэше
+и служит версией для условных GET-запросов к спискам задач и цепочек
+и для списка месяцев архива задач.
+
+Имена и должности исполнителей хранятся в памяти процесса вместе с версией
+подписи. Версия подписи каждого сотрудника хранится в кэше так же, как
+версии цепочек, и увеличивается при изменении имени или должности:
+процессы перечитывают подпись, заметив новую версию.
+"""
+import time
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+
+from todo.utils import LRUCache
+
+CHAIN_VERSION_KEY = 'todo.chain_version.{chain_id}'
+# Memcached не хранит значения дольше 30 дней.
+CHAIN_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+USER_VERSION_KEY = 'todo.user_version.{user_id}'
+ARCHIVE_MONTHS_KEY = 'todo.archive_months.{user_id}.{version}'
+WORKER_LABEL_VERSION_KEY = 'todo.worker_label_version.{user_id}'
+# Количество подписей исполнителей в памяти процесса.
+WORKER_LABELS_SIZE = 1000
+
+WorkerLabel = namedtuple('WorkerLabel', 'name post')
+
+# Подписи хранятся парами (версия, WorkerLabel).
+_worker_labels = LRUCache(WORKER_LABELS_SIZE)
+
+
+def chain_version(chain_id):
+    """Возвращает текущую версию цепочки."""
+    return _version(CHAIN_VERSION_KEY.format(chain_id=chain_id))
+
+
+def bump_chain_versions(chain_ids):
+    """Увеличивает версии цепочек."""
+    for chain_id in chain_ids:
+        _bump_version(CHAIN_VERSION_KEY.format(chain_id=chain_id))
+
+
+def user_version(user_id):
+    """Возвращает время последнего изменения задач и цепочек пользователя
+    в микросекундах.
+    """
+    return _version(USER_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_versions(user_ids):
+    """Отмечает изменение задач и цепочек пользователей."""
+    version = _new_version()
+    cache.set_many(dict(
+        (USER_VERSION_KEY.format(user_id=user_id), version)
+        for user_id in user_ids
+    ), CHAIN_VERSION_TIMEOUT)
+
+
+def archive_months(user_id, tasks):
+    """Возвращает месяцы дедлайнов архивных задач пользователя
+    по убыванию.
+
+    Месяцы выбираются по всему архиву, поэтому кэшируются до изменения
+    задач пользователя.
+    """
+    key = ARCHIVE_MONTHS_KEY.format(user_id=user_id,
+                                    version=user_version(user_id))
+    months = cache.get(key)
+    if months is None:
+        months = list(tasks.dates('deadline', 'month', order='DESC'))
+        cache.set(key, months, CHAIN_VERSION_TIMEOUT)
+    return months
+
+
+def worker_labels(user_ids):
+    """Возвращает подписи сотрудников: словарь {id: WorkerLabel}.
+
+    Версии подписей читаются из кэша одним запросом. Подписи, которых нет
+    в памяти процесса или версия которых изменилась, выбираются одним
+    запросом к базе вместе с профилями.
+    """
+    user_ids = set(user_ids)
+    keys = dict((user_id, WORKER_LABEL_VERSION_KEY.format(user_id=user_id))
+                for user_id in user_ids)
+    versions = cache.get_many(keys.values())
+    labels = {}
+    missing = []
+    for user_id in user_ids:
+        version = versions.get(keys[user_id])
+        cached = _worker_labels.get(user_id)
+        if cached is None or cached[0] != version:
+            missing.append(user_id)
+        else:
+            labels[user_id] = cached[1]
+    if missing:
+        users = User.objects.filter(pk__in=missing).select_related(
+            'staff_profile')
+        for user in users:
+            # select_related() запоминает отсутствующий профиль как None.
+            try:
+                profile = user.staff_profile
+            except ObjectDoesNotExist:
+                profile = None
+            post = profile.post if profile is not None else u''
+            label = WorkerLabel(user.get_full_name(), post)
+            _worker_labels.set(user.pk, (versions.get(keys[user.pk]), label))
+            labels[user.pk] = label
+    return labels
+
+
+def forget_worker_label(user_id):
+    """Сбрасывает подпись сотрудника во всех процессах."""
+    _worker_labels.delete(user_id)
+    _bump_version(WORKER_LABEL_VERSION_KEY.format(user_id=user_id))
+
+
+def _version(key):
+    """Возвращает текущую версию по ключу кэша."""
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, CHAIN_VERSION_TIMEOUT):
+            # Версию успел создать другой процесс.
+            version = cache.get(key, version)
+    return version
+
+
+def _bump_version(key):
+    """Увеличивает версию по ключу кэша."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), CHAIN_VERSION_TIMEOUT)
+
+
+def _new_version():
+    """Возвращает начальную версию.
+
+    Версия, созданная после вытеснения прежней из кэша, не должна совпасть
+    с ней, поэтому она зависит от текущего времени.
+    """
+    return int(time.time() * 1000000)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Рабочие календари.
+
+Количество выделенных, затраченных, оставшихся и просроченных дней
+считается по календарю, заданному настройкой TODO_CALENDAR -- путем
+к экземпляру календаря, например ``'myproject.calendars.RUSSIA'``.
+По умолчанию рабочие все дни.
+
+    RUSSIA = WorkCalendar(weekmask='1111100',
+                          holidays=[datetime.date(2013, 1, 1), ...])
+
+Календарь считает дни без перебора дат, поэтому показатели всех задач
+цепочки рассчитываются за один проход, как и раньше.
+"""
+import datetime
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Calendar(object):
+    """Календарь, в котором все дни рабочие."""
+    def count(self, begin, end):
+        """Возвращает количество рабочих дней в интервале [begin; end).
+
+        Если end раньше begin, количество отрицательное.
+        """
+        return (end - begin).days
+
+    def shift(self, begin, days):
+        """Возвращает наименьшую дату end, для которой в интервале
+        [begin; end) ``days`` рабочих дней.
+
+        ``days`` неотрицательно.
+        """
+        return begin + datetime.timedelta(days=days)
+
+    def count_array(self, begins, ends):
+        """Считает рабочие дни для массивов дат NumPy."""
+        return (ends - begins).astype('timedelta64[D]').astype(numpy.int64)
+
+
+class WorkCalendar(Calendar):
+    """Календарь с выходными днями недели и праздниками.
+
+    ``weekmask`` -- строка из семи символов 1 и 0, начиная
+    с понедельника, как в ``numpy.busday_count()``. Праздники, выпавшие
+    на выходные, не учитываются.
+    """
+    def __init__(self, weekmask='1111100', holidays=()):
+        if (len(weekmask) != 7 or set(weekmask) - set('01')
+                or '1' not in weekmask):
+            raise ValueError('weekmask must be seven 0/1 characters '
+                             'with at least one workday.')
+        self.weekmask = weekmask
+        self.workdays = [day == '1' for day in weekmask]
+        self.holidays = sorted(set(
+            holiday for holiday in holidays
+            if self.workdays[holiday.weekday()]
+        ))
+        # Количество рабочих дней недели в первых n днях,
+        # начиная с каждого дня недели.
+        self._partial = [
+            [sum(self.workdays[(weekday + day) % 7] for day in range(rest))
+             for rest in range(7)]
+            for weekday in range(7)
+        ]
+        self._per_week = sum(self.workdays)
+
+    def count(self, begin, end):
+        if end < begin:
+            return -self.count(end, begin)
+        weeks, rest = divmod((end - begin).days, 7)
+        count = weeks * self._per_week + self._partial[begin.weekday()][rest]
+        holidays = (bisect_left(self.holidays, end) -
+                    bisect_left(self.holidays, begin))
+        return count - holidays
+
+    def shift(self, begin, days):
+        if days <= 0:
+            return begin
+        # Целые недели дают оценку снизу, остаток добирается по дню.
+        end = begin + datetime.timedelta(weeks=(days - 1) // self._per_week)
+        while self.count(begin, end) < days:
+            end += datetime.timedelta(days=1)
+        return end
+
+    def count_array(self, begins, ends):
+        return numpy.busday_count(
+            begins, ends, weekmask=self.weekmask,
+            holidays=numpy.array(self.holidays, dtype='datetime64[D]')
+        )
+
+
+_default = Calendar()
+_calendars = {}
+
+
+def get_calendar():
+    """Возвращает календарь из настройки TODO_CALENDAR."""
+    path = getattr(settings, 'TODO_CALENDAR', None)
+    if path is None:
+        return _default
+    if path not in _calendars:
+        module, _, name = path.rpartition('.')
+        try:
+            _calendars[path] = getattr(import_module(module), name)
+        except (ImportError, AttributeError) as error:
+            raise ImproperlyConfigured(
+                'Error loading calendar {0}: {1}'.format(path, error))
+    return _calendars[path]
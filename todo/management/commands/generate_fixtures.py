@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import datetime
+import random
+from optparse import make_option
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import transaction
+
+from todo.models import (Chain, ChainSummary, StaffProfile, Task,
+                         set_stored_timeline)
+
+POSTS = ('Дизайнер', 'Дизайнер-технолог', 'Программист',
+         'Контент-менеджер')
+MANAGER_POST = 'Менеджер проектов'
+# Доля менеджеров среди сотрудников.
+MANAGERS_SHARE = 0.1
+# Вероятность остановки задачи и срыва дедлайна.
+STOP_PROBABILITY = 0.02
+LATE_PROBABILITY = 0.2
+# Цепочки, завершенные раньше, попадают в архив.
+ARCHIVE_AFTER_DAYS = 30
+
+
+class Command(NoArgsCommand):
+    """Заполняет базу синтетическими сотрудниками, цепочками и задачами.
+
+    Нужна для нагрузочного тестирования. Объекты сохраняются пачками через
+    ``bulk_create()``, пароль хэшируется один раз для всех сотрудников.
+    Одинаковые параметры и зерно дают одинаковые данные.
+    """
+    help = 'Generates users, chains and tasks for load testing.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--users', type='int', dest='users', default=100,
+                    help='Number of staff users.'),
+        make_option('--chains', type='int', dest='chains', default=1000,
+                    help='Number of chains.'),
+        make_option('--tasks-per-chain', type='int', dest='tasks_per_chain',
+                    default=10, help='Average number of tasks in a chain.'),
+        make_option('--seed', type='int', dest='seed', default=0,
+                    help='Random seed.'),
+        make_option('--prefix', dest='prefix', default='staff',
+                    help='Username prefix, must not be taken yet.'),
+        make_option('--password', dest='password', default='123',
+                    help='Password of every generated user.'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=1000, help='Chains saved per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        if options['users'] < 2:
+            raise CommandError('At least 2 users are needed.')
+        if options['tasks_per_chain'] < 1:
+            raise CommandError('At least 1 task per chain is needed.')
+        if User.objects.filter(
+                username__startswith=options['prefix']).exists():
+            raise CommandError('Usernames with prefix "{0}" are already '
+                               'taken.'.format(options['prefix']))
+        self.rnd = random.Random(options['seed'])
+        self.today = datetime.date.today()
+        self.verbosity = int(options['verbosity'])
+
+        managers, workers = self.create_users(
+            options['users'], options['prefix'], options['password'],
+            options['batch_size']
+        )
+        tasks_count = 0
+        for offset in range(0, options['chains'], options['batch_size']):
+            count = min(options['batch_size'], options['chains'] - offset)
+            tasks_count += self.create_chains(
+                offset, count, options['prefix'], managers, workers,
+                options['tasks_per_chain']
+            )
+            if self.verbosity > 1:
+                self.stdout.write('Created {0} chains.\n'.format(
+                    offset + count))
+        if self.verbosity > 0:
+            self.stdout.write(
+                'Created {0} users, {1} chains and {2} tasks.\n'.format(
+                    options['users'], options['chains'], tasks_count))
+
+    @transaction.commit_on_success
+    def create_users(self, count, prefix, password, batch_size):
+        """Создает сотрудников и их профили.
+
+        Возвращает первичные ключи менеджеров и исполнителей.
+        """
+        password = make_password(password)
+        now = datetime.datetime.now()
+        usernames = ['{0}{1}'.format(prefix, num) for num in range(count)]
+        user_ids = []
+        for offset in range(0, count, batch_size):
+            batch = usernames[offset:offset + batch_size]
+            User.objects.bulk_create([
+                User(username=username, first_name='Имя{0}'.format(num),
+                     last_name='Фамилия{0}'.format(num),
+                     email='{0}@example.org'.format(username),
+                     password=password, is_staff=True, last_login=now,
+                     date_joined=now)
+                for num, username in enumerate(batch, offset)
+            ])
+            pks = dict(User.objects.filter(username__in=batch)
+                       .values_list('username', 'pk'))
+            user_ids.extend(pks[username] for username in batch)
+
+        managers_count = max(int(count * MANAGERS_SHARE), 1)
+        managers = user_ids[:managers_count]
+        workers = user_ids[managers_count:]
+        posts = [MANAGER_POST] * managers_count
+        posts.extend(self.rnd.choice(POSTS) for user_id in workers)
+        for offset in range(0, count, batch_size):
+            StaffProfile.objects.bulk_create([
+                StaffProfile(user_id=user_id, post=post)
+                for user_id, post in zip(user_ids[offset:offset + batch_size],
+                                         posts[offset:offset + batch_size])
+            ])
+        return managers, workers
+
+    @transaction.commit_on_success
+    def create_chains(self, offset, count, prefix, managers, workers,
+                      tasks_per_chain):
+        """Создает пачку цепочек с задачами и сводками.
+
+        Возвращает количество созданных задач.
+        """
+        chains = []
+        chain_tasks = []
+        for num in range(offset, offset + count):
+            chain = Chain(
+                name='{0} chain {1}'.format(prefix, num),
+                owner_id=self.rnd.choice(managers),
+                start_date=self.today + datetime.timedelta(
+                    self.rnd.randint(-730, 60)),
+                priority=self.rnd.randint(0, 2)
+            )
+            tasks = self.make_tasks(chain, workers, tasks_per_chain)
+            chain.last_order = len(tasks)
+            chain.archive = (tasks[-1].status == Task.DONE_STATUS and
+                             (self.today - tasks[-1].finish_date).days >
+                             ARCHIVE_AFTER_DAYS)
+            chains.append(chain)
+            chain_tasks.append(tasks)
+        # bulk_create() не возвращает первичные ключи. Новые цепочки
+        # выбираются по диапазону ключей и сопоставляются по имени.
+        last_pk = list(Chain.objects.order_by('-pk')
+                       .values_list('pk', flat=True)[:1]) or [0]
+        Chain.objects.bulk_create(chains)
+        pks = dict(Chain.objects.filter(pk__gt=last_pk[0])
+                   .values_list('name', 'pk'))
+        all_tasks = []
+        summaries = []
+        for chain, tasks in zip(chains, chain_tasks):
+            chain.pk = pks[chain.name]
+            for task in tasks:
+                task.chain_id = chain.pk
+                task.archive = chain.archive
+            all_tasks.extend(tasks)
+            summary = ChainSummary(chain=chain)
+            summary.calculate([(task.order, task.status, task.deadline,
+                                task.finish_date, task.forecast_finish_date)
+                               for task in tasks],
+                              self.today)
+            summaries.append(summary)
+        Task.objects.bulk_create(all_tasks)
+        ChainSummary.objects.bulk_create(summaries)
+        return len(all_tasks)
+
+    def make_tasks(self, chain, workers, tasks_per_chain):
+        """Возвращает задачи цепочки с рассчитанными статусами.
+
+        Задачи, дедлайн которых прошел, в основном выполнены, часть из них
+        с опозданием. Изредка задача останавливается, и следующие за ней
+        задачи не начинаются.
+        """
+        rnd = self.rnd
+        tasks = []
+        prev_task = None
+        deadline = chain.start_date
+        stopped = False
+        for order in range(Task.FIRST_TASK,
+                           Task.FIRST_TASK + rnd.randint(
+                               1, 2 * tasks_per_chain - 1)):
+            # Длительность задачи -- от одного дня до нескольких недель,
+            # короткие задачи встречаются чаще.
+            deadline += datetime.timedelta(
+                max(1, int(rnd.expovariate(1 / 5.0))))
+            task = Task(worker_id=rnd.choice(workers),
+                        task='Task {0}'.format(order), deadline=deadline,
+                        order=order)
+            started = prev_task is None or prev_task.status == Task.DONE_STATUS
+            if not stopped and started and deadline < self.today:
+                if rnd.random() < STOP_PROBABILITY:
+                    task.status = Task.STOP_STATUS
+                    stopped = True
+                else:
+                    finish_date = deadline
+                    if rnd.random() < LATE_PROBABILITY:
+                        finish_date += datetime.timedelta(rnd.randint(1, 7))
+                    else:
+                        finish_date -= datetime.timedelta(rnd.randint(0, 2))
+                    # Задача не завершается раньше, чем начинается.
+                    if prev_task is None:
+                        earliest = chain.start_date
+                    else:
+                        earliest = (prev_task.finish_date +
+                                    datetime.timedelta(days=1))
+                    finish_date = max(finish_date, earliest)
+                    if finish_date < self.today:
+                        task.status = Task.DONE_STATUS
+                        task.finish_date = finish_date
+            set_stored_timeline(task, prev_task, chain.start_date,
+                                self.today)
+            tasks.append(task)
+            prev_task = task
+        return tasks
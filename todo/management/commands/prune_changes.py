@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+
+from todo.models import Change
+
+
+class Command(NoArgsCommand):
+    """Удаляет старые записи журнала изменений.
+
+    Запускается по расписанию. Записи удаляются по первичному ключу,
+    пачками, каждая в своей транзакции, поэтому удаление не блокирует
+    запись в журнал надолго. Клиент, курсор которого старше удаленных
+    записей, пропустит изменения, поэтому срок хранения должен быть
+    больше времени, на которое клиенты отключаются.
+    """
+    help = 'Deletes change log records older than the given number of days.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--days', type='int', dest='days', default=30,
+                    help='Number of days to keep the records.'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=10000,
+                    help='Number of records deleted in one transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        created = datetime.datetime.now() - datetime.timedelta(
+            days=options['days'])
+        deleted = self.prune(created, options['batch_size'])
+        if int(options['verbosity']) > 0:
+            self.stdout.write('Deleted {0} changes.\n'.format(deleted))
+
+    def prune(self, created, batch_size):
+        """Удаляет записи, сделанные раньше ``created``.
+
+        Первичный ключ возрастает вместе со временем записи, поэтому
+        удаляются записи до последней старой записи. ``delete()``
+        в Django 1.4 выбирает удаляемые объекты, поэтому записи удаляются
+        запросом DELETE. Возвращает количество удаленных записей.
+        """
+        last = list(Change.objects.filter(created__lt=created)
+                    .order_by('-pk').values_list('pk', flat=True)[:1])
+        if not last:
+            return 0
+        first = Change.objects.order_by('pk').values_list('pk',
+                                                          flat=True)[0]
+        qn = connection.ops.quote_name
+        sql = 'DELETE FROM {table} WHERE {pk} >= %s AND {pk} <= %s'.format(
+            table=qn(Change._meta.db_table), pk=qn(Change._meta.pk.column))
+        last = last[0]
+        deleted = 0
+        for start in range(first, last + 1, batch_size):
+            end = min(start + batch_size - 1, last)
+            deleted += _delete(sql, [start, end])
+        return deleted
+
+
+@transaction.commit_on_success
+def _delete(sql, params):
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    # Запрос выполнен в обход ORM, транзакция помечается измененной,
+    # чтобы она была подтверждена.
+    transaction.set_dirty()
+    return cursor.rowcount
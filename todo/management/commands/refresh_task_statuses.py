@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import datetime
+from itertools import groupby
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from todo.caching import bump_chain_versions
+from todo.models import (Chain, ChainSummary, Task, _prev_task,
+                         log_changes, log_chain_changes, store_timelines)
+
+
+class Command(NoArgsCommand):
+    """Пересчитывает сохраненные статусы задач, зависящие от текущей даты.
+
+    Запускается по расписанию раз в день. Задача в статусе WAIT меняет
+    показатели без изменения данных, когда наступает ее дата начала:
+    у первой задачи это дата начала цепочки, у остальных -- дедлайн
+    предыдущей задачи. Так же меняется статус цепочки в сводке, когда
+    наступает дата начала цепочки. Задача в работе, не завершенная
+    к прогнозируемой дате, сдвигает прогноз своей цепочки. Изменения
+    записываются в журнал (``todo.models.Change``), версии измененных
+    цепочек увеличиваются, чтобы сбросить их кэшированное отображение.
+    """
+    help = 'Recalculates stored task statuses that depend on the date.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help='Recalculate every task, e.g. to fill the columns '
+                         'for an existing database.'),
+    )
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        today = datetime.date.today()
+        if options['all']:
+            updated = self.refresh_all(today)
+            updated_chains = self.refresh_all_chains()
+        else:
+            updated = self.refresh_due(today)
+            updated += self.refresh_forecasts(today)
+            updated_chains = self.refresh_started_chains(today)
+        if int(options['verbosity']) > 0:
+            self.stdout.write('Updated {0} tasks and {1} chains.\n'.format(
+                updated, updated_chains))
+
+    def refresh_due(self, today):
+        """Пересчитывает задачи, у которых наступила дата начала."""
+        tasks = Task.objects.filter(
+            effective_status=Task.WAIT_STATUS,
+            effective_start_date__lte=today
+        ).with_timeline()
+        updated = []
+        for task in tasks.iterator():
+            timeline = task.timeline()
+            if (task.effective_status != timeline.status
+                    or task.effective_start_date != timeline.start_date):
+                task.effective_status = timeline.status
+                task.effective_start_date = timeline.start_date
+                Task.objects.filter(pk=task.pk).update(
+                    effective_status=task.effective_status,
+                    effective_start_date=task.effective_start_date
+                )
+                updated.append(task)
+        chain_ids = set(task.chain_id for task in updated)
+        log_changes(updated)
+        log_chain_changes(chain_ids)
+        bump_chain_versions(chain_ids)
+        return len(updated)
+
+    def refresh_forecasts(self, today):
+        """Сдвигает прогноз задач в работе, которые не завершены
+        к прогнозируемой дате, и следующих за ними задач.
+        """
+        tasks = Task.objects.filter(
+            effective_status=Task.WORK_STATUS,
+            forecast_finish_date__lt=today
+        ).select_related('chain')
+        updated = 0
+        for task in tasks.iterator():
+            # Пересчет начинается с задачи, предыдущая задача нужна
+            # для ее показателей.
+            chain_tasks = Task.objects.filter(
+                chain=task.chain_id, order__gte=task.order
+            ).order_by('order')
+            chain_updated = store_timelines(
+                task.chain, chain_tasks.iterator(),
+                prev_task=_prev_task(task.chain_id, task.order), today=today
+            )
+            task.chain.refresh_summary()
+            log_changes(chain_updated, [task.chain])
+            bump_chain_versions([task.chain_id])
+            updated += len(chain_updated)
+        return updated
+
+    def refresh_all(self, today):
+        """Пересчитывает все задачи за один проход по цепочкам."""
+        tasks = Task.objects.select_related('chain').order_by('chain',
+                                                              'order')
+        updated = 0
+        for chain_id, chain_tasks in groupby(tasks.iterator(),
+                                             lambda task: task.chain_id):
+            chain_tasks = list(chain_tasks)
+            chain_updated = store_timelines(chain_tasks[0].chain, chain_tasks,
+                                            today=today,
+                                            until_unchanged=False)
+            log_changes(chain_updated)
+            if chain_updated:
+                bump_chain_versions([chain_id])
+            updated += len(chain_updated)
+        return updated
+
+    def refresh_started_chains(self, today):
+        """Обновляет статус цепочек, у которых наступила дата начала.
+
+        Повторяет правила ChainSummary.started_status() в SQL.
+        """
+        summaries = ChainSummary.objects.filter(
+            status=Chain.WAIT_STATUS,
+            chain__start_date__lte=today
+        )
+        chain_ids = list(summaries.values_list('chain', flat=True))
+        updated = summaries.filter(has_stopped_task=True).update(
+            status=Chain.STOP_STATUS
+        )
+        updated += summaries.filter(last_task_done=True).update(
+            status=Chain.DONE_STATUS
+        )
+        updated += summaries.update(status=Chain.WORK_STATUS)
+        log_chain_changes(chain_ids)
+        bump_chain_versions(chain_ids)
+        return updated
+
+    def refresh_all_chains(self):
+        """Пересчитывает сводки по всем цепочкам.
+
+        В журнал записываются цепочки, статус которых изменился.
+        """
+        statuses = dict(ChainSummary.objects.values_list('chain', 'status'))
+        updated = 0
+        for chain in Chain.objects.iterator():
+            if chain.refresh_summary().status != statuses.get(chain.pk):
+                log_changes(chains=[chain])
+                bump_chain_versions([chain.pk])
+            updated += 1
+        return updated
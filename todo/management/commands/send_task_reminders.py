@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import datetime
+from optparse import make_option
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import NoArgsCommand
+from django.db import connection
+from django.template.loader import render_to_string
+
+from todo.models import Reminder, Task
+
+SUBJECT = u'Напоминание о задачах'
+# О задачах, перешедших в работу раньше, не напоминается, например,
+# при первом запуске команды.
+STARTED_WITHIN_DAYS = 7
+
+
+class Command(NoArgsCommand):
+    """Отправляет исполнителям напоминания о задачах.
+
+    Напоминает о задачах, перешедших в работу после завершения предыдущей
+    задачи, о задачах, до дедлайна которых остался день, и о просроченных
+    задачах. Задачи выбираются по сохраненным статусам, поэтому команда
+    запускается по расписанию после refresh_task_statuses.
+
+    Каждый исполнитель получает одно письмо со всеми напоминаниями.
+    Письма отправляются пачками через одно соединение с почтовым сервером.
+    Напоминания записываются после отправки каждой пачки, поэтому
+    повторный запуск, в том числе после сбоя, не отправляет их снова.
+    """
+    help = 'Sends workers reminders about started, due and overdue tasks.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=100,
+                    help='Number of emails sent before the reminders are '
+                         'recorded.'),
+    )
+
+    def handle_noargs(self, **options):
+        today = datetime.date.today()
+        recipients = self.pending_reminders(today)
+        reminders = self.send(recipients, options['batch_size'])
+        if int(options['verbosity']) > 0:
+            self.stdout.write('Sent {0} reminders in {1} emails.\n'.format(
+                reminders, len(recipients)))
+
+    def pending_reminders(self, today):
+        """Возвращает неотправленные напоминания, сгруппированные
+        по исполнителям: список (исполнитель, [(вид, задача), ...]).
+
+        Задачи каждого вида выбираются одним запросом.
+        """
+        tasks = (Task.objects.filter(archive=False,
+                                     worker__is_active=True)
+                 .exclude(status__in=(Task.DONE_STATUS, Task.STOP_STATUS))
+                 .exclude(worker__email='')
+                 .select_related('worker', 'chain')
+                 .order_by('deadline', 'pk'))
+        started_since = today - datetime.timedelta(days=STARTED_WITHIN_DAYS)
+        kinds = (
+            (Reminder.STARTED_KIND, tasks.by_status(Task.WORK_STATUS).filter(
+                order__gt=Task.FIRST_TASK,
+                effective_start_date__gt=started_since
+            )),
+            (Reminder.DUE_KIND, tasks.due_within(1, today)),
+            (Reminder.OVERDUE_KIND, tasks.overdue(done=False, today=today)),
+        )
+        workers = {}
+        reminders = {}
+        for kind, queryset in kinds:
+            for task in _not_reminded(queryset, kind).iterator():
+                workers[task.worker_id] = task.worker
+                reminders.setdefault(task.worker_id, []).append((kind, task))
+        return [(workers[worker_id], reminders[worker_id])
+                for worker_id in sorted(reminders)]
+
+    def send(self, recipients, batch_size):
+        """Отправляет письма пачками через одно соединение.
+
+        Возвращает количество отправленных напоминаний.
+        """
+        if not recipients:
+            return 0
+        mail_connection = get_connection()
+        mail_connection.open()
+        sent = 0
+        try:
+            for start in range(0, len(recipients), batch_size):
+                batch = recipients[start:start + batch_size]
+                mail_connection.send_messages([
+                    self.message(worker, reminders)
+                    for worker, reminders in batch
+                ])
+                records = [
+                    Reminder(task=task, kind=kind, deadline=task.deadline)
+                    for worker, reminders in batch
+                    for kind, task in reminders
+                ]
+                Reminder.objects.bulk_create(records)
+                sent += len(records)
+        finally:
+            mail_connection.close()
+        return sent
+
+    def message(self, worker, reminders):
+        """Возвращает письмо с напоминаниями исполнителю."""
+        context = {
+            'worker': worker,
+            'site_url': getattr(settings, 'TODO_SITE_URL', ''),
+        }
+        for kind, label in Reminder.KIND_CHOICES:
+            context[label] = [task for task_kind, task in reminders
+                              if task_kind == kind]
+        body = render_to_string('todo/email/reminders.txt', context)
+        return EmailMessage(SUBJECT, body, to=[worker.email])
+
+
+def _not_reminded(queryset, kind):
+    """Исключает задачи, напоминание о которых уже отправлено
+    к их текущему дедлайну.
+    """
+    qn = connection.ops.quote_name
+    opts = Task._meta
+    reminder_opts = Reminder._meta
+    table = qn(opts.db_table)
+    return queryset.extra(where=[
+        'NOT EXISTS (SELECT 1 FROM {reminders} reminder '
+        'WHERE reminder.{task_id} = {table}.{pk} '
+        'AND reminder.{kind} = %s '
+        'AND reminder.{deadline} = {table}.{task_deadline})'.format(
+            reminders=qn(reminder_opts.db_table),
+            task_id=qn(reminder_opts.get_field('task').column),
+            kind=qn(reminder_opts.get_field('kind').column),
+            deadline=qn(reminder_opts.get_field('deadline').column),
+            table=table,
+            pk=qn(opts.pk.column),
+            task_deadline=qn(opts.get_field('deadline').column),
+        )
+    ], params=[kind])
@@ -1,8 +1,30 @@
 # -*- coding: utf-8 -*-
+import datetime
+
+from django.db import connection
+from django.db.models import Count, F, Q
 from django.db.models.query import QuerySet
+from django.utils.datastructures import SortedDict
 
 
 class ChainQuerySet(QuerySet):
+    # Подгружать ли задачи цепочек вместе с цепочками.
+    _with_timeline = False
+
+    def _clone(self, *args, **kwargs):
+        kwargs.setdefault('_with_timeline', self._with_timeline)
+        return super(ChainQuerySet, self)._clone(*args, **kwargs)
+
+    def iterator(self):
+        chains = super(ChainQuerySet, self).iterator()
+        if not self._with_timeline:
+            return chains
+        chains = list(chains)
+        batch = _TimelineBatch(chains)
+        for chain in chains:
+            chain._timeline_batch = batch
+        return iter(chains)
+
     def by_owner(self, owner):
         """Возвращает цепочки владельца."""
         return self.filter(owner=owner)
@@ -11,6 +33,110 @@ class ChainQuerySet(QuerySet):
         """Возвращает актуальтуные цепочки задач."""
         return self.filter(archive=False).order_by('start_date')
 
+    def archived(self):
+        """Возвращает архивные цепочки задач."""
+        return self.filter(archive=True)
+
+    def by_status(self, status):
+        """Возвращает цепочки с заданным статусом из сводки по цепочке."""
+        return self.filter(summary__status=status)
+
+    def overdue(self, done=True, today=None):
+        """Возвращает просроченные цепочки.
+
+        Совпадает с ``Chain.be_in_time()``: цепочка просрочена, если
+        просрочена ее последняя задача. Если ``done`` ложно, цепочки,
+        завершенные с опозданием, не выбираются.
+        """
+        today = today or datetime.date.today()
+        overdue = Q(summary__last_task_done=False,
+                    summary__deadline__lte=today)
+        if done:
+            overdue |= Q(summary__last_task_done=True,
+                         summary__finish_date__gte=F('summary__deadline'))
+        return self.filter(overdue)
+
+    def due_within(self, days, today=None):
+        """Возвращает незавершенные цепочки, до дедлайна которых осталось
+        не больше ``days`` полных дней (``Chain.remaining_days()``).
+        """
+        today = today or datetime.date.today()
+        return self.filter(
+            summary__last_task_done=False,
+            summary__deadline__gt=today,
+            summary__deadline__lte=today + datetime.timedelta(days + 1)
+        )
+
+    def starting_within(self, days, today=None):
+        """Возвращает цепочки, до начала которых осталось не больше
+        ``days`` полных дней (``Chain.days_to_start()``).
+        """
+        today = today or datetime.date.today()
+        return self.filter(
+            start_date__gt=today,
+            start_date__lte=today + datetime.timedelta(days + 1)
+        )
+
+    def with_deadline_days(self, today=None):
+        """Добавляет рассчитанные в базе ``days_before_deadline``
+        и ``days_after_deadline``.
+
+        Значения совпадают с ``Chain.remaining_days()``
+        и ``Chain.days_quantity_after_deadline()`` и берутся из сводки.
+        База считает календарные дни, рабочий календарь
+        (``todo.calendars``) не учитывается.
+        """
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        summary = opts.get_field_by_name('summary')[0].model._meta
+        column = lambda name: 'summary.' + qn(summary.get_field(name).column)
+        subquery = lambda expression: (
+            '(SELECT {expression} FROM {summary_table} summary '
+            'WHERE summary.{chain_id} = {table}.{pk})'
+        ).format(expression=expression, summary_table=qn(summary.db_table),
+                 chain_id=qn(summary.get_field('chain').column),
+                 table=qn(opts.db_table), pk=qn(opts.pk.column))
+        return _with_deadline_days(
+            self, subquery, today,
+            done=column('last_task_done'),
+            deadline=column('deadline'),
+            finish_date=column('finish_date'),
+        )
+
+    def status_counts_by_owner(self):
+        """Возвращает количество цепочек каждого владельца по статусам.
+
+        Возвращает словарь {id владельца: {статус: количество}}. Статусы
+        берутся из сводок по цепочкам, как в ``by_status()``. Считается
+        одним запросом с группировкой.
+        """
+        rows = (self.order_by().values('owner', 'summary__status')
+                .annotate(count=Count('pk')))
+        counts = {}
+        for row in rows:
+            owner_counts = counts.setdefault(row['owner'], {})
+            owner_counts[row['summary__status']] = row['count']
+        return counts
+
+    def with_summary(self):
+        """Подгружает сводки по цепочкам тем же запросом.
+
+        Статус, дедлайн и дата завершения цепочки берутся из сводки.
+        """
+        return self.select_related('summary')
+
+    def with_timeline(self):
+        """Подгружает задачи цепочек вместе с подписями исполнителей.
+
+        Задачи всех цепочек выбираются одним запросом, подписи исполнителей,
+        которых нет в памяти процесса, -- другим. Показатели задач
+        рассчитываются за один проход по каждой цепочке. Задачи
+        подгружаются при первом обращении к задачам любой из цепочек,
+        поэтому их не нужно выбирать, если отображение цепочек взято
+        из кэша.
+        """
+        return self._clone(_with_timeline=True)
+
 
 class TaskQuerySet(QuerySet):
     def by_worker(self, worker):
@@ -20,3 +146,194 @@ class TaskQuerySet(QuerySet):
     def actual(self):
         """Возвращает актуальные задачи."""
         return self.filter(archive=False).order_by('deadline')
+
+    def archived(self):
+        """Возвращает архивные задачи."""
+        return self.filter(archive=True)
+
+    def by_status(self, status):
+        """Возвращает задачи с заданным фактическим статусом.
+
+        Используется статус, сохраненный при последнем изменении задачи
+        или пересчете командой refresh_task_statuses.
+        """
+        return self.filter(effective_status=status)
+
+    def overdue(self, done=True, today=None):
+        """Возвращает просроченные задачи.
+
+        Совпадает с ``Task.be_in_time()``. Если ``done`` ложно, задачи,
+        завершенные с опозданием, не выбираются.
+        """
+        DONE_STATUS = self.model.DONE_STATUS
+        today = today or datetime.date.today()
+        overdue = ~Q(status=DONE_STATUS) & Q(deadline__lte=today)
+        if done:
+            overdue |= Q(status=DONE_STATUS,
+                         finish_date__gte=F('deadline'))
+        return self.filter(overdue)
+
+    def due_within(self, days, today=None):
+        """Возвращает незавершенные задачи, до дедлайна которых осталось
+        не больше ``days`` полных дней (``Task.remaining_days()``).
+        """
+        today = today or datetime.date.today()
+        return self.exclude(status=self.model.DONE_STATUS).filter(
+            deadline__gt=today,
+            deadline__lte=today + datetime.timedelta(days + 1)
+        )
+
+    def starting_within(self, days, today=None):
+        """Возвращает задачи, до начала которых осталось не больше ``days``
+        полных дней (``Task.days_to_start()``).
+
+        Используется дата начала, сохраненная при последнем изменении
+        задачи или пересчете командой refresh_task_statuses.
+        """
+        today = today or datetime.date.today()
+        return self.filter(
+            effective_start_date__gt=today,
+            effective_start_date__lte=today + datetime.timedelta(days + 1)
+        )
+
+    def open_counts_by_worker(self, today=None):
+        """Возвращает количество незавершенных и просроченных задач
+        каждого исполнителя.
+
+        Возвращает словарь {id исполнителя: {'open': количество,
+        'overdue': количество}}. Просроченные задачи выбираются
+        ``overdue(done=False)``. Считается двумя запросами с группировкой.
+        """
+        tasks = self.order_by().exclude(status=self.model.DONE_STATUS)
+        counts = {}
+        for key, queryset in (('open', tasks),
+                              ('overdue', tasks.overdue(done=False,
+                                                        today=today))):
+            rows = queryset.values('worker').annotate(count=Count('pk'))
+            for row in rows:
+                worker_counts = counts.setdefault(
+                    row['worker'], {'open': 0, 'overdue': 0})
+                worker_counts[key] = row['count']
+        return counts
+
+    def with_deadline_days(self, today=None):
+        """Добавляет рассчитанные в базе ``days_before_deadline``
+        и ``days_after_deadline``.
+
+        Значения совпадают с ``Task.remaining_days()``
+        и ``Task.days_quantity_after_deadline()``. База считает
+        календарные дни, рабочий календарь (``todo.calendars``)
+        не учитывается.
+        """
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        column = lambda name: '{table}.{column}'.format(
+            table=qn(opts.db_table), column=qn(opts.get_field(name).column))
+        return _with_deadline_days(
+            self, lambda expression: expression, today,
+            done='{0} = {1:d}'.format(column('status'),
+                                      self.model.DONE_STATUS),
+            deadline=column('deadline'),
+            finish_date=column('finish_date'),
+        )
+
+    def with_timeline(self):
+        """Подгружает данные для расчета показателей задач.
+
+        Статус, дедлайн и дата завершения предыдущей задачи выбираются
+        подзапросами, дата начала цепочки -- через join. Показатели задач
+        рассчитываются без дополнительных запросов. Предыдущей считается
+        ближайшая задача с меньшим номером: задачу из середины цепочки
+        можно удалить.
+        """
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        table = qn(opts.db_table)
+        chain_id = qn(opts.get_field('chain').column)
+        order = qn(opts.get_field('order').column)
+        select = {}
+        for field_name in ('status', 'deadline', 'finish_date'):
+            column = qn(opts.get_field(field_name).column)
+            select['prev_' + field_name] = (
+                'SELECT prev.{column} FROM {table} prev '
+                'WHERE prev.{chain_id} = {table}.{chain_id} '
+                'AND prev.{order} < {table}.{order} '
+                'ORDER BY prev.{order} DESC LIMIT 1'
+            ).format(column=column, table=table, chain_id=chain_id,
+                     order=order)
+        return self.select_related('chain').extra(select=select)
+
+
+def _with_deadline_days(queryset, wrap, today, done, deadline, finish_date):
+    """Добавляет к выборке количество оставшихся и просроченных дней.
+
+    ``done``, ``deadline`` и ``finish_date`` -- SQL-выражения признака
+    завершения, дедлайна и даты завершения, ``wrap`` оборачивает
+    выражение, например, в подзапрос к сводке.
+    """
+    today = today or datetime.date.today()
+    before_deadline = (
+        'CASE WHEN {deadline} > %s THEN {days} - 1 END'
+    ).format(deadline=deadline, days=_days_between(deadline, '%s'))
+    after_deadline = (
+        'CASE WHEN {done} THEN (CASE WHEN {finish_date} >= {deadline} '
+        'THEN {finish_days} + 1 END) '
+        'WHEN {deadline} <= %s THEN {today_days} + 1 END'
+    ).format(done=done, deadline=deadline, finish_date=finish_date,
+             finish_days=_days_between(finish_date, deadline),
+             today_days=_days_between('%s', deadline))
+    select = SortedDict()
+    select['days_before_deadline'] = wrap(before_deadline)
+    select['days_after_deadline'] = wrap(after_deadline)
+    return queryset.extra(select=select,
+                          select_params=(today, today, today, today))
+
+
+def _days_between(later, earlier):
+    """Возвращает SQL-выражение количества дней между датами."""
+    if connection.vendor == 'sqlite':
+        return 'CAST(julianday({0}) - julianday({1}) AS INTEGER)'.format(
+            later, earlier)
+    if connection.vendor == 'mysql':
+        return 'DATEDIFF({0}, {1})'.format(later, earlier)
+    return '({0} - {1})'.format(later, earlier)
+
+
+class _TimelineBatch(object):
+    """Подгружает задачи сразу для всех цепочек выборки."""
+    def __init__(self, chains):
+        self.chains = chains
+        self.loaded = False
+
+    def load(self):
+        if not self.loaded:
+            self.loaded = True
+            _prefetch_timelines(self.chains)
+
+
+def _prefetch_timelines(chains):
+    """Подгружает задачи цепочек и рассчитывает их показатели."""
+    from todo.caching import worker_labels
+    from todo.models import Task
+    from todo.timeline import chain_timeline
+    from todo.utils import memoized_today, set_memoized
+
+    if not chains:
+        return
+    chains_by_id = dict((chain.pk, chain) for chain in chains)
+    tasks_by_chain = dict((chain.pk, []) for chain in chains)
+
+    tasks = list(Task.objects.filter(chain__in=chains_by_id.keys())
+                 .order_by('order'))
+    # Подписи исполнителей берутся из памяти процесса, недостающие
+    # выбираются одним запросом.
+    labels = worker_labels(task.worker_id for task in tasks)
+    for task in tasks:
+        task.chain = chains_by_id[task.chain_id]
+        tasks_by_chain[task.chain_id].append(task)
+        set_memoized(task, 'worker_label', labels[task.worker_id])
+
+    for chain in chains:
+        tasks = tasks_by_chain[chain.pk]
+        chain_timeline(chain, tasks, memoized_today(chain))
+        set_memoized(chain, 'timeline', tasks)
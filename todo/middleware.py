@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import time
+
+from django.db import connection
+from django.template.response import SimpleTemplateResponse
+
+from todo import profiling
+
+logger = logging.getLogger('todo.profiling')
+
+
+class ProfilingMiddleware(object):
+    """Профилирует запросы.
+
+    Записывает количество и время запросов к базе, повторяющиеся по форме
+    запросы, время вычисляемых методов моделей и время отрисовки шаблона.
+    Показатели добавляются в заголовки X-Todo-* ответа и записываются
+    одной строкой JSON в лог todo.profiling.
+
+    Включается добавлением в MIDDLEWARE_CLASSES. Запросы к базе
+    записываются и при DEBUG = False, поэтому профилирование замедляет
+    обработку запроса.
+    """
+    def process_request(self, request):
+        request._todo_use_debug_cursor = connection.use_debug_cursor
+        request._todo_queries_offset = len(connection.queries)
+        connection.use_debug_cursor = True
+        request._todo_profile = profiling.start()
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, '_todo_profile', None)
+        if profile is None or not isinstance(response,
+                                             SimpleTemplateResponse):
+            return response
+        # Шаблон отрисовывается сразу после обработки ответа middleware.
+        started = time.time()
+
+        def render_finished(response):
+            profile.render_time += time.time() - started
+
+        response.add_post_render_callback(render_finished)
+        return response
+
+    def process_response(self, request, response):
+        profile = getattr(request, '_todo_profile', None)
+        if profile is None:
+            return response
+        profiling.stop()
+        connection.use_debug_cursor = request._todo_use_debug_cursor
+        profile.queries = connection.queries[request._todo_queries_offset:]
+
+        total_time = time.time() - profile.started
+        duplicates = profile.duplicates()
+        methods = sorted(profile.methods.items(),
+                         key=lambda item: -item[1][0])
+        response['X-Todo-Time'] = _ms(total_time)
+        response['X-Todo-Queries'] = str(len(profile.queries))
+        response['X-Todo-DB-Time'] = _ms(profile.db_time())
+        response['X-Todo-Duplicate-Queries'] = str(
+            sum(count - 1 for shape, count in duplicates))
+        response['X-Todo-Render-Time'] = _ms(profile.render_time)
+        response['X-Todo-Methods'] = ', '.join(
+            '{0};calls={1};ms={2}'.format(name, calls, _ms(elapsed))
+            for name, (elapsed, calls) in methods
+        )
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'time_ms': float(_ms(total_time)),
+            'queries': len(profile.queries),
+            'db_time_ms': float(_ms(profile.db_time())),
+            'render_time_ms': float(_ms(profile.render_time)),
+            'duplicates': [{'sql': shape, 'count': count}
+                           for shape, count in duplicates],
+            'methods': [{'name': name, 'calls': calls,
+                         'time_ms': float(_ms(elapsed))}
+                        for name, (elapsed, calls) in methods],
+        }, sort_keys=True))
+        return response
+
+
+def _ms(seconds):
+    """Форматирует время в миллисекундах."""
+    return '{0:.2f}'.format(seconds * 1000)
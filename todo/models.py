@@ -2,10 +2,21 @@
 import datetime
 
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from model_utils.managers import PassThroughManager
 
 from todo.managers import ChainQuerySet, TaskQuerySet
+from todo.caching import (bump_chain_versions, bump_user_versions,
+                          chain_version, forget_worker_label, worker_labels)
+from todo.calendars import get_calendar
+from todo.timeline import (chain_timeline, task_timeline, task_forecast,
+                           days_after_deadline, days_before_deadline,
+                           forecast_slip)
+from todo.utils import (commit_on_success_unless_managed, memoized,
+                        memoized_today, get_memoized, reset_memoized)
 
 
 class Chain(models.Model):
@@ -22,15 +33,40 @@ class Chain(models.Model):
     # Metadata.
     owner = models.ForeignKey(User)
     archive = models.BooleanField(default=False)
+    # Порядковый номер последней добавленной задачи.
+    last_order = models.IntegerField(default=0, editable=False)
 
     # Default manager.
     objects = PassThroughManager.for_queryset_class(ChainQuerySet)()
 
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        super(Chain, self).save(*args, **kwargs)
+        reset_memoized(self)
+        # От даты начала цепочки зависят показатели первой задачи.
+        if is_new:
+            updated = []
+        else:
+            updated = store_timelines(
+                self, self.task_set.order_by('order').iterator())
+        self.refresh_summary()
+        # Цепочка, переданная другому владельцу, исчезает из списков
+        # прежнего владельца.
+        removed = []
+        if self._todo_saved_owner_id not in (None, self.owner_id):
+            removed.append((self._todo_saved_owner_id, self))
+        self._todo_saved_owner_id = self.owner_id
+        log_changes(updated, [self], removed=removed)
+
+    @memoized
     def actual_status(self):
         """Определяет фактический статус цепочки."""
-        if self.start_date > datetime.date.today():
+        if self.start_date > memoized_today(self):
             return self.WAIT_STATUS
-        if self.task_set.filter(status=Task.STOP_STATUS).exists():
+        summary = self._loaded_summary()
+        if summary is not None:
+            return summary.started_status()
+        if self._has_stopped_task():
             return self.STOP_STATUS
         last_task = self.last_task()
         if last_task.actual_status() == Task.DONE_STATUS:
@@ -43,6 +79,9 @@ class Chain(models.Model):
 
         Дедлайн цепочки равен дедлайну последней задачи в цепочке.
         """
+        summary = self._loaded_summary()
+        if summary is not None:
+            return summary.deadline
         last_task = self.last_task()
         return last_task.deadline
 
@@ -52,9 +91,37 @@ class Chain(models.Model):
         Дата завершения цепочки равна дате завершения последней задачи
         в цепочке.
         """
+        summary = self._loaded_summary()
+        if summary is not None:
+            return summary.finish_date
         last_task = self.last_task()
         return last_task.finish_date
 
+    def forecast_finish_date(self):
+        """Прогнозирует дату завершения цепочки.
+
+        Равна прогнозируемой дате завершения последней задачи в цепочке.
+        Прогноз сохраняется при изменении задач и пересчитывается командой
+        refresh_task_statuses.
+        """
+        summary = self._loaded_summary()
+        if summary is not None:
+            return summary.forecast_finish_date
+        last_task = self.last_task()
+        return last_task.forecast_finish_date
+
+    def forecast_slip(self):
+        """Определяет, на сколько дней прогноз завершения цепочки
+        опаздывает к дедлайну.
+
+        Ноль или отрицательное значение -- цепочка успевает к дедлайну,
+        None -- прогноз невозможен.
+        """
+        forecast_finish_date = self.forecast_finish_date()
+        if forecast_finish_date is None:
+            return None
+        return forecast_slip(self.deadline(), forecast_finish_date)
+
     def be_in_time(self):
         """Определяет, успевает ли цепочка задач к дедлайну."""
         return self.days_quantity_after_deadline() is None
@@ -62,10 +129,11 @@ class Chain(models.Model):
     def days_to_start(self):
         """Определяет количество дней, оставшихся до начала работы цепочки.
         """
-        today = datetime.date.today()
+        today = memoized_today(self)
         if self.start_date > today:
-            time_to_start = self.start_date - today - datetime.timedelta(1)
-            days_to_start = time_to_start.days
+            days_to_start = get_calendar().count(
+                today + datetime.timedelta(1), self.start_date
+            )
         else:
             days_to_start = None
         return days_to_start
@@ -76,6 +144,12 @@ class Chain(models.Model):
         Совпадает с количеством дней, оставшихся до дедлайна последней
         задачи в цепочке.
         """
+        summary = self._loaded_summary()
+        if summary is not None:
+            if summary.deadline is None:
+                return None
+            return days_before_deadline(summary.deadline,
+                                        memoized_today(self))
         last_task = self.last_task()
         return last_task.remaining_days()
 
@@ -85,6 +159,14 @@ class Chain(models.Model):
         Совпадает с количеством просроченных дней последней
         задачи в цепочке.
         """
+        summary = self._loaded_summary()
+        if summary is not None:
+            if summary.deadline is None:
+                return None
+            return days_after_deadline(
+                summary.last_task_done, summary.deadline,
+                summary.finish_date, memoized_today(self)
+            )
         last_task = self.last_task()
         return last_task.days_quantity_after_deadline()
 
@@ -94,20 +176,158 @@ class Chain(models.Model):
         if status == self.WAIT_STATUS:
             expended_days = 0
         elif status == self.WORK_STATUS:
-            today = datetime.date.today()
-            expended_time = today - self.start_date + datetime.timedelta(1)
-            expended_days = expended_time.days
+            today = memoized_today(self)
+            expended_days = get_calendar().count(
+                self.start_date, today + datetime.timedelta(1)
+            )
         elif status == self.DONE_STATUS:
-            expended_time = (self.finish_date() - self.start_date
-                             + datetime.timedelta(days=1))
-            expended_days = expended_time.days
+            expended_days = get_calendar().count(
+                self.start_date, self.finish_date() + datetime.timedelta(1)
+            )
         else:
             expended_days = None
         return expended_days
 
+    def reserve_orders(self, count=1):
+        """Резервирует порядковые номера для новых задач цепочки.
+
+        Счетчик увеличивается в базе выражением UPDATE и перечитывается.
+        UPDATE блокирует строку цепочки до конца транзакции, поэтому метод
+        вызывается в транзакции, и перечитанное значение не может изменить
+        другой процесс. Возвращает первый из зарезервированных номеров.
+        """
+        chains = Chain.objects.filter(pk=self.pk)
+        chains.update(last_order=F('last_order') + count)
+        self.last_order = chains.values_list('last_order', flat=True).get()
+        return self.last_order - count + 1
+
+    @commit_on_success_unless_managed
+    def add_tasks(self, tasks):
+        """Добавляет задачи в конец цепочки одним запросом.
+
+        Задачи сохраняются через ``bulk_create()``, поэтому ``save()``
+        и сигналы сохранения не вызываются. ``bulk_create()`` не возвращает
+        первичные ключи, поэтому они выбираются отдельным запросом.
+        Счетчик порядковых номеров изменяется в той же транзакции, что
+        и добавление задач.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return tasks
+        order = self.reserve_orders(len(tasks))
+        prev_task = _prev_task(self.pk, order)
+        today = memoized_today(self)
+        calendar = get_calendar()
+        first_order = order
+        for task in tasks:
+            task.chain = self
+            task.order = order
+            set_stored_timeline(task, prev_task, self.start_date, today,
+                                calendar)
+            order += 1
+            prev_task = task
+        Task.objects.bulk_create(tasks)
+        pks = dict(self.task_set.filter(order__gte=first_order)
+                   .values_list('order', 'pk'))
+        for task in tasks:
+            task.pk = pks[task.order]
+        reset_memoized(self)
+        self.refresh_summary()
+        bump_chain_versions([self.pk])
+        # Задачи в конце цепочки не меняют статусы предыдущих задач,
+        # поэтому версии списков меняются только у владельца и исполнителей
+        # новых задач -- при записи в журнал.
+        log_changes(tasks, [self])
+        return tasks
+
+    def refresh_summary(self):
+        """Пересчитывает сводку по задачам цепочки."""
+        summary = ChainSummary(chain=self)
+        tasks = self.task_set.values_list('order', 'status', 'deadline',
+                                          'finish_date',
+                                          'forecast_finish_date')
+        summary.calculate(tasks, memoized_today(self))
+        values = dict(
+            (field.attname, getattr(summary, field.attname))
+            for field in ChainSummary._meta.fields if not field.primary_key
+        )
+        if not ChainSummary.objects.filter(chain=self).update(**values):
+            summary.save(force_insert=True)
+        self._summary_cache = summary
+        return summary
+
+    @memoized
+    def cache_version(self):
+        """Возвращает версию кэша отображения цепочки.
+
+        Версия меняется при сохранении цепочки, ее задач и исполнителей,
+        а также при смене даты.
+        """
+        return u'{version}.{today}'.format(
+            version=chain_version(self.pk),
+            today=memoized_today(self).isoformat()
+        )
+
+    @memoized
     def last_task(self):
-        """Возвращает последнуюю задачу из цепочки."""
-        return self.task_set.latest('deadline')
+        """Возвращает последнуюю задачу из цепочки.
+
+        Последняя задача -- задача с самым поздним дедлайном, из задач
+        с одинаковым дедлайном -- с наибольшим номером, как в сводке.
+        """
+        tasks = self._loaded_timeline()
+        if tasks is None:
+            tasks = list(self.task_set.order_by('-deadline', '-order')[:1])
+            if not tasks:
+                raise Task.DoesNotExist
+            last_task = tasks[0]
+            last_task.chain = self
+            return last_task
+        if not tasks:
+            raise Task.DoesNotExist
+        return max(tasks, key=lambda task: (task.deadline, task.order))
+
+    @memoized
+    def timeline(self):
+        """Возвращает задачи цепочки с рассчитанными показателями.
+
+        Задачи загружаются одним запросом и обходятся по порядку. Если цепочка
+        выбрана ``ChainQuerySet.with_timeline()``, задачи подгружаются сразу
+        для всех цепочек выборки.
+        """
+        tasks = self._loaded_timeline()
+        if tasks is not None:
+            return tasks
+        tasks = list(self.task_set.order_by('order'))
+        for task in tasks:
+            task.chain = self
+        return chain_timeline(self, tasks, memoized_today(self))
+
+    @memoized
+    def _has_stopped_task(self):
+        """Определяет, есть ли в цепочке остановленная задача."""
+        tasks = self._loaded_timeline()
+        if tasks is None:
+            return self.task_set.filter(status=Task.STOP_STATUS).exists()
+        for task in tasks:
+            if task.status == Task.STOP_STATUS:
+                return True
+        return False
+
+    def _loaded_timeline(self):
+        """Возвращает задачи цепочки, если они подгружены выборкой."""
+        batch = getattr(self, '_timeline_batch', None)
+        if batch is not None:
+            batch.load()
+        return get_memoized(self, 'timeline')
+
+    def _loaded_summary(self):
+        """Возвращает сводку, если она выбрана вместе с цепочкой."""
+        return getattr(self, '_summary_cache', None)
+
+    def _memo_state(self):
+        """Поля, от которых зависят вычисляемые значения цепочки."""
+        return (self.pk, self.start_date)
 
 
 class Task(models.Model):
@@ -135,60 +355,103 @@ class Task(models.Model):
     chain = models.ForeignKey(Chain)
     order = models.IntegerField()
     archive = models.BooleanField(default=False)
+    # Фактический статус и дата начала на дату последнего пересчета.
+    # Нужны для выборок в SQL, методы модели рассчитывают их заново.
+    effective_status = models.IntegerField(default=UNCERTAIN_STATUS,
+                                           editable=False)
+    effective_start_date = models.DateField(null=True, editable=False)
+    # Прогноз дат начала и завершения на дату последнего пересчета.
+    forecast_start_date = models.DateField(null=True, editable=False)
+    forecast_finish_date = models.DateField(null=True, editable=False)
 
     # Default manager.
     objects = PassThroughManager.for_queryset_class(TaskQuerySet)()
 
+    class Meta:
+        # Составные индексы для выборок задач описаны в sql/task.sql.
+        unique_together = ('chain', 'order')
+
     def __unicode__(self):
         return self.task
 
+    @commit_on_success_unless_managed
     def save(self, *args, **kwargs):
-        # Расчитывает порядковый номер у новой задачи.
+        # Присваивает порядковый номер новой задаче. Номер резервируется
+        # в той же транзакции, что и сохранение задачи.
         if not self.pk:
-            try:
-                last_task = self.chain.last_task()
-                self.order = last_task.order + 1
-            except self.DoesNotExist:
-                self.order = self.FIRST_TASK
+            self.order = self.chain.reserve_orders()
+        # Прогноз рассчитывается по сохраненному прогнозу предыдущей задачи.
+        if self.order == self.FIRST_TASK:
+            prev_task = None
+        else:
+            prev_task = _prev_task(self.chain_id, self.order)
+        set_stored_timeline(self, prev_task, self.chain.start_date,
+                            memoized_today(self))
         super(Task, self).save(*args, **kwargs)
+        reset_memoized(self)
+        # Изменение задачи меняет показатели цепочки.
+        chain = getattr(self, '_chain_cache', None)
+        if chain is not None:
+            reset_memoized(chain)
+        # Показатели и прогноз задачи зависят только от предыдущей задачи,
+        # поэтому пересчитываются следующие задачи, пока их показатели
+        # меняются.
+        following_tasks = Task.objects.filter(
+            chain=self.chain_id, order__gt=self.order
+        ).order_by('order')
+        # От дедлайна задачи зависит количество дней, выделенных
+        # на следующую задачу, а оно не сохраняется.
+        updated = store_timelines(
+            self.chain, following_tasks.iterator(), prev_task=self,
+            today=memoized_today(self),
+            first_changed=self.deadline != self._todo_saved_deadline
+        )
+        self.chain.refresh_summary()
+        bump_chain_versions([self.chain_id])
+        # Версии списков меняются при записи в журнал только у владельца
+        # и исполнителей задач, показатели которых изменились: списки
+        # остальных исполнителей цепочки остались прежними. Задача,
+        # переданная другому исполнителю, исчезает из списков прежнего.
+        removed = []
+        if self._todo_saved_worker_id not in (None, self.worker_id):
+            removed.append((self._todo_saved_worker_id, self))
+        self._todo_saved_worker_id = self.worker_id
+        self._todo_saved_deadline = self.deadline
+        log_changes([self] + updated, [self.chain], removed=removed)
 
     @models.permalink
     def get_absolute_url(self):
         return ('todo_task_detail', (), {'task_id': self.pk})
 
-    def actual_status(self):
-        """Определяет фактический статус задачи."""
-        if self.status in (self.DONE_STATUS, self.STOP_STATUS):
-            return self.status
+    @memoized
+    def timeline(self):
+        """Возвращает рассчитанные показатели задачи.
+
+        Если задача была получена через ``Chain.timeline()``, показатели уже
+        рассчитаны при обходе цепочки. Иначе они рассчитываются по предыдущей
+        задаче, данные которой могли быть выбраны
+        ``TaskQuerySet.with_timeline()``.
+        """
         if self.order == self.FIRST_TASK:
-            if self.chain.start_date > datetime.date.today():
-                return self.WAIT_STATUS
+            prev_task = None
+        elif hasattr(self, 'prev_deadline'):
+            # Дедлайна нет, только если нет предыдущей задачи.
+            if self.prev_deadline is None:
+                prev_task = None
             else:
-                return self.WORK_STATUS
-        prev_task = _prev_task(self)
-        if prev_task.status == self.DONE_STATUS:
-            return self.WORK_STATUS
+                prev_task = _annotated_prev_task(self)
         else:
-            return self.WAIT_STATUS
+            prev_task = _prev_task(self.chain_id, self.order)
+        return task_timeline(self, prev_task, self.chain.start_date,
+                             memoized_today(self))
+
+    def actual_status(self):
+        """Определяет фактический статус задачи."""
+        return self.timeline().status
 
     def start_date(self):
         """Определяет дату начала работы над задачей, если это возможно."""
-        # Для первой задачи равна дате начала работы над цепочкой.
-        if self.order == self.FIRST_TASK:
-            return self.chain.start_date
-        prev_task = _prev_task(self)
-        # Для статуса WAIT равна дедлайну предыдущей задачи. Если дедлайн
-        # просрочен, дата начала задачи не прогнозируема.
-        # Для статусов WORK, DONE, STOP равна следующей дате, после окончания
-        # предыдущей задачи.
-        if self.actual_status() == self.WAIT_STATUS:
-            if prev_task.deadline > datetime.date.today():
-                start_date = prev_task.deadline
-            else:
-                start_date = None
-        else:
-            start_date = prev_task.finish_date + datetime.timedelta(days=1)
-        return start_date
+        return self.timeline().start_date
 
     def be_in_time(self):
         """Определяет, успевает ли задача к дедлайну."""
@@ -201,14 +464,7 @@ class Task(models.Model):
         До начала работы осталось 2 полных дня, так как текущий день
         не учитывается.
         """
-        start_date = self.start_date()
-        today = datetime.date.today()
-        if start_date is not None and start_date > today:
-            time_to_start = start_date - today - datetime.timedelta(days=1)
-            days_to_start = time_to_start.days
-        else:
-            days_to_start = None
-        return days_to_start
+        return self.timeline().days_to_start
 
     def remaining_days(self):
         """Определяет количество дней, оставшихся до дедлайна.
@@ -217,70 +473,289 @@ class Task(models.Model):
         До дедлайна остался 1 полный день (28 число), так как текущий день
         не учитывается.
         """
-        today = datetime.date.today()
-        if today < self.deadline:
-            # Учитываем только полные дни
-            time_remaining = self.deadline - today - datetime.timedelta(days=1)
-            remaining_days = time_remaining.days
-        else:
-            remaining_days = None
-        return remaining_days
+        return days_before_deadline(self.deadline, memoized_today(self))
 
     def days_quantity_after_deadline(self):
         """Определяет количество дней, на которые просрочена задача."""
-        days_quantity = None
-        today = datetime.date.today()
-        if self.actual_status() == self.DONE_STATUS:
-            # Задача завершена с превышением дедлайна.
-            if self.finish_date >= self.deadline:
-                time_after_deadline = (self.finish_date - self.deadline
-                                       + datetime.timedelta(1))
-                days_quantity = time_after_deadline.days
-        # Задача со статусом WAIT/WORK/STOP превысила дедлайн.
-        elif today >= self.deadline:
-            time_after_deadline = today - self.deadline + datetime.timedelta(1)
-            days_quantity = time_after_deadline.days
-        return days_quantity
+        return self.timeline().days_quantity_after_deadline
 
     def expended_days(self):
         """Определяет количество дней, затраченных на задачу."""
-        status = self.actual_status()
-        if status == self.WAIT_STATUS:
-            expended_days = 0
-        elif status == self.WORK_STATUS:
-            today = datetime.date.today()
-            expended_time = today - self.start_date() + datetime.timedelta(1)
-            expended_days = expended_time.days
-        elif status == self.DONE_STATUS:
-            expended_time = (self.finish_date - self.start_date()
-                             + datetime.timedelta(days=1))
-            expended_days = expended_time.days
-        else:
-            expended_days = None
-        return expended_days
+        return self.timeline().expended_days
 
     def duration(self):
         """Определяет количество дней, выделенных на выполнение задачи."""
-        if self.order == self.FIRST_TASK:
-            duration = self.deadline - self.chain.start_date
+        return self.timeline().duration
+
+    @memoized
+    def worker_label(self):
+        """Возвращает имя и должность исполнителя.
+
+        Подписи исполнителей хранятся в памяти процесса
+        (``todo.caching.worker_labels()``).
+        """
+        return worker_labels([self.worker_id])[self.worker_id]
+
+    def _memo_state(self):
+        """Поля, от которых зависят вычисляемые значения задачи."""
+        return (self.pk, self.chain_id, self.order, self.status,
+                self.deadline, self.finish_date, self.worker_id)
+
+
+# Поля задачи, которые пересчитываются при изменении цепочки и по дате.
+STORED_TIMELINE_FIELDS = ('effective_status', 'effective_start_date',
+                          'forecast_start_date', 'forecast_finish_date')
+
+
+def _prev_task(chain_id, order):
+    """Возвращает ближайшую задачу цепочки перед номером ``order``
+    или None, если ее нет.
+
+    Между номерами задач бывают пропуски: задачу из середины цепочки
+    можно удалить.
+    """
+    tasks = list(Task.objects.filter(chain=chain_id, order__lt=order)
+                 .order_by('-order')[:1])
+    return tasks[0] if tasks else None
+
+
+def set_stored_timeline(task, prev_task, chain_start_date, today,
+                        calendar=None):
+    """Присваивает задаче сохраняемые показатели: фактический статус, дату
+    начала и прогноз дат начала и завершения.
+
+    Предыдущая задача передается с сохраненными показателями. Возвращает
+    True, если показатели изменились.
+    """
+    timeline = task_timeline(task, prev_task, chain_start_date, today,
+                             calendar)
+    forecast = task_forecast(task, timeline, prev_task, today, calendar)
+    values = (timeline.status, timeline.start_date) + forecast
+    changed = False
+    for name, value in zip(STORED_TIMELINE_FIELDS, values):
+        if getattr(task, name) != value:
+            setattr(task, name, value)
+            changed = True
+    return changed
+
+
+def store_timelines(chain, tasks, prev_task=None, today=None,
+                    until_unchanged=True, first_changed=False):
+    """Сохраняет фактические статусы, даты начала и прогноз задач цепочки.
+
+    Задачи обходятся по порядку, начиная с задачи, следующей
+    за ``prev_task``. Если ``until_unchanged`` истинно, обход прекращается
+    на первой задаче, сохраненные показатели которой не изменились:
+    следующие за ней задачи зависят только от ее полей и показателей.
+    Возвращает список обновленных задач. Если ``first_changed`` истинно,
+    в него попадает и первая задача: изменились ее показатели, которые
+    не сохраняются.
+    """
+    if today is None:
+        today = datetime.date.today()
+    calendar = get_calendar()
+    updated = []
+    for index, task in enumerate(tasks):
+        if set_stored_timeline(task, prev_task, chain.start_date, today,
+                               calendar):
+            Task.objects.filter(pk=task.pk).update(**dict(
+                (name, getattr(task, name))
+                for name in STORED_TIMELINE_FIELDS
+            ))
+            updated.append(task)
         else:
-            prev_task = _prev_task(self)
-            duration = self.deadline - prev_task.deadline
-        return duration.days
+            if first_changed and index == 0:
+                updated.append(task)
+            if until_unchanged:
+                break
+        prev_task = task
+    return updated
+
+
+def _annotated_prev_task(task):
+    """Возвращает предыдущую задачу по данным, выбранным подзапросами.
+
+    SQLite возвращает даты из подзапросов строками, поэтому они приводятся
+    к датам полями модели.
+    """
+    get_field = Task._meta.get_field
+    deadline = get_field('deadline').to_python(task.prev_deadline)
+    finish_date = get_field('finish_date').to_python(task.prev_finish_date)
+    return Task(status=task.prev_status, deadline=deadline,
+                finish_date=finish_date)
+
+
+class ChainSummary(models.Model):
+    """Сводка по задачам цепочки.
+
+    Пересчитывается при изменении задач и цепочки, статус -- также командой
+    refresh_task_statuses. Позволяет фильтровать и сортировать цепочки
+    по статусу и дедлайну в SQL.
+    """
+    STATUS_CHOICES = (
+        (Chain.DONE_STATUS, 'done'),
+        (Chain.STOP_STATUS, 'stop'),
+        (Chain.WAIT_STATUS, 'wait'),
+        (Chain.WORK_STATUS, 'work'),
+    )
 
+    chain = models.OneToOneField(Chain, primary_key=True,
+                                 related_name='summary')
+    tasks_count = models.IntegerField(default=0)
+    done_tasks_count = models.IntegerField(default=0)
+    has_stopped_task = models.BooleanField(default=False)
+    last_task_done = models.BooleanField(default=False)
+    # Дедлайн и дата завершения последней задачи.
+    deadline = models.DateField(null=True)
+    finish_date = models.DateField(null=True)
+    # Прогнозируемая дата завершения последней задачи.
+    forecast_finish_date = models.DateField(null=True)
+    status = models.CharField(max_length=4, choices=STATUS_CHOICES,
+                              db_index=True)
 
-def _prev_task(task):
-    """Возвращает предыдущую задачу."""
-    if task.order < Task.FIRST_TASK:
-        raise Task.DoesNotExist
-    order_prev_task = task.order - 1
-    prev_task = Task.objects.get(chain=task.chain, order=order_prev_task)
-    return prev_task
+    def calculate(self, tasks, today):
+        """Рассчитывает сводку по задачам цепочки.
+
+        Задачи передаются кортежами (order, status, deadline, finish_date,
+        forecast_finish_date).
+        """
+        tasks = list(tasks)
+        self.tasks_count = len(tasks)
+        self.done_tasks_count = 0
+        self.has_stopped_task = False
+        for order, status, deadline, finish_date, forecast in tasks:
+            if status == Task.DONE_STATUS:
+                self.done_tasks_count += 1
+            elif status == Task.STOP_STATUS:
+                self.has_stopped_task = True
+        if tasks:
+            # Последняя задача -- задача с самым поздним дедлайном.
+            order, status, deadline, finish_date, forecast = max(
+                tasks, key=lambda task: (task[2], task[0])
+            )
+            self.last_task_done = status == Task.DONE_STATUS
+            self.deadline = deadline
+            self.finish_date = finish_date
+            self.forecast_finish_date = forecast
+        else:
+            self.last_task_done = False
+            self.deadline = None
+            self.finish_date = None
+            self.forecast_finish_date = None
+        if self.chain.start_date > today:
+            self.status = Chain.WAIT_STATUS
+        else:
+            self.status = self.started_status()
+
+    def started_status(self):
+        """Определяет статус цепочки, если дата ее начала наступила."""
+        if self.has_stopped_task:
+            return Chain.STOP_STATUS
+        if self.last_task_done:
+            return Chain.DONE_STATUS
+        return Chain.WORK_STATUS
+
+
+class Change(models.Model):
+    """Запись журнала изменений задач и цепочек.
+
+    Журнал только дополняется, старые записи удаляет команда
+    prune_changes. Запись адресована пользователю, в списках которого
+    изменился объект: исполнителю задачи или владельцу цепочки.
+    Первичный ключ записи возрастает и служит курсором ленты изменений.
+    """
+    TASK_KIND = 'task'
+    CHAIN_KIND = 'chain'
+    KIND_CHOICES = (
+        (TASK_KIND, 'task'),
+        (CHAIN_KIND, 'chain'),
+    )
+
+    # Лента пользователя выбирается по индексу из sql/change.sql.
+    user = models.ForeignKey(User)
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    # Фактический статус объекта после изменения, None -- объект удален.
+    status = models.CharField(max_length=4, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+
+# Названия статусов задач совпадают с названиями статусов цепочек.
+TASK_STATUS_NAMES = {
+    Task.DONE_STATUS: Chain.DONE_STATUS,
+    Task.STOP_STATUS: Chain.STOP_STATUS,
+    Task.WAIT_STATUS: Chain.WAIT_STATUS,
+    Task.WORK_STATUS: Chain.WORK_STATUS,
+}
+
+
+def log_changes(tasks=(), chains=(), deleted=False, removed=()):
+    """Записывает изменения задач и цепочек в журнал одним запросом.
+
+    Статус задачи берется из сохраненного фактического статуса, статус
+    цепочки -- из сводки. ``removed`` -- пары (пользователь, задача или
+    цепочка): объект исчез из списков пользователя и записывается для
+    него как удаленный. Версии списков задач и цепочек адресатов
+    меняются, чтобы ожидающие изменений клиенты получили их сразу.
+    """
+    changes = []
+    for user_id, obj in removed:
+        kind = (Change.TASK_KIND if isinstance(obj, Task)
+                else Change.CHAIN_KIND)
+        changes.append(Change(user_id=user_id, kind=kind, object_id=obj.pk,
+                              status=None))
+    for task in tasks:
+        status = (None if deleted else
+                  TASK_STATUS_NAMES.get(task.effective_status))
+        changes.append(Change(user_id=task.worker_id,
+                              kind=Change.TASK_KIND, object_id=task.pk,
+                              status=status))
+    for chain in chains:
+        status = None if deleted else chain.summary.status
+        changes.append(Change(user_id=chain.owner_id,
+                              kind=Change.CHAIN_KIND, object_id=chain.pk,
+                              status=status))
+    if changes:
+        Change.objects.bulk_create(changes)
+        bump_user_versions(set(change.user_id for change in changes))
+
+
+def log_chain_changes(chain_ids):
+    """Записывает в журнал изменения цепочек, сохраненных в обход
+    ``save()``.
+    """
+    log_changes(chains=Chain.objects.filter(pk__in=chain_ids)
+                .select_related('summary'))
+
+
+class Reminder(models.Model):
+    """Отправленное исполнителю напоминание о задаче.
+
+    Напоминание одного вида отправляется один раз для каждого дедлайна
+    задачи, поэтому повторный запуск send_task_reminders не отправляет
+    напоминания снова, а перенос дедлайна -- отправляет.
+    """
+    STARTED_KIND = 'started'
+    DUE_KIND = 'due'
+    OVERDUE_KIND = 'overdue'
+    KIND_CHOICES = (
+        (STARTED_KIND, 'started'),
+        (DUE_KIND, 'due'),
+        (OVERDUE_KIND, 'overdue'),
+    )
+
+    task = models.ForeignKey(Task)
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    deadline = models.DateField()
+    sent = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('task', 'kind', 'deadline')
 
 
 class StaffProfile(models.Model):
     """Профиль сотрудника."""
-    user = models.ForeignKey(User, unique=True)
+    user = models.OneToOneField(User, related_name='staff_profile')
 
     post = models.TextField(max_length=45)
 
@@ -288,3 +763,101 @@ class StaffProfile(models.Model):
         full_name = self.user.get_full_name()
         return u"{post} {full_name}".format(full_name=full_name,
                                             post=self.post)
+
+
+def bump_chain_users(chain_ids, user_ids=(), workers=True):
+    """Отмечает изменение цепочек для их владельцев, исполнителей задач
+    и пользователей ``user_ids``.
+
+    Статусы задач зависят от предыдущих задач цепочки, поэтому изменение
+    задачи меняет списки задач всех исполнителей цепочки.
+    """
+    user_ids = set(user_ids)
+    user_ids.update(Chain.objects.filter(pk__in=chain_ids).values_list(
+        'owner', flat=True))
+    if workers:
+        user_ids.update(Task.objects.filter(chain__in=chain_ids).values_list(
+            'worker', flat=True))
+    bump_user_versions(user_ids)
+
+
+@receiver(post_save, sender=Chain)
+def _chain_saved(sender, instance, **kwargs):
+    bump_chain_versions([instance.pk])
+    bump_chain_users([instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def _task_deleted(sender, instance, **kwargs):
+    bump_chain_versions([instance.chain_id])
+    log_changes([instance], deleted=True)
+    try:
+        chain = Chain.objects.get(pk=instance.chain_id)
+    except Chain.DoesNotExist:
+        # Задача удалена вместе с цепочкой.
+        return
+    # Следующие задачи теперь зависят от задачи перед удаленной.
+    following_tasks = chain.task_set.filter(
+        order__gt=instance.order
+    ).order_by('order')
+    updated = store_timelines(chain, following_tasks.iterator(),
+                              prev_task=_prev_task(chain.pk, instance.order),
+                              first_changed=True)
+    chain.refresh_summary()
+    log_changes(updated, [chain])
+
+
+@receiver(post_delete, sender=Chain)
+def _chain_deleted(sender, instance, **kwargs):
+    log_changes(chains=[instance], deleted=True)
+
+
+@receiver(post_init, sender=Task)
+def _task_loaded(sender, instance, **kwargs):
+    # Прежние исполнитель и дедлайн нужны при сохранении задачи.
+    saved = instance.pk is not None
+    instance._todo_saved_worker_id = instance.worker_id if saved else None
+    instance._todo_saved_deadline = instance.deadline if saved else None
+
+
+@receiver(post_init, sender=Chain)
+def _chain_loaded(sender, instance, **kwargs):
+    # Прежний владелец нужен при сохранении цепочки.
+    instance._todo_saved_owner_id = (instance.owner_id
+                                     if instance.pk is not None else None)
+
+
+def _worker_label_state(sender, instance):
+    """Поля, из которых складывается подпись исполнителя."""
+    if sender is User:
+        return (instance.first_name, instance.last_name)
+    return (instance.post,)
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=StaffProfile)
+def _worker_loaded(sender, instance, **kwargs):
+    instance._todo_label_state = _worker_label_state(sender, instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=StaffProfile)
+def _worker_saved(sender, instance, created, **kwargs):
+    # Пользователь сохраняется и при каждом входе, поэтому подпись
+    # сбрасывается, только если изменились имя или должность. У нового
+    # пользователя еще нет задач.
+    state = _worker_label_state(sender, instance)
+    if state == instance._todo_label_state and not created:
+        return
+    instance._todo_label_state = state
+    if created and sender is User:
+        return
+    # Имя и должность исполнителя отображаются в цепочках его задач.
+    user_id = instance.pk if sender is User else instance.user_id
+    forget_worker_label(user_id)
+    chain_ids = list(Task.objects.filter(worker=user_id).values_list(
+        'chain', flat=True
+    ).distinct())
+    bump_chain_versions(chain_ids)
+    # Имя пользователя отображается на его страницах.
+    bump_chain_users(chain_ids, [user_id], workers=False)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Постраничный вывод по курсору.
+
+Страница выбирается условием на значение поля сортировки и первичного ключа
+последнего объекта предыдущей страницы, а не смещением. Поэтому стоимость
+выборки любой страницы одинакова, если по полю сортировки есть индекс.
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+PER_PAGE = 50
+
+
+class KeysetPage(object):
+    """Страница выборки."""
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        # Курсор следующей страницы или None, если страница последняя.
+        self.next_cursor = next_cursor
+
+
+def keyset_page(queryset, field_name, cursor=None, per_page=PER_PAGE,
+                descending=True):
+    """Возвращает страницу выборки, следующую за курсором.
+
+    Выборка сортируется по полю даты и первичному ключу, по умолчанию
+    по убыванию. Курсор -- пара (дата, первичный ключ) последнего объекта
+    предыдущей страницы.
+    """
+    queryset = keyset_filter(queryset, field_name, cursor, descending)
+    return make_page(list(queryset[:per_page + 1]), field_name, per_page)
+
+
+def make_page(object_list, field_name, per_page=PER_PAGE):
+    """Возвращает страницу из объектов, выбранных после курсора.
+
+    Объектов должно быть выбрано на один больше размера страницы, чтобы
+    определить, есть ли следующая страница.
+    """
+    next_cursor = None
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        last = object_list[-1]
+        next_cursor = format_cursor(getattr(last, field_name), last.pk)
+    return KeysetPage(object_list, next_cursor)
+
+
+def keyset_filter(queryset, field_name, cursor=None, descending=True):
+    """Упорядочивает выборку по полю и первичному ключу и выбирает объекты,
+    следующие за курсором.
+    """
+    if descending:
+        queryset = queryset.order_by('-' + field_name, '-pk')
+        lookup, strict_lookup = '__lte', '__lt'
+    else:
+        queryset = queryset.order_by(field_name, 'pk')
+        lookup, strict_lookup = '__gte', '__gt'
+    if cursor is not None:
+        value, pk = cursor
+        # Первое условие ограничивает диапазон индекса по полю сортировки.
+        queryset = queryset.filter(
+            Q(**{field_name + lookup: value}),
+            Q(**{field_name + strict_lookup: value}) |
+            Q(**{'pk' + strict_lookup: pk})
+        )
+    return queryset
+
+
+def format_cursor(value, pk):
+    """Возвращает строковое представление курсора."""
+    return u'{value}.{pk}'.format(value=value.isoformat(), pk=pk)
+
+
+def parse_cursor(cursor):
+    """Разбирает строковое представление курсора.
+
+    Возвращает None, если курсор некорректен.
+    """
+    value, _, pk = cursor.partition('.')
+    try:
+        value = parse_date(value)
+    except ValueError:
+        return None
+    if value is None or not pk.isdigit():
+        return None
+    return value, int(pk)
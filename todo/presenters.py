@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Объекты представления для списков задач и цепочек.
+
+Шаблоны списков получают не модели, а компактные объекты с рассчитанными
+заранее показателями. Объекты строятся пачкой: задачи выбираются только
+нужными столбцами, показатели рассчитываются за один проход без запросов
+к базе. Имена атрибутов совпадают с именами методов моделей, поэтому
+шаблоны обращаются к ним так же.
+"""
+import datetime
+
+from django.core.urlresolvers import reverse
+
+from todo.caching import worker_labels
+from todo.calendars import get_calendar
+from todo.models import Chain, Task
+from todo.profiling import timed
+from todo.timeline import days_before_deadline, task_timeline
+from todo.utils import set_memoized
+
+# Ширина одного дня задачи в таблице цепочки, px.
+BAR_DAY_WIDTH = 30
+
+
+class TaskRow(object):
+    """Задача в списке задач или в таблице цепочки."""
+    __slots__ = (
+        'pk',
+        'task',
+        'status',
+        'deadline',
+        'finish_date',
+        'actual_status',
+        'start_date',
+        'days_to_start',
+        'remaining_days',
+        'days_quantity_after_deadline',
+        'expended_days',
+        'duration',
+        'bar_width',
+        'worker_label',
+    )
+    DONE_STATUS = Task.DONE_STATUS
+    STOP_STATUS = Task.STOP_STATUS
+    WAIT_STATUS = Task.WAIT_STATUS
+    WORK_STATUS = Task.WORK_STATUS
+
+    def __init__(self, pk, task, status, deadline, finish_date,
+                 worker_label=None):
+        self.pk = pk
+        self.task = task
+        self.status = status
+        self.deadline = deadline
+        self.finish_date = finish_date
+        self.worker_label = worker_label
+
+    def be_in_time(self):
+        return self.days_quantity_after_deadline is None
+
+    def get_absolute_url(self):
+        return reverse('todo_task_detail', kwargs={'task_id': self.pk})
+
+    def calculate(self, prev_task, chain_start_date, today, calendar):
+        """Рассчитывает показатели задачи по предыдущей задаче."""
+        timeline = task_timeline(self, prev_task, chain_start_date, today,
+                                 calendar)
+        self.actual_status = timeline.status
+        self.start_date = timeline.start_date
+        self.days_to_start = timeline.days_to_start
+        self.days_quantity_after_deadline = (
+            timeline.days_quantity_after_deadline)
+        self.expended_days = timeline.expended_days
+        self.duration = timeline.duration
+        self.bar_width = timeline.duration * BAR_DAY_WIDTH
+        self.remaining_days = days_before_deadline(self.deadline, today,
+                                                   calendar)
+
+
+class ChainRow(object):
+    """Цепочка в списке цепочек.
+
+    Задачи цепочек подгружаются при первом обращении к задачам любой
+    из цепочек списка, поэтому их не нужно выбирать, если таблица цепочки
+    взята из кэша.
+    """
+    __slots__ = (
+        'pk',
+        'name',
+        'start_date',
+        'actual_status',
+        'days_to_start',
+        'remaining_days',
+        'days_quantity_after_deadline',
+        'expended_days',
+        'deadline',
+        'finish_date',
+        'forecast_finish_date',
+        'forecast_slip',
+        'cache_version',
+        '_batch',
+        '_timeline',
+    )
+    DONE_STATUS = Chain.DONE_STATUS
+    STOP_STATUS = Chain.STOP_STATUS
+    WAIT_STATUS = Chain.WAIT_STATUS
+    WORK_STATUS = Chain.WORK_STATUS
+
+    def be_in_time(self):
+        return self.days_quantity_after_deadline is None
+
+    def timeline(self):
+        """Возвращает задачи цепочки с рассчитанными показателями."""
+        self._batch.load()
+        return self._timeline
+
+
+class _PrevTask(object):
+    """Предыдущая задача, выбранная подзапросами."""
+    __slots__ = ('status', 'deadline', 'finish_date')
+
+    def __init__(self, status, deadline, finish_date):
+        self.status = status
+        self.deadline = deadline
+        self.finish_date = finish_date
+
+
+@timed('presenters.task_rows')
+def task_rows(queryset, today=None, limit=None):
+    """Возвращает задачи выборки для списка задач.
+
+    Задачи и данные их предыдущих задач выбираются одним запросом.
+    """
+    return list(iter_task_rows(queryset, today, limit))
+
+
+def iter_task_rows(queryset, today=None, limit=None):
+    """Возвращает задачи выборки для списка задач по одной.
+
+    ``limit`` ограничивает количество выбираемых задач.
+    """
+    today = today or datetime.date.today()
+    calendar = get_calendar()
+    to_date = Task._meta.get_field('deadline').to_python
+    fields = ('pk', 'task', 'status', 'deadline', 'finish_date', 'order',
+              'chain__start_date', 'prev_status', 'prev_deadline',
+              'prev_finish_date')
+    queryset = queryset.with_timeline()
+    if limit is not None:
+        queryset = queryset[:limit]
+    for (pk, text, status, deadline, finish_date, order, chain_start_date,
+         prev_status, prev_deadline, prev_finish_date) in (
+            queryset.values_list(*fields).iterator()):
+        # Дедлайн задачи обязателен, поэтому его нет, только если
+        # предыдущей задачи нет: например, она удалена.
+        if order == Task.FIRST_TASK or prev_deadline is None:
+            prev_task = None
+        else:
+            # SQLite возвращает даты из подзапросов строками.
+            prev_task = _PrevTask(prev_status, to_date(prev_deadline),
+                                  to_date(prev_finish_date))
+        row = TaskRow(pk, text, status, deadline, finish_date)
+        row.calculate(prev_task, chain_start_date, today, calendar)
+        yield row
+
+
+@timed('presenters.chain_rows')
+def chain_rows(chains, today=None):
+    """Возвращает цепочки для списка цепочек.
+
+    Цепочки должны быть выбраны вместе со сводкой
+    (``ChainQuerySet.with_summary()``), тогда их показатели рассчитываются
+    без запросов к задачам.
+    """
+    today = today or datetime.date.today()
+    rows = []
+    batch = _TaskRowsBatch(rows, today)
+    for chain in chains:
+        set_memoized(chain, 'today', today)
+        row = ChainRow()
+        row.pk = chain.pk
+        row.name = chain.name
+        row.start_date = chain.start_date
+        row.actual_status = chain.actual_status()
+        row.days_to_start = chain.days_to_start()
+        row.remaining_days = chain.remaining_days()
+        row.days_quantity_after_deadline = (
+            chain.days_quantity_after_deadline())
+        row.expended_days = chain.expended_days()
+        row.deadline = chain.deadline()
+        row.finish_date = chain.finish_date()
+        row.forecast_finish_date = chain.forecast_finish_date()
+        row.forecast_slip = chain.forecast_slip()
+        row.cache_version = chain.cache_version()
+        row._batch = batch
+        rows.append(row)
+    return rows
+
+
+def iter_chain_rows(chains, today=None, batch_size=100):
+    """Возвращает цепочки для списка цепочек по одной.
+
+    Задачи подгружаются пачками по ``batch_size`` цепочек, поэтому
+    в памяти не хранятся задачи всех цепочек выборки.
+    """
+    batch = []
+    for chain in chains:
+        batch.append(chain)
+        if len(batch) == batch_size:
+            for row in chain_rows(batch, today):
+                yield row
+            batch = []
+    for row in chain_rows(batch, today):
+        yield row
+
+
+class _TaskRowsBatch(object):
+    """Подгружает задачи сразу для всех цепочек списка."""
+    def __init__(self, chain_rows, today):
+        self.chain_rows = chain_rows
+        self.today = today
+        self.loaded = False
+
+    def load(self):
+        if not self.loaded:
+            self.loaded = True
+            self._load()
+
+    @timed('presenters.chain_timelines')
+    def _load(self):
+        tasks_by_chain = dict((row.pk, []) for row in self.chain_rows)
+        tasks = (Task.objects.filter(chain__in=tasks_by_chain.keys())
+                 .order_by('chain', 'order')
+                 .values_list('pk', 'task', 'status', 'deadline',
+                              'finish_date', 'chain', 'worker'))
+        tasks = list(tasks.iterator())
+        labels = worker_labels(values[-1] for values in tasks)
+        for (pk, text, status, deadline, finish_date, chain_id,
+             worker_id) in tasks:
+            tasks_by_chain[chain_id].append(TaskRow(
+                pk, text, status, deadline, finish_date, labels[worker_id]
+            ))
+        calendar = get_calendar()
+        for row in self.chain_rows:
+            prev_task = None
+            for task in tasks_by_chain[row.pk]:
+                task.calculate(prev_task, row.start_date, self.today,
+                               calendar)
+                prev_task = task
+            row._timeline = tasks_by_chain[row.pk]
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Профилирование запросов.
+
+Профиль запроса хранится в потоке, который обрабатывает запрос. Пока
+профиль активен, вычисляемые методы моделей (``todo.utils.memoized``)
+и функции, отмеченные ``timed()``, записывают в него время своего
+выполнения, а ProfilingMiddleware -- запросы к базе и время отрисовки
+шаблона.
+"""
+import re
+import threading
+import time
+from functools import wraps
+
+_local = threading.local()
+
+# Значения в SQL заменяются на ?, чтобы одинаковые по форме запросы
+# с разными параметрами попали в одну группу.
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+class Profile(object):
+    """Показатели одного запроса."""
+    def __init__(self):
+        self.started = time.time()
+        self.queries = []
+        # Суммарное время и количество вычислений методов моделей.
+        self.methods = {}
+        self.render_time = 0.0
+
+    def add_method(self, name, elapsed):
+        """Добавляет время вычисления метода модели.
+
+        Время вложенных вызовов входит во время вызывающего метода.
+        """
+        total, calls = self.methods.get(name, (0.0, 0))
+        self.methods[name] = (total + elapsed, calls + 1)
+
+    def db_time(self):
+        """Возвращает суммарное время запросов к базе в секундах."""
+        return sum(float(query['time']) for query in self.queries)
+
+    def duplicates(self):
+        """Возвращает повторяющиеся по форме запросы.
+
+        Возвращает список (форма запроса, количество), упорядоченный
+        по убыванию количества.
+        """
+        counts = {}
+        for query in self.queries:
+            shape = sql_shape(query['sql'])
+            counts[shape] = counts.get(shape, 0) + 1
+        duplicates = [(shape, count) for shape, count in counts.items()
+                      if count > 1]
+        duplicates.sort(key=lambda item: (-item[1], item[0]))
+        return duplicates
+
+
+def sql_shape(sql):
+    """Возвращает форму SQL-запроса без значений параметров."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_RE.sub('(...)', sql)
+
+
+def start():
+    """Начинает профилирование в текущем потоке."""
+    _local.profile = Profile()
+    return _local.profile
+
+
+def stop():
+    """Завершает профилирование и возвращает профиль."""
+    profile = current()
+    _local.profile = None
+    return profile
+
+
+def current():
+    """Возвращает активный профиль или None."""
+    return getattr(_local, 'profile', None)
+
+
+def timed(name):
+    """Записывает время выполнения функции в активный профиль под именем
+    ``name``.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = current()
+            if profile is None:
+                return function(*args, **kwargs)
+            started = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add_method(name, time.time() - started)
+        return wrapper
+    return decorator
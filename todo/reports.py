@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Отчеты о соблюдении сроков по истории задач.
+
+Задачи выгружаются в столбцы NumPy, показатели всех задач рассчитываются
+операциями над столбцами по тем же правилам, что и в ``todo.timeline``.
+Отсутствующее значение показателя (None у методов модели) -- NaN.
+Дни считаются по рабочему календарю (``todo.calendars``) функцией
+``numpy.busday_count()``.
+
+Требует NumPy, который не входит в зависимости приложения.
+"""
+import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from todo.calendars import get_calendar
+from todo.models import Task
+
+# Процентили распределений затраченных и выделенных дней.
+PERCENTILES = (50, 90)
+
+
+def load_tasks(queryset):
+    """Выгружает задачи в столбцы.
+
+    Возвращает словарь массивов: chain, order, worker, owner, status,
+    deadline, finish_date и chain_start_date. Задачи упорядочены
+    по цепочке и порядковому номеру. Показатели задачи зависят
+    от предыдущей задачи, поэтому выборка должна содержать все задачи
+    выбранных цепочек.
+    """
+    _require_numpy()
+    fields = ('chain', 'order', 'worker', 'chain__owner', 'status',
+              'deadline', 'finish_date', 'chain__start_date')
+    names = ('chain', 'order', 'worker', 'owner', 'status', 'deadline',
+             'finish_date', 'chain_start_date')
+    rows = (queryset.order_by('chain', 'order').values_list(*fields)
+            .iterator())
+    values = [[] for name in names]
+    for row in rows:
+        for column, value in zip(values, row):
+            column.append(value)
+    columns = {}
+    for name, column in zip(names, values):
+        if name in ('deadline', 'finish_date', 'chain_start_date'):
+            columns[name] = numpy.array(column, dtype='datetime64[D]')
+        else:
+            columns[name] = numpy.array(column, dtype=numpy.int64)
+    return columns
+
+
+def task_timelines(columns, today=None, calendar=None):
+    """Рассчитывает показатели задач по столбцам ``load_tasks()``.
+
+    Возвращает словарь массивов: status, start_date, duration,
+    days_quantity_after_deadline и expended_days. Значения совпадают
+    с одноименными методами модели ``Task``.
+    """
+    _require_numpy()
+    calendar = calendar or get_calendar()
+    today = numpy.datetime64(today or datetime.date.today(), 'D')
+    one_day = numpy.timedelta64(1, 'D')
+    nat = numpy.datetime64('NaT', 'D')
+    chain = columns['chain']
+    status = columns['status']
+    deadline = columns['deadline']
+    finish_date = columns['finish_date']
+    chain_start_date = columns['chain_start_date']
+
+    # Предыдущая задача -- предыдущая строка той же цепочки: между
+    # номерами задач бывают пропуски, задачу из середины цепочки можно
+    # удалить. Первая строка цепочки -- первая задача.
+    first = chain != numpy.roll(chain, 1)
+    if len(first):
+        first[0] = True
+    prev_status = numpy.roll(status, 1)
+    prev_deadline = numpy.roll(deadline, 1)
+    prev_finish_date = numpy.roll(finish_date, 1)
+
+    # Фактический статус.
+    actual_status = numpy.where(
+        first,
+        numpy.where(chain_start_date > today, Task.WAIT_STATUS,
+                    Task.WORK_STATUS),
+        numpy.where(prev_status == Task.DONE_STATUS, Task.WORK_STATUS,
+                    Task.WAIT_STATUS)
+    )
+    finished = (status == Task.DONE_STATUS) | (status == Task.STOP_STATUS)
+    actual_status = numpy.where(finished, status, actual_status)
+    wait = actual_status == Task.WAIT_STATUS
+    work = actual_status == Task.WORK_STATUS
+    done = actual_status == Task.DONE_STATUS
+
+    # Дата начала.
+    start_date = numpy.where(
+        wait,
+        numpy.where(prev_deadline > today, prev_deadline, nat),
+        prev_finish_date + one_day
+    )
+    start_date = numpy.where(first, chain_start_date, start_date)
+
+    # Количество выделенных дней.
+    duration = _count(calendar,
+                      numpy.where(first, chain_start_date, prev_deadline),
+                      deadline)
+
+    # Количество просроченных дней.
+    after_deadline = _count(
+        calendar, deadline,
+        numpy.where(done, finish_date + one_day, today + one_day)
+    )
+    overdue = numpy.where(done, finish_date >= deadline, today >= deadline)
+    after_deadline[~overdue] = numpy.nan
+
+    # Количество затраченных дней.
+    expended_days = _count(
+        calendar, start_date,
+        numpy.where(work, today + one_day, finish_date + one_day)
+    )
+    expended_days[~(work | done)] = numpy.nan
+    expended_days[wait] = 0
+
+    return {
+        'status': actual_status,
+        'start_date': start_date,
+        'duration': duration,
+        'days_quantity_after_deadline': after_deadline,
+        'expended_days': expended_days,
+    }
+
+
+def on_time_report(columns, timelines, by='worker'):
+    """Возвращает показатели соблюдения сроков по исполнителям
+    или владельцам цепочек.
+
+    ``by`` -- 'worker' или 'owner'. Возвращает словарь {id: показатели}:
+    количество задач, доля задач без просрочки, среднее количество
+    просроченных дней у просроченных задач, среднее и процентили
+    затраченных и выделенных дней.
+    """
+    _require_numpy()
+    keys, groups = numpy.unique(columns[by], return_inverse=True)
+    count = numpy.bincount(groups, minlength=len(keys))
+    after_deadline = timelines['days_quantity_after_deadline']
+    overdue = ~numpy.isnan(after_deadline)
+    overdue_count = numpy.bincount(groups, weights=overdue,
+                                   minlength=len(keys))
+    overdue_days = numpy.bincount(groups,
+                                  weights=numpy.nan_to_num(after_deadline),
+                                  minlength=len(keys))
+    expended_days = _group_stats(groups, len(keys),
+                                 timelines['expended_days'])
+    duration = _group_stats(groups, len(keys), timelines['duration'])
+
+    report = {}
+    for index, key in enumerate(keys):
+        report[int(key)] = {
+            'tasks': int(count[index]),
+            'on_time_rate': float(1 - overdue_count[index] / count[index]),
+            'average_overdue_days': (
+                float(overdue_days[index] / overdue_count[index])
+                if overdue_count[index] else None),
+            'expended_days': expended_days[index],
+            'duration': duration[index],
+        }
+    return report
+
+
+def _group_stats(groups, groups_count, values):
+    """Возвращает среднее и процентили значений каждой группы.
+
+    Значения -- целые количества дней, отсутствующие значения
+    не учитываются. Процентили интерполируются линейно, как
+    в ``numpy.percentile()``.
+    """
+    known = ~numpy.isnan(values)
+    groups = groups[known]
+    values = values[known]
+    sums = numpy.bincount(groups, weights=values, minlength=groups_count)
+    # Значения упорядочиваются по группе, внутри группы -- по величине.
+    # Сортировка по одному целочисленному ключу быстрее, чем lexsort().
+    if len(values):
+        shift = values.min()
+        span = int(values.max() - shift) + 1
+        key = groups.astype(numpy.int64) * span + (values - shift).astype(
+            numpy.int64)
+        ordering = numpy.argsort(key)
+        groups = groups[ordering]
+        values = values[ordering]
+    bounds = numpy.searchsorted(groups, numpy.arange(groups_count + 1))
+    starts = bounds[:-1]
+    sizes = numpy.diff(bounds)
+    nonempty = sizes > 0
+    columns = {'mean': sums / numpy.maximum(sizes, 1)}
+    for percent in PERCENTILES:
+        position = starts + (numpy.maximum(sizes, 1) - 1) * percent / 100.0
+        lower = numpy.floor(position).astype(numpy.int64)
+        upper = numpy.ceil(position).astype(numpy.int64)
+        lower = numpy.where(nonempty, lower, 0)
+        upper = numpy.where(nonempty, upper, 0)
+        if len(values):
+            columns['p{0}'.format(percent)] = (
+                values[lower] +
+                (values[upper] - values[lower]) * (position - lower)
+            )
+    stats = []
+    for index in range(groups_count):
+        if not nonempty[index]:
+            stats.append(None)
+            continue
+        stats.append(dict((name, float(column[index]))
+                          for name, column in columns.items()))
+    return stats
+
+
+def _count(calendar, begins, ends):
+    """Считает рабочие дни в интервалах [begins; ends), NaT -- NaN."""
+    missing = _isnat(begins) | _isnat(ends)
+    epoch = numpy.datetime64('1970-01-01', 'D')
+    counts = calendar.count_array(
+        numpy.where(missing, epoch, begins),
+        numpy.where(missing, epoch, ends)
+    ).astype(numpy.float64)
+    counts[missing] = numpy.nan
+    return counts
+
+
+def _isnat(dates):
+    """Определяет, какие даты отсутствуют.
+
+    numpy.isnat() есть только в NumPy 1.13, NaT хранится как наименьшее
+    64-битное целое.
+    """
+    return dates.view(numpy.int64) == numpy.iinfo(numpy.int64).min
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImproperlyConfigured('todo.reports requires NumPy.')
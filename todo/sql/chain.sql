@@ -0,0 +1,3 @@
+-- Цепочки владельца: ChainQuerySet.by_owner().actual().
+CREATE INDEX todo_chain_owner_id_archive_start_date
+    ON todo_chain (owner_id, archive, start_date);
@@ -0,0 +1,4 @@
+-- Цепочки с дедлайном в заданном интервале: ChainQuerySet.overdue(),
+-- ChainQuerySet.due_within().
+CREATE INDEX todo_chainsummary_last_task_done_deadline
+    ON todo_chainsummary (last_task_done, deadline);
@@ -0,0 +1,3 @@
+-- Лента изменений пользователя: todo.api.changes.
+CREATE INDEX todo_change_user_id_id
+    ON todo_change (user_id, id);
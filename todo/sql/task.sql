@@ -0,0 +1,20 @@
+-- Задачи исполнителя: TaskQuerySet.by_worker().actual().
+CREATE INDEX todo_task_worker_id_archive_deadline
+    ON todo_task (worker_id, archive, deadline);
+-- Последняя задача цепочки: Chain.last_task().
+CREATE INDEX todo_task_chain_id_deadline_order
+    ON todo_task (chain_id, deadline, "order");
+-- Задачи исполнителя в заданном статусе: TaskQuerySet.by_status().
+CREATE INDEX todo_task_worker_id_effective_status
+    ON todo_task (worker_id, effective_status);
+-- Задачи, у которых наступила дата начала: refresh_task_statuses.
+CREATE INDEX todo_task_effective_status_effective_start_date
+    ON todo_task (effective_status, effective_start_date);
+-- Незавершенные задачи с дедлайном в заданном интервале:
+-- TaskQuerySet.actual().overdue(done=False), TaskQuerySet.due_within().
+CREATE INDEX todo_task_archive_deadline
+    ON todo_task (archive, deadline);
+-- Задачи в работе, не завершенные к прогнозируемой дате:
+-- refresh_task_statuses.
+CREATE INDEX todo_task_effective_status_forecast_finish_date
+    ON todo_task (effective_status, forecast_finish_date);
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Расчет временной шкалы цепочки задач.
+
+Показатели задачи (фактический статус, дата начала, количество выделенных,
+затраченных и просроченных дней) зависят только от самой задачи,
+от предыдущей задачи в цепочке и от даты начала цепочки. Поэтому показатели
+всех задач цепочки рассчитываются за один проход по задачам, упорядоченным
+по порядковому номеру. Количество дней считается по рабочему календарю
+(``todo.calendars``).
+"""
+import datetime
+
+from todo.calendars import get_calendar
+from todo.utils import set_memoized
+
+
+class TaskTimeline(object):
+    """Рассчитанные показатели задачи."""
+    __slots__ = (
+        'status',
+        'start_date',
+        'duration',
+        'days_to_start',
+        'days_quantity_after_deadline',
+        'expended_days',
+    )
+
+
+def task_timeline(task, prev_task, chain_start_date, today, calendar=None):
+    """Рассчитывает показатели задачи.
+
+    Предыдущая задача передается как объект с атрибутами ``status``,
+    ``deadline`` и ``finish_date``. У первой задачи цепочки предыдущей задачи
+    нет, вместо нее передается None.
+    """
+    calendar = calendar or get_calendar()
+    one_day = datetime.timedelta(days=1)
+    timeline = TaskTimeline()
+
+    # Фактический статус.
+    if task.status in (task.DONE_STATUS, task.STOP_STATUS):
+        status = task.status
+    elif prev_task is None:
+        if chain_start_date > today:
+            status = task.WAIT_STATUS
+        else:
+            status = task.WORK_STATUS
+    elif prev_task.status == task.DONE_STATUS:
+        status = task.WORK_STATUS
+    else:
+        status = task.WAIT_STATUS
+    timeline.status = status
+
+    # Дата начала. Для первой задачи равна дате начала работы над цепочкой.
+    # Для статуса WAIT равна дедлайну предыдущей задачи. Если дедлайн
+    # просрочен, дата начала задачи не прогнозируема.
+    # Для статусов WORK, DONE, STOP равна следующей дате, после окончания
+    # предыдущей задачи.
+    if prev_task is None:
+        start_date = chain_start_date
+    elif status == task.WAIT_STATUS:
+        if prev_task.deadline > today:
+            start_date = prev_task.deadline
+        else:
+            start_date = None
+    elif prev_task.finish_date is not None:
+        start_date = prev_task.finish_date + one_day
+    else:
+        start_date = None
+    timeline.start_date = start_date
+
+    # Количество дней, выделенных на выполнение задачи.
+    if prev_task is None:
+        timeline.duration = calendar.count(chain_start_date, task.deadline)
+    else:
+        timeline.duration = calendar.count(prev_task.deadline, task.deadline)
+
+    # Количество дней, оставшихся до начала работы над задачей.
+    if start_date is not None and start_date > today:
+        timeline.days_to_start = calendar.count(today + one_day, start_date)
+    else:
+        timeline.days_to_start = None
+
+    timeline.days_quantity_after_deadline = days_after_deadline(
+        status == task.DONE_STATUS, task.deadline, task.finish_date, today,
+        calendar
+    )
+
+    # Количество дней, затраченных на задачу.
+    if status == task.WAIT_STATUS:
+        expended_days = 0
+    elif start_date is None:
+        expended_days = None
+    elif status == task.WORK_STATUS:
+        expended_days = calendar.count(start_date, today + one_day)
+    elif status == task.DONE_STATUS and task.finish_date is not None:
+        expended_days = calendar.count(start_date,
+                                       task.finish_date + one_day)
+    else:
+        expended_days = None
+    timeline.expended_days = expended_days
+
+    return timeline
+
+
+def task_forecast(task, timeline, prev_task, today, calendar=None):
+    """Прогнозирует даты начала и завершения задачи.
+
+    Незавершенная задача начинается на следующий день после
+    прогнозируемого завершения предыдущей задачи, выполняется
+    за выделенное количество дней и завершается не раньше сегодняшнего
+    дня. Предыдущая задача передается с прогнозом ``forecast_finish_date``.
+    Возвращает (дата начала, дата завершения) или (None, None), если
+    прогноз невозможен: цепочка остановлена или дата начала неизвестна,
+    например, предыдущая задача завершена без даты завершения.
+    """
+    status = timeline.status
+    if status == task.STOP_STATUS:
+        return None, None
+    if status == task.DONE_STATUS:
+        return timeline.start_date, task.finish_date
+    if status == task.WORK_STATUS or prev_task is None:
+        start_date = timeline.start_date
+    elif prev_task.forecast_finish_date is not None:
+        start_date = prev_task.forecast_finish_date + datetime.timedelta(1)
+    else:
+        return None, None
+    if start_date is None:
+        return None, None
+    calendar = calendar or get_calendar()
+    # Задача выполняется хотя бы один день.
+    end = calendar.shift(start_date, max(timeline.duration, 1))
+    finish_date = max(end - datetime.timedelta(days=1), today)
+    return start_date, finish_date
+
+
+def forecast_slip(deadline, forecast_finish_date, calendar=None):
+    """Определяет, на сколько дней прогноз завершения опаздывает
+    к дедлайну.
+
+    Считается так же, как количество просроченных дней. Ноль или
+    отрицательное значение -- прогноз укладывается в срок.
+    """
+    calendar = calendar or get_calendar()
+    return calendar.count(deadline,
+                          forecast_finish_date + datetime.timedelta(days=1))
+
+
+def days_before_deadline(deadline, today, calendar=None):
+    """Определяет количество полных дней, оставшихся до дедлайна."""
+    if today < deadline:
+        calendar = calendar or get_calendar()
+        return calendar.count(today + datetime.timedelta(days=1), deadline)
+    return None
+
+
+def days_after_deadline(done, deadline, finish_date, today, calendar=None):
+    """Определяет количество дней, на которые просрочен дедлайн."""
+    calendar = calendar or get_calendar()
+    one_day = datetime.timedelta(days=1)
+    if done:
+        # Задача завершена с превышением дедлайна.
+        if finish_date is not None and finish_date >= deadline:
+            return calendar.count(deadline, finish_date + one_day)
+    # Задача со статусом WAIT/WORK/STOP превысила дедлайн.
+    elif today >= deadline:
+        return calendar.count(deadline, today + one_day)
+    return None
+
+
+def chain_timeline(chain, tasks, today):
+    """Рассчитывает показатели задач цепочки за один проход.
+
+    Задачи должны быть упорядочены по порядковому номеру. Показатели
+    кэшируются в задачах и используются методами модели ``Task``
+    вместо запросов к предыдущей задаче.
+    """
+    calendar = get_calendar()
+    prev_task = None
+    for task in tasks:
+        set_memoized(task, 'today', today)
+        set_memoized(task, 'timeline', task_timeline(
+            task, prev_task, chain.start_date, today, calendar
+        ))
+        prev_task = task
+    return tasks
@@ -7,4 +7,18 @@ urlpatterns = patterns('todo.views',
 
     url(r'^chain/$', 'actual_chains', name='todo_actual_chains'),
     url(r'^chain/archive/$', 'chain_archive', name='todo_chain_archive'),
+
+    url(r'^dashboard/$', 'dashboard', name='todo_dashboard'),
+)
+
+urlpatterns += patterns('todo.api',
+    url(r'^api/tasks/$', 'tasks', name='todo_api_tasks'),
+    url(r'^api/tasks/archive/$', 'task_archive',
+        name='todo_api_task_archive'),
+
+    url(r'^api/chains/$', 'chains', name='todo_api_chains'),
+    url(r'^api/chains/archive/$', 'chain_archive',
+        name='todo_api_chain_archive'),
+
+    url(r'^api/changes/$', 'changes', name='todo_api_changes'),
 )
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import datetime
+import threading
+import time
+from functools import wraps
+
+from django.db import transaction
+
+from todo import profiling
+
+
+def memoized(method):
+    """Кэширует результат метода модели без аргументов.
+
+    Кэш хранится в экземпляре модели и сбрасывается при сохранении модели
+    (``reset_memoized()``) и при изменении полей, от которых зависят
+    вычисляемые значения (``_memo_state()``). Если запрос профилируется,
+    время вычисления записывается в профиль.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self):
+        memo = _memo(self)
+        if name not in memo:
+            profile = profiling.current()
+            if profile is None:
+                memo[name] = method(self)
+            else:
+                started = time.time()
+                memo[name] = method(self)
+                profile.add_method(
+                    '{0}.{1}'.format(type(self).__name__, name),
+                    time.time() - started
+                )
+        return memo[name]
+    return wrapper
+
+
+def commit_on_success_unless_managed(func):
+    """Выполняет функцию в транзакции, если транзакцией не управляет
+    вызывающий код.
+
+    Вложенный ``commit_on_success`` в Django 1.4 не использует точки
+    сохранения и подтверждает или откатывает транзакцию вызывающего кода,
+    например, ``TransactionMiddleware``. Внутри управляемой транзакции
+    функция выполняется в ней.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if transaction.is_managed():
+            return func(*args, **kwargs)
+        return transaction.commit_on_success(func)(*args, **kwargs)
+    return wrapper
+
+
+def memoized_today(obj):
+    """Возвращает текущую дату, зафиксированную в кэше объекта.
+
+    Все значения, вычисленные до сброса кэша, рассчитываются относительно
+    одной и той же даты.
+    """
+    memo = _memo(obj)
+    if 'today' not in memo:
+        memo['today'] = datetime.date.today()
+    return memo['today']
+
+
+def get_memoized(obj, name, default=None):
+    """Возвращает закэшированное значение, не вычисляя его."""
+    return _memo(obj).get(name, default)
+
+
+def set_memoized(obj, name, value):
+    """Кэширует значение, рассчитанное вне метода объекта."""
+    _memo(obj)[name] = value
+
+
+def reset_memoized(obj):
+    """Сбрасывает кэш вычисленных значений объекта."""
+    obj.__dict__.pop('_memo', None)
+
+
+def _memo(obj):
+    """Возвращает кэш вычисленных значений объекта."""
+    state = obj._memo_state()
+    memo = obj.__dict__.get('_memo')
+    if memo is None or memo['state'] != state:
+        memo = obj.__dict__['_memo'] = {'state': state}
+    return memo
+
+
+class LRUCache(object):
+    """Словарь ограниченного размера, вытесняющий значения, к которым
+    дольше всего не обращались.
+
+    Ключи хранятся в кольцевом двусвязном списке в порядке обращения,
+    поэтому чтение, запись и вытеснение выполняются за O(1).
+    """
+    _PREV, _NEXT, _KEY, _VALUE = range(4)
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._reset()
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key, default=None):
+        with self._lock:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            self._unlink(link)
+            self._append(link)
+            return link[self._VALUE]
+
+    def set(self, key, value):
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None:
+                self._unlink(link)
+            elif len(self._links) >= self.maxsize:
+                oldest = self._root[self._NEXT]
+                self._unlink(oldest)
+                del self._links[oldest[self._KEY]]
+            link = [None, None, key, value]
+            self._links[key] = link
+            self._append(link)
+
+    def delete(self, key):
+        with self._lock:
+            link = self._links.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._links = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def _append(self, link):
+        """Добавляет ключ в конец списка -- как последний использованный."""
+        last = self._root[self._PREV]
+        link[self._PREV] = last
+        link[self._NEXT] = self._root
+        last[self._NEXT] = link
+        self._root[self._PREV] = link
+
+    def _unlink(self, link):
+        link[self._PREV][self._NEXT] = link[self._NEXT]
+        link[self._NEXT][self._PREV] = link[self._PREV]
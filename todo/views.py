@@ -1,16 +1,57 @@
 # -*- coding: utf-8 -*-
-from django.shortcuts import render, get_object_or_404
+import datetime
+import time
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.views.decorators.http import condition
 
+from todo.caching import archive_months, user_version
 from todo.models import Chain, Task
+from todo.pagination import (PER_PAGE, keyset_filter, keyset_page,
+                             make_page, parse_cursor)
+from todo.presenters import chain_rows, task_rows
+
+
+def _user_state(request):
+    """Возвращает версию задач и цепочек пользователя и текущую дату.
+
+    Списки задач и цепочек меняются только при изменении задач и цепочек
+    пользователя и при смене даты.
+    """
+    state = getattr(request, '_todo_user_state', None)
+    if state is None:
+        state = (user_version(request.user.pk), datetime.date.today())
+        request._todo_user_state = state
+    return state
+
+
+def _user_etag(request, *args, **kwargs):
+    version, today = _user_state(request)
+    return '{0}.{1}.{2}'.format(request.user.pk, version, today.isoformat())
+
+
+def _user_last_modified(request, *args, **kwargs):
+    version, today = _user_state(request)
+    # Показатели меняются в полночь, даже если данные не менялись.
+    timestamp = max(version / 1000000.0, time.mktime(today.timetuple()))
+    return datetime.datetime.utcfromtimestamp(timestamp)
+
+
+user_condition = condition(etag_func=_user_etag,
+                            last_modified_func=_user_last_modified)
 
 
 @login_required
+@user_condition
 def actual_tasks(request):
     """Отображает список актуальных задач для исполнителя."""
     user = request.user
-    actual_tasks = Task.objects.by_worker(user).actual()
-    return render(request, 'todo/task_list.html', {
+    actual_tasks = task_rows(Task.objects.by_worker(user).actual())
+    return TemplateResponse(request, 'todo/task_list.html', {
         'place': 'tasks',
         'actual_tasks': actual_tasks,
     })
@@ -21,31 +62,120 @@ def task_detail(request, task_id):
     """Отображает описание задачи для исполнителя."""
     task = get_object_or_404(Task, pk=task_id)
     user = request.user
-    if task.worker != user:
-        return render(request, 'todo/error.html')
-    actual_tasks = Task.objects.by_worker(user).actual()
-    return render(request, 'todo/task_detail.html', {
+    if task.worker_id != user.pk:
+        return TemplateResponse(request, 'todo/error.html')
+    actual_tasks = task_rows(Task.objects.by_worker(user).actual())
+    return TemplateResponse(request, 'todo/task_detail.html', {
         'current_task': task,
         'actual_tasks': actual_tasks,
     })
 
 
+@login_required
 def task_archive(request):
-    """Отображает архив задач для исполнителя."""
-    return render(request, 'todo/task_archive.html')
+    """Отображает архив задач для исполнителя.
+
+    Задачи выводятся постранично по убыванию дедлайна. Архив можно
+    ограничить месяцем дедлайна.
+    """
+    user = request.user
+    archived_tasks = Task.objects.by_worker(user).archived()
+    months = archive_months(user.pk, archived_tasks)
+    current_month = _month(request.GET.get('month'))
+    if current_month is not None:
+        # Диапазон дат, а не год и месяц, чтобы использовался индекс
+        # по дедлайну.
+        next_month = (current_month +
+                      datetime.timedelta(days=31)).replace(day=1)
+        archived_tasks = archived_tasks.filter(deadline__gte=current_month,
+                                               deadline__lt=next_month)
+    archived_tasks = keyset_filter(archived_tasks, 'deadline',
+                                   _cursor(request.GET.get('after')))
+    page = make_page(task_rows(archived_tasks, limit=PER_PAGE + 1),
+                     'deadline')
+    return TemplateResponse(request, 'todo/task_archive.html', {
+        'place': 'tasks',
+        'page': page,
+        'months': months,
+        'current_month': current_month,
+    })
 
 
 @login_required
+@user_condition
 def actual_chains(request):
     """Отображает список актуальных цепочек задач для владельца."""
     user = request.user
-    actual_chains = Chain.objects.by_owner(user).actual()
-    return render(request, 'todo/chain_list.html', {
+    actual_chains = chain_rows(Chain.objects.by_owner(user).actual()
+                               .with_summary())
+    return TemplateResponse(request, 'todo/chain_list.html', {
         'place': 'chains',
         'actual_chains': actual_chains,
     })
 
 
+@login_required
 def chain_archive(request):
-    """Отображает архив цепочек задач для владельца."""
-    return render(request, 'todo/chain_archive.html')
+    """Отображает архив цепочек задач для владельца.
+
+    Цепочки выводятся постранично по убыванию даты начала.
+    """
+    archived_chains = (Chain.objects.by_owner(request.user).archived()
+                       .with_summary())
+    page = keyset_page(archived_chains, 'start_date',
+                       _cursor(request.GET.get('after')))
+    page.object_list = chain_rows(page.object_list)
+    return TemplateResponse(request, 'todo/chain_archive.html', {
+        'place': 'chains',
+        'page': page,
+    })
+
+
+@login_required
+def dashboard(request):
+    """Отображает сводку по владельцам цепочек и исполнителям задач.
+
+    Для владельцев выводится количество актуальных цепочек по статусам,
+    для исполнителей -- количество незавершенных и просроченных задач.
+    """
+    chain_counts = Chain.objects.filter(archive=False).status_counts_by_owner()
+    task_counts = Task.objects.filter(archive=False).open_counts_by_worker()
+    users = User.objects.in_bulk(set(chain_counts) | set(task_counts))
+    statuses = (Chain.WAIT_STATUS, Chain.WORK_STATUS, Chain.DONE_STATUS,
+                Chain.STOP_STATUS)
+    owners = [
+        (users[owner_id], [counts.get(status, 0) for status in statuses])
+        for owner_id, counts in chain_counts.items()
+    ]
+    workers = [
+        (users[worker_id], counts['open'], counts['overdue'])
+        for worker_id, counts in task_counts.items()
+    ]
+    full_name = lambda row: (row[0].last_name, row[0].first_name)
+    owners.sort(key=full_name)
+    workers.sort(key=full_name)
+    return TemplateResponse(request, 'todo/dashboard.html', {
+        'place': 'staff',
+        'owners': owners,
+        'workers': workers,
+    })
+
+
+def _cursor(value):
+    """Разбирает курсор страницы архива из параметра запроса."""
+    if value is None:
+        return None
+    cursor = parse_cursor(value)
+    if cursor is None:
+        raise Http404
+    return cursor
+
+
+def _month(value):
+    """Разбирает месяц архива в формате YYYY-MM из параметра запроса."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise Http404